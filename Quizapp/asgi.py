@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Quizapp.settings')
+# Read by the settings: connections do not persist by default under ASGI
+os.environ.setdefault('SERVER_ASGI', 'True')
 
 application = get_asgi_application()
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'base.instrumentation.RequestMetricsMiddleware',  # Opt-in, see REQUEST_METRICS_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,7 +50,7 @@ ROOT_URLCONF = 'Quizapp.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'base.instrumentation.InstrumentedDjangoTemplates',  # DjangoTemplates timing renders for the request metrics
         'DIRS': [BASE_DIR / 'templates'],  # Adjusted to only templates folder
         'APP_DIRS': True,
         'OPTIONS': {
@@ -58,27 +59,103 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'quiz.context_processors.categories',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'Quizapp.wsgi.application'
+
+# The deferrable UserRank.rank uniqueness is only enforced on PostgreSQL
+SILENCED_SYSTEM_CHECKS = ['models.W038']
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'  # Set redirect URL after login
 
-# Database configuration (PostgreSQL)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': env("DB_NAME", default="dbtest"),
-        'USER': env("DB_USER", default="your_user"),
-        'PASSWORD': env("DB_PASSWORD", default="your_password"),
-        'HOST': env("DB_HOST", default="localhost"),
-        'PORT': env("DB_PORT", default="5432"),
+# Database configuration: PostgreSQL from the DB_* variables, or any database
+# from DATABASE_URL (e.g. sqlite:///db.sqlite3 for local runs and tests)
+if env('DATABASE_URL', default=None):
+    DATABASES = {'default': env.db('DATABASE_URL')}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': env("DB_NAME", default="dbtest"),
+            'USER': env("DB_USER", default="your_user"),
+            'PASSWORD': env("DB_PASSWORD", default="your_password"),
+            'HOST': env("DB_HOST", default="localhost"),
+            'PORT': env("DB_PORT", default="5432"),
+        }
     }
+
+# Connection management. PostgreSQL connections either persist for
+# DB_CONN_MAX_AGE seconds, or come from a psycopg 3 pool of DB_POOL_MIN_SIZE to
+# DB_POOL_MAX_SIZE connections per process when DB_POOL is set (needs the
+# psycopg[pool] package). SQLite connections are cheap and never persist.
+# Connections are checked before reuse either way. Under ASGI (SERVER_ASGI,
+# set by Quizapp/asgi.py) each request's sync calls may run in a new thread
+# with its own connection, so connections only persist when DB_CONN_MAX_AGE
+# is set explicitly; DB_POOL is the way to reuse them there.
+SERVER_ASGI = env.bool('SERVER_ASGI', default=False)
+DB_POOL = env.bool('DB_POOL', default=False)
+DB_POOL_MIN_SIZE = env.int('DB_POOL_MIN_SIZE', default=2)
+DB_POOL_MAX_SIZE = env.int('DB_POOL_MAX_SIZE', default=10)
+DB_POOL_TIMEOUT = env.float('DB_POOL_TIMEOUT', default=10)
+DB_CONN_MAX_AGE = env.int('DB_CONN_MAX_AGE', default=0 if SERVER_ASGI else 60)
+
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    if DB_POOL:
+        # Pooled connections go back to the pool after each request, so they must not persist
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+# Server processes and threads per process (WEB_CONCURRENCY is read by gunicorn),
+# and the most connections the database accepts, for the connection checks
+SERVER_WORKERS = env.int('WEB_CONCURRENCY', default=1)
+SERVER_THREADS = env.int('WEB_THREADS', default=1)
+DB_MAX_CONNECTIONS = env.int('DB_MAX_CONNECTIONS', default=100)
+
+# Cache configuration: local memory by default, set CACHE_URL (e.g. redis:// or
+# pymemcache://) to share cached pages and counters between processes
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
 }
 
+# Cache alias and lifetime (seconds) of the rendered quiz question cards
+QUIZ_PAGE_CACHE = 'default'
+QUIZ_PAGE_CACHE_TIMEOUT = env.int('QUIZ_PAGE_CACHE_TIMEOUT', default=60 * 60)
+
+# Whether question text is part of the full-text quiz search, besides titles and descriptions
+QUIZ_SEARCH_QUESTIONS = env.bool('QUIZ_SEARCH_QUESTIONS', default=True)
+
+# Score of a quiz counted on the leaderboards when it was attempted several times: best, latest or average
+LEADERBOARD_SCORE_POLICY = env.str('LEADERBOARD_SCORE_POLICY', default='best')
+
+# Lifetime (seconds) of the cached first page of the leaderboard
+LEADERBOARD_CACHE_TIMEOUT = env.int('LEADERBOARD_CACHE_TIMEOUT', default=5 * 60)
+
+# Lifetime (seconds) of the cached results of short user searches, and the
+# typeahead latency above which a lookup is logged
+USER_SEARCH_CACHE_TIMEOUT = env.int('USER_SEARCH_CACHE_TIMEOUT', default=60)
+USER_TYPEAHEAD_BUDGET_MS = env.int('USER_TYPEAHEAD_BUDGET_MS', default=50)
+
+# Lifetime (seconds) of the cached dashboard metrics snapshot
+DASHBOARD_METRICS_TTL = env.int('DASHBOARD_METRICS_TTL', default=30)
+
+# Per-request SQL and timing metrics (superuser views /metrics and
+# /metrics/prometheus), and the wall time (ms) above which a request is logged
+REQUEST_METRICS_ENABLED = env.bool('REQUEST_METRICS_ENABLED', default=False)
+REQUEST_SLOW_MS = env.int('REQUEST_SLOW_MS', default=500)
+
 # CKEditor settings
 CKEDITOR_5_CONFIGS = {
     'default': {
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+from django.db.models import Avg, Count, F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from quiz.models import Question, QuizScore, QuizSubmission
+from quiz.pagination import keyset_paginate
+
+# Submissions shown per page of the profile history
+SUBMISSIONS_PER_PAGE = 20
+
+# Quizzes listed with their best score on the profile
+BEST_SCORES_SHOWN = 10
+
+
+def quiz_question_count(quiz_field='quiz'):
+    """
+    Subquery counting the questions of the quiz referenced by ``quiz_field``,
+    for annotating submission or score rows without loading any question.
+    """
+    return Coalesce(Subquery(
+        Question.objects.filter(quiz=OuterRef(quiz_field))
+        .values('quiz')
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+def _percent(score_field):
+    # Score as a percentage of the quiz's questions, NULL for quizzes without questions
+    return Cast(F(score_field), FloatField()) * Value(100.0) / NullIf(F('question_count'), 0)
+
+
+def submission_history(user, cursor=None):
+    """
+    Returns a KeysetPage of the submissions of ``user``, newest first,
+    starting after ``cursor``. Each row has its quiz joined in and a
+    ``question_count`` annotation.
+    """
+    submissions = (QuizSubmission.objects.filter(user=user)
+                   .select_related('quiz')
+                   .defer('quiz__search_vector', 'quiz__description')
+                   .annotate(question_count=quiz_question_count()))
+    return keyset_paginate(submissions, 'submitted_at', cursor, SUBMISSIONS_PER_PAGE)
+
+
+def submission_summary(user):
+    """
+    Computes the history totals of ``user`` in the database.
+
+    Returns:
+        dict: ``attempts``, ``quizzes`` (distinct quizzes attempted),
+        ``average_percent`` (None without any scored attempt) and
+        ``best_scores``, the best attempt at the last BEST_SCORES_SHOWN
+        quizzes attempted, each with its question count and percentage.
+    """
+    totals = (QuizSubmission.objects.filter(user=user)
+              .annotate(question_count=quiz_question_count())
+              .aggregate(attempts=Count('pk'), quizzes=Count('quiz', distinct=True),
+                         average_percent=Avg(_percent('score'))))
+
+    # One QuizScore row per quiz attempted holds the best attempt
+    best_scores = list(QuizScore.objects.filter(user=user)
+                       .select_related('quiz')
+                       .defer('quiz__search_vector', 'quiz__description')
+                       .annotate(question_count=quiz_question_count(), percent=_percent('best_score'))
+                       .order_by('-updated_at')[:BEST_SCORES_SHOWN])
+
+    average = totals['average_percent']
+    return {
+        "attempts": totals['attempts'],
+        "quizzes": totals['quizzes'],
+        "average_percent": round(average, 1) if average is not None else None,
+        "best_scores": best_scores,
+    }
@@ -1,8 +1,10 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
 from .models import Profile
-from quiz.models import QuizSubmission, Quiz, Category
+from quiz.models import QuizSubmission, Quiz, Category, Question
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 class ProfileViewTest(TestCase):
     # setup
@@ -42,4 +44,38 @@ class ProfileViewTest(TestCase):
         url = reverse('profile', args=[self.user.username])
         response = self.client.get(url)
 
-        self.assertRedirects(response, f'/user/login?next={url}')
\ No newline at end of file
+        self.assertRedirects(response, f'/user/login?next={url}')
+
+    def test_profile_history(self):
+        self.client.login(username='testuser', password='testpass')
+        for i in range(8):
+            Question.objects.create(quiz=self.quiz, text=f'Question {i}')
+        other_quiz = Quiz.objects.create(title='Other quiz', description='Desc', category=self.category)
+        Question.objects.create(quiz=other_quiz, text='Question')
+        QuizSubmission.objects.create(user=self.user, quiz=self.quiz, score=2)
+        QuizSubmission.objects.create(user=self.user, quiz=other_quiz, score=1)
+
+        url = reverse('profile', args=[self.user.username])
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(url)
+
+        summary = response.context['summary']
+        self.assertEqual((summary['attempts'], summary['quizzes']), (3, 2))
+        # (7/8 + 2/8 + 1/1) / 3 of the questions
+        self.assertEqual(summary['average_percent'], 70.8)
+        best = {score.quiz.title: (score.best_score, score.question_count) for score in summary['best_scores']}
+        self.assertEqual(best, {'Quiz title': (7, 8), 'Other quiz': (1, 1)})
+        self.assertContains(response, '2/8')
+
+        # The page costs the same number of queries however long the history is
+        for i in range(30):
+            QuizSubmission.objects.create(user=self.user, quiz=other_quiz, score=1)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(few), len(many))
+
+        submissions = response.context['submissions']
+        self.assertEqual(len(submissions), 20)
+        response = self.client.get(url, {'cursor': submissions.next_cursor})
+        self.assertEqual(len(response.context['submissions']), 13)
+        self.assertFalse(response.context['submissions'].has_next)
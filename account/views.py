@@ -5,7 +5,8 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User, auth
 from .models import Profile
-from quiz.models import QuizSubmission
+from .history import submission_history, submission_summary
+from base.query_budget import query_budget
 
 # Create your views here.
 
@@ -33,6 +34,7 @@ def home(request):
     return render(request, 'account/home.html', context)
 
 
+@query_budget(2)
 def register(request):
     """
     User registration view. If the user is authenticated, redirects to the profile page.
@@ -79,21 +81,23 @@ def register(request):
     return render(request, "register.html")
 
 
+@query_budget(7)
 @login_required
 def profile(request, username):
     """
     Profile view displaying user information and their quiz submissions.
     """
-    user_object2 = get_object_or_404(User, username=username)
-    user_profile2 = get_object_or_404(Profile, user=user_object2)
+    user_profile2 = get_object_or_404(Profile.objects.select_related('user'), user__username=username)
 
-    # Retrieve quiz submissions for the user
-    submissions = QuizSubmission.objects.filter(user=user_object2)
+    # One page of the user's quiz submissions, newest first, and totals over all of them
+    submissions = submission_history(user_profile2.user, request.GET.get('cursor'))
+    summary = submission_summary(user_profile2.user)
 
-    context = {"user_profile2": user_profile2, "submissions": submissions}
+    context = {"user_profile2": user_profile2, "submissions": submissions, "summary": summary}
     return render(request, "profile.html", context)
 
 
+@query_budget(3)
 @login_required
 def editProfile(request):
     """
@@ -142,6 +146,7 @@ def editProfile(request):
     return render(request, 'profile-edit.html', context)
 
 
+@query_budget(3)
 @login_required
 def deleteProfile(request):
     """
@@ -158,6 +163,7 @@ def deleteProfile(request):
     return render(request, 'confirm.html')
 
 
+@query_budget(2)
 def login(request):
     """
     User login view. If the user is already authenticated, redirects to the profile page.
@@ -181,6 +187,7 @@ def login(request):
     return render(request, "login.html")
 
 
+@query_budget(4)
 @login_required
 def logout(request):
     """
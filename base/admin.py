@@ -1,6 +1,13 @@
 from django.contrib import admin
-from .models import Message, Blog
+from .models import Message, Blog, DailyStats
 
 # Register your models here.
 admin.site.register(Message)
-admin.site.register(Blog)
\ No newline at end of file
+admin.site.register(Blog)
+
+
+@admin.register(DailyStats)
+class DailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('day', 'category', 'new_users', 'new_quizzes', 'new_submissions', 'new_questions', 'average_score')
+    list_filter = ('category',)
+    date_hierarchy = 'day'
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+import datetime
+import random
+import statistics
+import time
+from collections import namedtuple
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from account.history import quiz_question_count
+from account.models import Profile
+from quiz.leaderboard import rebuild_board, rebuild_leaderboard
+from quiz.models import Category, Choice, Leaderboard, Question, Quiz, QuizSubmission, SubmissionAnswer, UserRank
+from quiz.search import refresh_search_vectors
+from .metrics import day_range
+from .models import Blog, Message
+
+# Prefix of every seeded username
+SEED_PREFIX = 'bench'
+
+# Password of the seeded users
+SEED_PASSWORD = 'benchmark'
+
+# Choices created per seeded question, the first one correct
+CHOICES_PER_QUESTION = 4
+
+BATCH_SIZE = 1000
+
+# What seed_dataset() created: the row count per model, and the ids of the
+# users and categories deleted, with everything attached, by delete_seeded()
+Seeded = namedtuple('Seeded', ['counts', 'user_ids', 'category_ids'])
+
+# Indexes and constraints of the hot path migrations (quiz 0009, base 0005), by model
+INDEX_PACK = {
+    'quiz.Quiz': ['quiz_created_idx'],
+    'quiz.QuizSubmission': ['submission_user_time_idx', 'submission_quiz_score_idx', 'submission_time_idx'],
+    'quiz.UserRank': ['userrank_score_idx'],
+    'base.Message': ['message_created_read_idx'],
+    'base.Blog': ['blog_status_created_idx'],
+}
+CONSTRAINT_PACK = {
+    'quiz.UserRank': ['unique_user_rank'],
+}
+
+
+def seed_dataset(users=1000, quizzes=200, questions=10, submissions=20000, seed=0):
+    """
+    Bulk creates a realistic dataset: users with profiles, quizzes spread over
+    five categories and the past year, ``questions`` questions per quiz with
+    four choices each, and submissions with their answers spread over the
+    past 90 days. The leaderboard is rebuilt from the submissions.
+
+    Seeded users are named ``bench_user_<n>`` with the SEED_PASSWORD
+    password, and five new categories are named ``Bench <n>``.
+
+    Returns:
+        Seeded: Number of rows created per model, and the seeded user and
+        category ids to pass to delete_seeded().
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    start = User.objects.filter(username__startswith=f'{SEED_PREFIX}_user_').count()
+
+    password = make_password(SEED_PASSWORD)
+    seeded_users = User.objects.bulk_create(
+        [User(username=f'{SEED_PREFIX}_user_{start + i}', password=password, first_name=f'Bench{start + i}')
+         for i in range(users)], batch_size=BATCH_SIZE)
+    Profile.objects.bulk_create([Profile(user=user) for user in seeded_users], batch_size=BATCH_SIZE)
+
+    # Created one by one, each getting a unique slug; existing categories are never reused
+    categories = [Category.objects.create(name=f'Bench {i}') for i in range(5)]
+
+    seeded_quizzes = Quiz.objects.bulk_create(
+        [Quiz(title=f'Benchmark quiz {i} about {rng.choice(["physics", "history", "algebra", "poetry"])}',
+              description='Seeded for benchmarks', category=rng.choice(categories))
+         for i in range(quizzes)], batch_size=BATCH_SIZE)
+    for quiz in seeded_quizzes:
+        quiz.created_at = now - datetime.timedelta(minutes=rng.randrange(365 * 24 * 60))
+    Quiz.objects.bulk_update(seeded_quizzes, ['created_at'], batch_size=BATCH_SIZE)
+
+    seeded_questions = Question.objects.bulk_create(
+        [Question(quiz=quiz, text=f'Question {i} of {quiz.title}?') for quiz in seeded_quizzes for i in range(questions)],
+        batch_size=BATCH_SIZE)
+    seeded_choices = Choice.objects.bulk_create(
+        [Choice(question=question, text=f'Choice {i}', is_correct=i == 0)
+         for question in seeded_questions for i in range(CHOICES_PER_QUESTION)],
+        batch_size=BATCH_SIZE)
+
+    # Choices of each quiz's questions, the correct one first
+    quiz_choices = {}
+    for choice in seeded_choices:
+        quiz_choices.setdefault(choice.question.quiz_id, {}).setdefault(choice.question_id, []).append(choice)
+
+    seeded_submissions, answers = [], []
+    for _ in range(submissions if seeded_users and seeded_quizzes else 0):
+        quiz = rng.choice(seeded_quizzes)
+        picks = [(question_id, rng.choice(choices)) for question_id, choices in quiz_choices.get(quiz.pk, {}).items()]
+        submission = QuizSubmission(user=rng.choice(seeded_users), quiz=quiz,
+                                    score=sum(1 for _, choice in picks if choice.is_correct))
+        seeded_submissions.append(submission)
+        answers.append(picks)
+    QuizSubmission.objects.bulk_create(seeded_submissions, batch_size=BATCH_SIZE)
+    for submission in seeded_submissions:
+        submission.submitted_at = now - datetime.timedelta(minutes=rng.randrange(90 * 24 * 60))
+    QuizSubmission.objects.bulk_update(seeded_submissions, ['submitted_at'], batch_size=BATCH_SIZE)
+    SubmissionAnswer.objects.bulk_create(
+        [SubmissionAnswer(submission=submission, question_id=question_id, choice=choice, is_correct=choice.is_correct)
+         for submission, picks in zip(seeded_submissions, answers) for question_id, choice in picks],
+        batch_size=BATCH_SIZE)
+
+    seeded_messages = Message.objects.bulk_create(
+        [Message(user=rng.choice(seeded_users), subject='Seeded message', message='Hello')
+         for _ in range(max(1, users // 10))], batch_size=BATCH_SIZE) if seeded_users else []
+    seeded_blogs = Blog.objects.bulk_create(
+        [Blog(title=f'Benchmark blog {i}', content='Seeded', author=seeded_users[0],
+              status=rng.choice(['public', 'private'])) for i in range(50)]) if seeded_users else []
+
+    rebuild_leaderboard()
+    refresh_search_vectors(Quiz.objects.filter(pk__in=[quiz.pk for quiz in seeded_quizzes]))
+    return Seeded({
+        "users": len(seeded_users),
+        "quizzes": len(seeded_quizzes),
+        "questions": len(seeded_questions),
+        "choices": len(seeded_choices),
+        "submissions": len(seeded_submissions),
+        "answers": sum(len(picks) for picks in answers),
+        "messages": len(seeded_messages),
+        "blogs": len(seeded_blogs),
+    }, [user.pk for user in seeded_users], [category.pk for category in categories])
+
+
+def delete_seeded(seeded):
+    """
+    Deletes the users and categories of a seed_dataset() result, with their
+    quizzes, submissions, messages and blogs. The leaderboard and the open
+    boards are rebuilt, and so are the archived boards that ranked seeded
+    users.
+
+    Returns:
+        int: Number of rows deleted.
+    """
+    with transaction.atomic():
+        frozen = list(Leaderboard.objects.filter(frozen=True, entries__user_id__in=seeded.user_ids)
+                      .exclude(category_id__in=seeded.category_ids).distinct())
+        deleted, _ = Category.objects.filter(pk__in=seeded.category_ids).delete()
+        users_deleted, _ = User.objects.filter(pk__in=seeded.user_ids).delete()
+        rebuild_leaderboard()
+        for board in frozen:
+            rebuild_board(board)
+    return deleted + users_deleted
+
+
+def hot_queries():
+    """
+    Returns ``(name, queryset)`` pairs reproducing the main query of each hot
+    view, for a sample user and quiz of the current data.
+    """
+    user_id = QuizSubmission.objects.values_list('user_id', flat=True).first() or 0
+    quiz_id = QuizSubmission.objects.values_list('quiz_id', flat=True).first() or 0
+    total = UserRank.objects.filter(user_id=user_id).values_list('total_score', flat=True).first() or 0
+    start, end = day_range()
+
+    return [
+        ("all_quiz listing", Quiz.objects.select_related('category').defer('search_vector')
+         .annotate(question_count=quiz_question_count('pk')).order_by('-created_at', '-pk')[:25]),
+        ("profile history", QuizSubmission.objects.filter(user_id=user_id).select_related('quiz')
+         .order_by('-submitted_at', '-pk')[:21]),
+        ("quiz top scores", QuizSubmission.objects.filter(quiz_id=quiz_id).order_by('-score')[:10]),
+        ("leaderboard page", UserRank.objects.filter(rank__isnull=False).select_related('user__profile')
+         .order_by('rank', 'pk')[:25]),
+        ("leaderboard reposition", UserRank.objects
+         .filter(Q(total_score__gt=total) | Q(total_score=total, user_id__lt=user_id))
+         .order_by('total_score', '-user_id').values_list('rank', flat=True)[:1]),
+        ("dashboard submissions today", QuizSubmission.objects
+         .filter(submitted_at__gte=start, submitted_at__lt=end).values('pk')),
+        ("dashboard messages", Message.objects.filter(created_at__gte=start, created_at__lt=end)
+         .select_related('user').order_by('-created_at')),
+        ("blogs", Blog.objects.filter(status='public').order_by('-created_at')[:20]),
+    ]
+
+
+def percentile(values, fraction):
+    """Nearest-rank ``fraction`` percentile of the sorted ``values`` (0 without values)."""
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _run(queryset, label, prefix=''):
+    # Runs the SQL of ``queryset`` tagged with ``label``: drivers caching prepared
+    # statements by text (sqlite3) would otherwise reuse a plan made before the
+    # indexes were dropped
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{prefix}{sql} /* {label} */", params)
+        return cursor.fetchall()
+
+
+def time_query(queryset, label='benchmark', repeat=20):
+    """
+    Runs the SQL of ``queryset`` ``repeat`` times.
+
+    Returns:
+        dict: Median and 95th percentile run time, in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _run(queryset, label)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+    }
+
+
+def explain_query(queryset, label='benchmark', analyze=False):
+    """Returns the EXPLAIN output of ``queryset`` (EXPLAIN ANALYZE on PostgreSQL if ``analyze``)."""
+    options = {'analyze': True} if analyze and connection.vendor == 'postgresql' else {}
+    prefix = connection.ops.explain_query_prefix(**options) + ' '
+    return "\n".join(" ".join(str(column) for column in row) for row in _run(queryset, label, prefix))
+
+
+def measure_queries(label, repeat=20, analyze=False):
+    """
+    Times and explains every hot query.
+
+    Returns:
+        dict: Per query name, its timings and EXPLAIN plan.
+    """
+    return {name: {**time_query(queryset, label, repeat), "plan": explain_query(queryset, label, analyze)}
+            for name, queryset in hot_queries()}
+
+
+def drop_index_pack():
+    """
+    Drops the indexes and constraints of INDEX_PACK and CONSTRAINT_PACK.
+    Only meant to run inside a transaction that is rolled back afterwards.
+    """
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for names in INDEX_PACK.values():
+            for name in names:
+                cursor.execute(f"DROP INDEX {quote(name)}")
+        if connection.features.supports_deferrable_unique_constraints:
+            for label, names in CONSTRAINT_PACK.items():
+                for name in names:
+                    cursor.execute(f"ALTER TABLE {quote(apps.get_model(label)._meta.db_table)} DROP CONSTRAINT {quote(name)}")
+
+
+def compare_index_pack(repeat=20, analyze=False):
+    """
+    Measures the hot queries with the index pack, then again without it in a
+    rolled back transaction.
+
+    Returns:
+        dict: ``{"after": ..., "before": ...}`` measurements, as returned by
+        measure_queries().
+    """
+    after = measure_queries('with indexes', repeat, analyze)
+    with transaction.atomic():
+        drop_index_pack()
+        before = measure_queries('without indexes', repeat, analyze)
+        transaction.set_rollback(True)
+    return {"after": after, "before": before}
+
+
+def analyze_tables():
+    """Refreshes the planner statistics after seeding."""
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
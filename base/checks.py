@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# Startup checks of the database connection settings against the server's
+# worker processes and threads (SERVER_WORKERS, SERVER_THREADS) and the
+# connections the database accepts (DB_MAX_CONNECTIONS). Each process keeps
+# its own pool or persistent connections, one per thread at most. Under ASGI
+# (SERVER_ASGI) the threads come and go with the requests, so persistent
+# connections are not reused and pile up until they expire.
+#
+# The cache check warns when several workers each keep a private
+# local-memory cache: invalidations made by one process (categories,
+# leaderboard and quiz pages) would not reach the others.
+
+import importlib.util
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# psycopg_pool defaults of a pool configured as ``'pool': True``
+DEFAULT_POOL_MIN_SIZE = 4
+
+
+def pool_sizes(database):
+    """Returns ``(min size, max size)`` of the psycopg pool of ``database``, or None if it is not pooled."""
+    pool = database.get('OPTIONS', {}).get('pool')
+    if not pool:
+        return None
+    options = pool if isinstance(pool, dict) else {}
+    min_size = options.get('min_size', DEFAULT_POOL_MIN_SIZE)
+    return min_size, options.get('max_size') or min_size
+
+
+def database_connection_messages(databases):
+    """Returns the check messages of the connection settings of ``databases`` (a DATABASES dict)."""
+    workers = getattr(settings, 'SERVER_WORKERS', 1)
+    threads = getattr(settings, 'SERVER_THREADS', 1)
+    max_connections = getattr(settings, 'DB_MAX_CONNECTIONS', 100)
+    messages = []
+
+    if getattr(settings, 'DB_POOL', False) and not any(pool_sizes(database) for database in databases.values()):
+        messages.append(Warning(
+            "DB_POOL is set but no database is pooled.",
+            hint="Connection pools are only supported on PostgreSQL.",
+            id='base.W001',
+        ))
+
+    for alias, database in databases.items():
+        sizes = pool_sizes(database)
+        if sizes is None:
+            if database.get('CONN_MAX_AGE') and getattr(settings, 'SERVER_ASGI', False):
+                messages.append(Warning(
+                    f"Database '{alias}': persistent connections (CONN_MAX_AGE) are not reused under ASGI, "
+                    f"where each request's sync calls may run in a new thread.",
+                    hint="Set DB_CONN_MAX_AGE=0, or use a pool (DB_POOL) to reuse connections.",
+                    id='base.W007',
+                ))
+                continue
+            # Without a pool, each thread keeps its own persistent connection
+            if database.get('CONN_MAX_AGE') and workers * threads > max_connections:
+                messages.append(Warning(
+                    f"Database '{alias}': {workers} workers with {threads} threads can keep {workers * threads} "
+                    f"persistent connections, more than the {max_connections} the database accepts.",
+                    hint="Lower DB_CONN_MAX_AGE, WEB_CONCURRENCY or WEB_THREADS, or use a pool (DB_POOL).",
+                    id='base.W002',
+                ))
+            continue
+
+        min_size, max_size = sizes
+        if not (importlib.util.find_spec('psycopg') and importlib.util.find_spec('psycopg_pool')):
+            messages.append(Error(
+                f"Database '{alias}' is pooled but psycopg 3 or psycopg_pool is not installed.",
+                hint='Install "psycopg[pool]", or unset DB_POOL.',
+                id='base.E001',
+            ))
+        if min_size > max_size:
+            messages.append(Warning(
+                f"Database '{alias}': the pool min size ({min_size}) is above its max size ({max_size}).",
+                hint="Lower DB_POOL_MIN_SIZE or raise DB_POOL_MAX_SIZE.",
+                id='base.W003',
+            ))
+        if max_size < threads:
+            messages.append(Warning(
+                f"Database '{alias}': a pool of {max_size} connections serves {threads} threads per worker, "
+                f"so requests will wait for a connection.",
+                hint="Raise DB_POOL_MAX_SIZE to WEB_THREADS at least.",
+                id='base.W004',
+            ))
+        if workers * max_size > max_connections:
+            messages.append(Warning(
+                f"Database '{alias}': {workers} workers with pools of up to {max_size} connections can open "
+                f"{workers * max_size} connections, more than the {max_connections} the database accepts.",
+                hint="Lower DB_POOL_MAX_SIZE or WEB_CONCURRENCY, or raise DB_MAX_CONNECTIONS.",
+                id='base.W005',
+            ))
+    return messages
+
+
+# Cache backends private to each process
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def cache_messages(caches):
+    """Returns the check messages of the ``caches`` (a CACHES dict) against the number of workers."""
+    workers = getattr(settings, 'SERVER_WORKERS', 1)
+    backend = caches.get('default', {}).get('BACKEND')
+    if workers > 1 and backend in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            f"The default cache is local to each of the {workers} workers, so they serve stale categories "
+            f"and cached pages after another worker changes them.",
+            hint="Set CACHE_URL to a shared cache (e.g. redis:// or pymemcache://).",
+            id='base.W006',
+        )]
+    return []
+
+
+@register('database_connections')
+def check_database_connections(app_configs, **kwargs):
+    return database_connection_messages(settings.DATABASES)
+
+
+@register('caches')
+def check_caches(app_configs, **kwargs):
+    return cache_messages(settings.CACHES)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+
+# Per-request SQL and timing instrumentation.
+#
+# When REQUEST_METRICS_ENABLED is set, RequestMetricsMiddleware records for
+# every request the wall time, the number and total time of SQL queries,
+# queries repeated with the same SQL (the N+1 signature) and the template
+# render time. They are aggregated per URL name in in-memory histograms,
+# which the superuser metrics views expose as JSON and in the Prometheus text
+# format. Each process aggregates its own requests. Requests slower than
+# REQUEST_SLOW_MS are logged.
+#
+# Template render time is measured by InstrumentedDjangoTemplates, the
+# template backend of the project, and only while a request is recorded.
+#
+# The middleware serves sync and async requests. The tracker of the current
+# request lives in a context variable, which follows the request into the
+# threads running its ORM calls. The connections of the thread running them
+# (for async requests, the one sync_to_async() uses for the request) get an
+# execute wrapper adding their queries to that tracker, so concurrent async
+# requests sharing a thread are still counted apart.
+
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds of durations (milliseconds) and query counts
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Longest SQL kept for the most repeated query of a view
+SQL_PREVIEW_LENGTH = 200
+
+# Name of the requests that did not resolve to a URL pattern
+UNRESOLVED = '<unresolved>'
+
+_current = contextvars.ContextVar('request_tracker', default=None)
+
+
+def metrics_enabled():
+    return getattr(settings, 'REQUEST_METRICS_ENABLED', False)
+
+
+class RequestTracker:
+    """
+    Collects the queries and template render time of one request. Called
+    as an execute wrapper for the queries of its request.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.statements = Counter()
+        self._rendering = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        """Number of queries repeating the SQL of an earlier query of the request."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def most_repeated(self):
+        """``(count, sql)`` of the most repeated SQL, or None if no SQL was repeated."""
+        if not self.statements:
+            return None
+        sql, count = self.statements.most_common(1)[0]
+        return (count, sql) if count > 1 else None
+
+
+class TimedTemplate(Template):
+    """Template adding its render time to the recorded request, if any."""
+
+    def render(self, context=None, request=None):
+        tracker = _current.get()
+        # Templates rendered from another one are already counted in its time
+        if tracker is None or tracker._rendering:
+            return super().render(context, request)
+        tracker._rendering += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            tracker._rendering -= 1
+            tracker.template_ms += (time.perf_counter() - started) * 1000
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing renders for the request metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class Histogram:
+    """Counts of observed values per bucket, with their sum."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        # A value equal to a bound belongs to that bound's bucket ("le")
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """``(upper bound, observations up to it)`` pairs, the last bound being None for +Inf."""
+        total = 0
+        for bound, count in zip((*self.bounds, None), self.counts):
+            total += count
+            yield bound, total
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else None,
+            "buckets": {('+Inf' if bound is None else str(bound)): count for bound, count in self.cumulative()},
+        }
+
+
+class ViewMetrics:
+    """Aggregated metrics of the requests of one URL name."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.duration_ms = Histogram(DURATION_BUCKETS_MS)
+        self.sql_ms = Histogram(DURATION_BUCKETS_MS)
+        self.template_ms = Histogram(DURATION_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.duplicate_queries = 0
+        self.requests_with_duplicates = 0
+        self.most_repeated = None
+
+    def add(self, duration_ms, tracker, status):
+        self.requests += 1
+        self.errors += status >= 500
+        self.duration_ms.observe(duration_ms)
+        self.sql_ms.observe(tracker.sql_ms)
+        self.template_ms.observe(tracker.template_ms)
+        self.queries.observe(tracker.queries)
+        duplicates = tracker.duplicates()
+        if duplicates:
+            self.duplicate_queries += duplicates
+            self.requests_with_duplicates += 1
+            repeated = tracker.most_repeated()
+            if self.most_repeated is None or repeated[0] > self.most_repeated[0]:
+                self.most_repeated = (repeated[0], repeated[1][:SQL_PREVIEW_LENGTH])
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "duration_ms": self.duration_ms.as_dict(),
+            "sql_ms": self.sql_ms.as_dict(),
+            "template_ms": self.template_ms.as_dict(),
+            "queries": self.queries.as_dict(),
+            "duplicate_queries": self.duplicate_queries,
+            "requests_with_duplicates": self.requests_with_duplicates,
+            "most_repeated_query": ({"count": self.most_repeated[0], "sql": self.most_repeated[1]}
+                                    if self.most_repeated else None),
+        }
+
+
+_views = {}
+_lock = threading.Lock()
+
+
+def record_request(view, duration_ms, tracker, status):
+    """Adds a request of the URL name ``view`` to the metrics, logging it if slow."""
+    with _lock:
+        _views.setdefault(view, ViewMetrics()).add(duration_ms, tracker, status)
+
+    threshold = getattr(settings, 'REQUEST_SLOW_MS', 500)
+    if duration_ms > threshold:
+        repeated = tracker.most_repeated()
+        logger.warning(
+            "Slow request to %s: %.1f ms (threshold %s ms), status %s, %d queries in %.1f ms "
+            "with %d duplicated, %.1f ms rendering templates%s",
+            view, duration_ms, threshold, status, tracker.queries, tracker.sql_ms, tracker.duplicates(),
+            tracker.template_ms, f"; repeated {repeated[0]} times: {repeated[1][:SQL_PREVIEW_LENGTH]}" if repeated else "",
+        )
+
+
+def metrics_snapshot():
+    """
+    Returns:
+        dict: ``enabled`` and, per URL name, the aggregated metrics of its
+        requests.
+    """
+    with _lock:
+        views = {view: metrics.as_dict() for view, metrics in sorted(_views.items())}
+    return {"enabled": metrics_enabled(), "views": views}
+
+
+def reset_metrics():
+    """Drops every recorded request."""
+    with _lock:
+        _views.clear()
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, help_text, histograms, scale):
+    # ``histograms`` are (view, Histogram) pairs; values are multiplied by ``scale``
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for view, histogram in histograms:
+        label = _label(view)
+        for bound, count in histogram.cumulative():
+            le = '+Inf' if bound is None else f"{bound * scale:g}"
+            lines.append(f'{name}_bucket{{view="{label}",le="{le}"}} {count}')
+        lines.append(f'{name}_sum{{view="{label}"}} {histogram.sum * scale:g}')
+        lines.append(f'{name}_count{{view="{label}"}} {histogram.count}')
+    return lines
+
+
+def _counter_lines(name, help_text, values):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    lines += [f'{name}{{view="{_label(view)}"}} {value}' for view, value in values]
+    return lines
+
+
+def prometheus_metrics():
+    """Returns the metrics in the Prometheus text exposition format, durations in seconds."""
+    with _lock:
+        views = sorted(_views.items())
+        lines = [
+            *_histogram_lines('quizapp_request_duration_seconds', "Wall time of the requests.",
+                              [(view, metrics.duration_ms) for view, metrics in views], 0.001),
+            *_histogram_lines('quizapp_request_sql_duration_seconds', "Time spent in SQL queries per request.",
+                              [(view, metrics.sql_ms) for view, metrics in views], 0.001),
+            *_histogram_lines('quizapp_request_template_duration_seconds', "Time spent rendering templates per request.",
+                              [(view, metrics.template_ms) for view, metrics in views], 0.001),
+            *_histogram_lines('quizapp_request_queries', "SQL queries per request.",
+                              [(view, metrics.queries) for view, metrics in views], 1),
+            *_counter_lines('quizapp_request_errors_total', "Requests answered with a 5xx status.",
+                            [(view, metrics.errors) for view, metrics in views]),
+            *_counter_lines('quizapp_request_duplicate_queries_total', "Queries repeating the SQL of an earlier query of their request.",
+                            [(view, metrics.duplicate_queries) for view, metrics in views]),
+            *_counter_lines('quizapp_requests_with_duplicate_queries_total', "Requests running the same SQL more than once.",
+                            [(view, metrics.requests_with_duplicates) for view, metrics in views]),
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def _execute(execute, sql, params, many, context):
+    # Execute wrapper of every connection, handing the query to the tracker of the current request
+    tracker = _current.get()
+    if tracker is None:
+        return execute(sql, params, many, context)
+    return tracker(execute, sql, params, many, context)
+
+
+def _instrument():
+    # Adds the wrapper to the connections of the calling thread, once
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if _execute not in wrappers:
+            wrappers.append(_execute)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the metrics of every request, sync or async. Disabled unless
+    REQUEST_METRICS_ENABLED is set; list it first in MIDDLEWARE so the wall
+    time covers the other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        _instrument()
+        tracker = RequestTracker()
+        token = _current.set(tracker)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, tracker, started)
+        return response
+
+    async def __acall__(self, request):
+        await sync_to_async(_instrument)()
+        tracker = RequestTracker()
+        token = _current.set(tracker)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, tracker, started)
+        return response
+
+    def record(self, request, response, tracker, started):
+        duration_ms = (time.perf_counter() - started) * 1000
+        match = getattr(request, 'resolver_match', None)
+        record_request(match.view_name if match else UNRESOLVED, duration_ms, tracker, response.status_code)
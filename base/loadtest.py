@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+import asyncio
+import random
+import statistics
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.db.models import Max
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from quiz.models import Choice, Quiz
+from .benchmark import SEED_PREFIX, percentile
+
+# Quizzes whose answer keys are loaded for the quiz GET and POST requests
+QUIZ_SAMPLE = 50
+
+# Search strings used by the search requests; the seeded titles contain them
+SEARCH_TERMS = ['physics', 'history', 'algebra', 'poetry', 'benchmark quiz', 'hist']
+
+# Requests of one session of a virtual user, in order
+ROUTES = ['all_quiz', 'search', 'quiz GET', 'quiz POST', 'quiz_result', 'leaderboard', 'dashboard', 'profile']
+
+# Read-only requests of one session of the WSGI/ASGI comparison, all served by async views
+READ_ROUTES = ['home', 'leaderboard', 'all_quiz', 'search', 'blogs', 'quiz_result']
+
+
+class QueryCounter:
+    """Execute wrapper counting the queries run on a connection."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def sample_quizzes(limit=QUIZ_SAMPLE):
+    """
+    Loads the answer key material of up to ``limit`` quizzes with questions.
+
+    Returns:
+        list: ``(quiz id, {question id: [choice ids]})`` pairs.
+    """
+    quiz_ids = list(Quiz.objects.filter(question__isnull=False).distinct()
+                    .order_by('-created_at').values_list('pk', flat=True)[:limit])
+    questions = {quiz_id: {} for quiz_id in quiz_ids}
+    for quiz_id, question_id, choice_id in (Choice.objects.filter(question__quiz__in=quiz_ids)
+                                            .values_list('question__quiz_id', 'question_id', 'pk')):
+        questions[quiz_id].setdefault(question_id, []).append(choice_id)
+    return list(questions.items())
+
+
+def _request(client, method, path, route, samples, data=None):
+    # Performs one request, recording its route, latency, query count and status
+    counter = QueryCounter()
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        response = getattr(client, method)(path, data)
+    samples.append((route, (time.perf_counter() - started) * 1000, counter.count, response.status_code))
+    return response
+
+
+def run_session(client, admin, username, quizzes, rng, samples):
+    """
+    Runs the requests of ROUTES once, as a user browsing, taking a random
+    quiz and looking at the result, leaderboard and their profile.
+    ``admin`` is a client logged in as a superuser, for the dashboard.
+    """
+    quiz_id, questions = rng.choice(quizzes)
+    answers = {f'question_{question_id}': rng.choice(choices) for question_id, choices in questions.items()}
+
+    _request(client, 'get', reverse('all_quiz'), 'all_quiz', samples)
+    _request(client, 'get', reverse('search_all'), 'search', samples, {'q': rng.choice(SEARCH_TERMS)})
+    _request(client, 'get', reverse('quiz', args=[quiz_id]), 'quiz GET', samples)
+    response = _request(client, 'post', reverse('quiz', args=[quiz_id]), 'quiz POST', samples, answers)
+    if response.status_code == 302:
+        _request(client, 'get', response.url, 'quiz_result', samples)
+    _request(client, 'get', reverse('leaderboard'), 'leaderboard', samples)
+    _request(admin, 'get', reverse('dashboard'), 'dashboard', samples)
+    _request(client, 'get', reverse('profile', args=[username]), 'profile', samples)
+
+
+def _worker(user, superuser, quizzes, sessions, warmup, seed, samples, errors):
+    client, admin = Client(raise_request_exception=False), Client(raise_request_exception=False)
+    client.force_login(user)
+    admin.force_login(superuser)
+    rng = random.Random(seed)
+    try:
+        for i in range(warmup + sessions):
+            # Warmup sessions fill the caches and are not recorded
+            run_session(client, admin, user.username, quizzes, rng, samples if i >= warmup else [])
+    except Exception as error:
+        errors.append(repr(error))
+
+
+def _summary(samples, seconds):
+    latencies = sorted(latency for _, latency, _, _ in samples)
+    queries = [count for _, _, count, _ in samples if count is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, _, status in samples if status >= 400),
+        "requests_per_second": round(len(samples) / seconds, 1) if seconds else None,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "queries_per_request": round(statistics.mean(queries), 2) if queries else None,
+    }
+
+
+def _report(samples, seconds, routes):
+    return {
+        "total": _summary(samples, seconds),
+        "routes": {route: _summary([sample for sample in samples if sample[0] == route], seconds)
+                   for route in routes},
+    }
+
+
+def _seeded_users(count, with_submission=False):
+    # The first ``count`` seeded users; with their latest ``submission_id``, among users having one
+    users = User.objects.filter(username__startswith=f'{SEED_PREFIX}_user_', is_superuser=False)
+    if with_submission:
+        users = users.annotate(submission_id=Max('quizsubmission')).filter(submission_id__isnull=False)
+    return list(users.order_by('pk')[:count])
+
+
+def _run_threads(target, arguments):
+    # Calls ``target`` with each of ``arguments`` concurrently, one thread each,
+    # or in the calling thread (seeing its transaction) for a single call
+    if len(arguments) == 1:
+        target(*arguments[0])
+        return
+
+    def work(*args):
+        try:
+            target(*args)
+        finally:
+            # Each thread has its own database connections
+            connections.close_all()
+
+    threads = [threading.Thread(target=work, args=args) for args in arguments]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_load_test(workers=4, sessions=10, warmup=1, seed=0):
+    """
+    Drives ROUTES with ``workers`` concurrent test clients, each logged in as
+    a different seeded user and running ``warmup`` unrecorded then
+    ``sessions`` recorded sessions. A single worker runs in the calling
+    thread, so it sees the data of the current transaction.
+
+    Returns:
+        dict: Overall and per route request count, error count,
+        requests/sec, p50/p95/p99 latency in milliseconds and queries per
+        request, with the ``errors`` raised by workers.
+    """
+    users = _seeded_users(workers)
+    superuser = User.objects.filter(is_superuser=True).order_by('pk').first()
+    quizzes = sample_quizzes()
+    if not users or superuser is None or not quizzes:
+        raise ValueError("The load test needs seeded users, a superuser and quizzes with questions.")
+
+    samples, errors = [], []
+    started = time.perf_counter()
+    _run_threads(_worker, [(user, superuser, quizzes, sessions, warmup, seed + index, samples, errors)
+                           for index, user in enumerate(users)])
+    seconds = time.perf_counter() - started
+
+    return {
+        "workers": len(users),
+        "sessions": sessions,
+        "seconds": round(seconds, 2),
+        **_report(samples, seconds, ROUTES),
+        "errors": errors,
+    }
+
+
+def _read_session(rng, submission_id):
+    # (route, path, query) of one session of READ_ROUTES
+    return [
+        ('home', reverse('home'), None),
+        ('leaderboard', reverse('leaderboard'), None),
+        ('all_quiz', reverse('all_quiz'), None),
+        ('search', reverse('search_all'), {'q': rng.choice(SEARCH_TERMS)}),
+        ('blogs', reverse('blogs'), None),
+        ('quiz_result', reverse('quiz_result', args=[submission_id]), None),
+    ]
+
+
+def _wsgi_reader(user, sessions, warmup, seed, samples):
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    rng = random.Random(seed)
+    for i in range(warmup + sessions):
+        for route, path, data in _read_session(rng, user.submission_id):
+            _request(client, 'get', path, route, samples if i >= warmup else [], data)
+
+
+async def _asgi_reader(user, sessions, warmup, seed, samples):
+    client = AsyncClient(raise_request_exception=False)
+    await client.aforce_login(user)
+    rng = random.Random(seed)
+    for i in range(warmup + sessions):
+        for route, path, data in _read_session(rng, user.submission_id):
+            started = time.perf_counter()
+            response = await client.get(path, data)
+            # Concurrent requests share the thread running the ORM calls, so queries are not counted
+            if i >= warmup:
+                samples.append((route, (time.perf_counter() - started) * 1000, None, response.status_code))
+
+
+def run_handler_comparison(workers=4, sessions=10, warmup=1, seed=0):
+    """
+    Serves READ_ROUTES to ``workers`` concurrent clients, first through the
+    WSGI handler (one thread and test client each), then through the ASGI
+    handler (one task and async test client each, on a single event loop).
+
+    Returns:
+        dict: Per handler, overall and per route results as in
+        run_load_test(), and ``asgi_speedup``, the ratio of ASGI to WSGI
+        requests/sec.
+    """
+    users = _seeded_users(workers, with_submission=True)
+    if not users:
+        raise ValueError("The comparison needs seeded users with submissions.")
+    arguments = [(user, sessions, warmup, seed + index) for index, user in enumerate(users)]
+
+    wsgi_samples = []
+    started = time.perf_counter()
+    _run_threads(_wsgi_reader, [(*args, wsgi_samples) for args in arguments])
+    wsgi_seconds = time.perf_counter() - started
+
+    asgi_samples = []
+
+    async def serve():
+        await asyncio.gather(*(_asgi_reader(*args, asgi_samples) for args in arguments))
+
+    started = time.perf_counter()
+    # Called through async_to_sync so the ORM calls run in this thread, on its connection
+    async_to_sync(serve)()
+    asgi_seconds = time.perf_counter() - started
+
+    wsgi = _report(wsgi_samples, wsgi_seconds, READ_ROUTES)
+    asgi = _report(asgi_samples, asgi_seconds, READ_ROUTES)
+    wsgi_rate, asgi_rate = wsgi['total']['requests_per_second'], asgi['total']['requests_per_second']
+    return {
+        "workers": len(users),
+        "sessions": sessions,
+        "wsgi": {"seconds": round(wsgi_seconds, 2), **wsgi},
+        "asgi": {"seconds": round(asgi_seconds, 2), **asgi},
+        "asgi_speedup": round(asgi_rate / wsgi_rate, 2) if wsgi_rate and asgi_rate else None,
+    }
+
+
+def compare_reports(report, baseline):
+    """
+    Compares two run_load_test() reports route by route.
+
+    Returns:
+        dict: Per route, the relative change of p95 latency and of queries
+        per request (0.1 is 10% more than the baseline), None where the
+        baseline has no value.
+    """
+    def change(new, old):
+        return round((new - old) / old, 3) if old else None
+
+    routes = {**report['routes'], 'total': report['total']}
+    base_routes = {**baseline['routes'], 'total': baseline['total']}
+    return {
+        route: {
+            "p95_ms": change(stats['p95_ms'], base_routes[route]['p95_ms']),
+            "queries_per_request": change(stats['queries_per_request'], base_routes[route]['queries_per_request']),
+        }
+        for route, stats in routes.items() if route in base_routes
+    }
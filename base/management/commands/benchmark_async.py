@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from base.benchmark import delete_seeded, seed_dataset
+from base.loadtest import READ_ROUTES, run_handler_comparison
+
+
+class Command(BaseCommand):
+    help = ("Seed a dataset, then serve the read-heavy async views to concurrent clients through the WSGI and "
+            "the ASGI handler, and compare their throughput and latency. The seeded data is deleted unless "
+            "--keep is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Users to seed.")
+        parser.add_argument('--quizzes', type=int, default=100, help="Quizzes to seed.")
+        parser.add_argument('--questions', type=int, default=10, help="Questions per seeded quiz.")
+        parser.add_argument('--submissions', type=int, default=5000, help="Submissions to seed.")
+        parser.add_argument('--no-seed', action='store_true', help="Reuse the data of an earlier --keep run.")
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent clients.")
+        parser.add_argument('--sessions', type=int, default=10, help="Recorded sessions per client.")
+        parser.add_argument('--warmup', type=int, default=1, help="Unrecorded sessions per client, run first.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed of the data and the requests.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded data after the run.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        seeded = None
+        try:
+            if not options['no_seed']:
+                seeded = seed_dataset(options['users'], options['quizzes'], options['questions'],
+                                      options['submissions'], options['seed'])
+                self.stderr.write("Seeded " + ", ".join(f"{count} {name}" for name, count in seeded.counts.items()))
+
+            # The test clients send requests for the "testserver" host
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                try:
+                    report = run_handler_comparison(options['workers'], options['sessions'], options['warmup'],
+                                                    options['seed'])
+                except ValueError as error:
+                    raise CommandError(error)
+        finally:
+            if seeded is not None and not options['keep']:
+                delete_seeded(seeded)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{report['workers']} concurrent clients, {report['sessions']} sessions each")
+        for route in ['total', *READ_ROUTES]:
+            self.stdout.write(self.style.MIGRATE_HEADING(route))
+            for handler in ('wsgi', 'asgi'):
+                stats = report[handler]['total'] if route == 'total' else report[handler]['routes'][route]
+                self.stdout.write(f"  {handler}: {stats['requests_per_second']} req/s, p50 {stats['p50_ms']} ms, "
+                                  f"p95 {stats['p95_ms']} ms, p99 {stats['p99_ms']} ms, {stats['errors']} errors")
+        self.stdout.write(f"ASGI/WSGI throughput: {report['asgi_speedup']}x")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from base.benchmark import analyze_tables, compare_index_pack, seed_dataset
+
+
+class Command(BaseCommand):
+    help = ("Seed a benchmark dataset, then report EXPLAIN plans and timings of the hot view queries "
+            "with and without the hot path indexes. Everything is rolled back unless --keep is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help="Users to seed.")
+        parser.add_argument('--quizzes', type=int, default=200, help="Quizzes to seed.")
+        parser.add_argument('--questions', type=int, default=10, help="Questions per seeded quiz.")
+        parser.add_argument('--submissions', type=int, default=20000, help="Submissions to seed.")
+        parser.add_argument('--no-seed', action='store_true', help="Measure the existing data without seeding.")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs of each query.")
+        parser.add_argument('--analyze', action='store_true', help="Use EXPLAIN ANALYZE (PostgreSQL only).")
+        parser.add_argument('--keep', action='store_true', help="Commit the seeded data instead of rolling it back.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not options['no_seed']:
+                seeded = seed_dataset(options['users'], options['quizzes'], options['questions'], options['submissions'])
+                analyze_tables()
+                self.stderr.write("Seeded " + ", ".join(f"{count} {name}" for name, count in seeded.counts.items()))
+            report = compare_index_pack(options['repeat'], options['analyze'])
+            transaction.set_rollback(not options['keep'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for name, after in report['after'].items():
+            before = report['before'][name]
+            speedup = before['median_ms'] / after['median_ms'] if after['median_ms'] else None
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  without indexes: median {before['median_ms']} ms, p95 {before['p95_ms']} ms")
+            self.stdout.write(f"  with indexes:    median {after['median_ms']} ms, p95 {after['p95_ms']} ms"
+                              + (f" ({speedup:.1f}x)" if speedup else ""))
+            self.stdout.write("  plan without indexes:")
+            self.stdout.write("    " + before['plan'].replace("\n", "\n    "))
+            self.stdout.write("  plan with indexes:")
+            self.stdout.write("    " + after['plan'].replace("\n", "\n    "))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from base.benchmark import SEED_PREFIX, delete_seeded, seed_dataset
+from base.loadtest import compare_reports, run_load_test
+
+
+class Command(BaseCommand):
+    help = ("Seed a dataset, then drive the quiz-taking flow (listing, search, quiz GET and POST, result, "
+            "leaderboard, dashboard, profile) with concurrent test clients and print latency percentiles, "
+            "requests/sec and queries per request as JSON. The seeded data is deleted unless --keep is given. "
+            "The dashboard is requested as the first superuser; without one, a superuser without a usable "
+            "password is created for the run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Users to seed.")
+        parser.add_argument('--quizzes', type=int, default=100, help="Quizzes to seed.")
+        parser.add_argument('--questions', type=int, default=10, help="Questions per seeded quiz.")
+        parser.add_argument('--submissions', type=int, default=5000, help="Submissions to seed.")
+        parser.add_argument('--no-seed', action='store_true', help="Reuse the data of an earlier --keep run.")
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent clients.")
+        parser.add_argument('--sessions', type=int, default=10, help="Recorded sessions per worker.")
+        parser.add_argument('--warmup', type=int, default=1, help="Unrecorded sessions per worker, run first.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed of the data and the requests.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded data after the run.")
+        parser.add_argument('--output', help="Also write the report to this file.")
+        parser.add_argument('--baseline', help="Report of an earlier run to compare with.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+        seeded = admin = None
+        try:
+            if not options['no_seed']:
+                seeded = seed_dataset(options['users'], options['quizzes'], options['questions'],
+                                      options['submissions'], options['seed'])
+                self.stderr.write("Seeded " + ", ".join(f"{count} {name}" for name, count in seeded.counts.items()))
+            if not User.objects.filter(is_superuser=True).exists():
+                # The clients are logged in with force_login(), so nobody can log in as this user
+                admin = User.objects.create_superuser(f'{SEED_PREFIX}_admin', password=None)
+
+            # The test client sends requests for the "testserver" host
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                try:
+                    report = run_load_test(options['workers'], options['sessions'], options['warmup'], options['seed'])
+                except ValueError as error:
+                    raise CommandError(error)
+        finally:
+            if seeded is not None and not options['keep']:
+                delete_seeded(seeded)
+            if admin is not None and not options['keep']:
+                admin.delete()
+
+        if baseline is not None:
+            report['baseline_change'] = compare_reports(report, baseline)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + "\n")
+        self.stdout.write(output)
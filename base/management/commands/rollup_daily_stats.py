@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from base.metrics import rollup_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Roll up the activity of every completed day that has no DailyStats rows yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--until',
+            type=datetime.date.fromisoformat,
+            help="Last day to roll up (YYYY-MM-DD). Defaults to yesterday.",
+        )
+
+    def handle(self, *args, **options):
+        days = rollup_daily_stats(until=options['until'])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {days} day(s)."))
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import datetime
+import math
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from quiz.models import Quiz, QuizSubmission, Question
+from .models import DailyStats
+
+DASHBOARD_METRICS_CACHE_KEY = 'dashboard-metrics'
+
+# Trend windows shown on the dashboard, in days
+TREND_PERIODS = (30, 90, 365)
+
+
+def day_range(day=None):
+    """
+    Returns the half-open ``[start, end)`` datetime range covering a local day.
+
+    Filtering on ``field >= start`` and ``field < end`` lets the database use
+    an index on the timestamp column, unlike ``field__date=day``.
+    """
+    day = day or timezone.localdate()
+    start = datetime.datetime.combine(day, datetime.time.min)
+    if settings.USE_TZ:
+        start = timezone.make_aware(start)
+    return start, start + datetime.timedelta(days=1)
+
+
+def gain_percentage(total, today):
+    if total > 0 and today > 0:
+        gain = math.floor((today *100)/total)
+        return gain
+
+
+def _count_today(queryset, field, start, end):
+    # Total and today's rows of a table, in a single query
+    return queryset.aggregate(
+        total=Count('pk'),
+        today=Count('pk', filter=Q(**{f'{field}__gte': start, f'{field}__lt': end})),
+    )
+
+
+def compute_dashboard_metrics():
+    """
+    Computes the dashboard totals, today-counts and gain percentages with one
+    conditional aggregation query per table.
+
+    Returns:
+        dict: Context variables used by dashboard.html.
+    """
+    start, end = day_range()
+    users = _count_today(User.objects.all(), 'date_joined', start, end)
+    quizzes = _count_today(Quiz.objects.all(), 'created_at', start, end)
+    submissions = _count_today(QuizSubmission.objects.all(), 'submitted_at', start, end)
+    questions = _count_today(Question.objects.all(), 'quiz__created_at', start, end)
+
+    return {
+        "trends": trend_metrics(),
+        "total_users": users['total'],
+        "total_quizzes": quizzes['total'],
+        "total_quiz_submit": submissions['total'],
+        "total_questions": questions['total'],
+        "today_users": users['today'],
+        "today_quizzes": quizzes['today'],
+        "today_quiz_submit": submissions['today'],
+        "today_questions": questions['today'],
+        "gain_users": gain_percentage(users['total'], users['today']),
+        "gain_quizzes": gain_percentage(quizzes['total'], quizzes['today']),
+        "gain_quiz_submit": gain_percentage(submissions['total'], submissions['today']),
+        "gain_questions": gain_percentage(questions['total'], questions['today']),
+    }
+
+
+def dashboard_metrics():
+    """
+    Returns the dashboard metrics snapshot, cached for DASHBOARD_METRICS_TTL
+    seconds so that refreshing the dashboard under load stays cheap.
+    """
+    timeout = getattr(settings, 'DASHBOARD_METRICS_TTL', 30)
+    return cache.get_or_set(DASHBOARD_METRICS_CACHE_KEY, compute_dashboard_metrics, timeout)
+
+
+def trend_metrics(today=None):
+    """
+    Sums the DailyStats rollup rows over each of the TREND_PERIODS, in one
+    query reading at most a year of all-categories rows.
+
+    Returns:
+        list: One dict per period with its totals and average score.
+    """
+    today = today or timezone.localdate()
+    aggregates = {}
+    for days in TREND_PERIODS:
+        in_period = Q(day__gte=today - datetime.timedelta(days=days))
+        for field in ('new_users', 'new_quizzes', 'new_submissions', 'new_questions', 'total_score'):
+            aggregates[f'{field}_{days}'] = Sum(field, filter=in_period, default=0)
+    totals = (DailyStats.objects
+              .filter(category__isnull=True, day__gte=today - datetime.timedelta(days=max(TREND_PERIODS)))
+              .aggregate(**aggregates))
+
+    trends = []
+    for days in TREND_PERIODS:
+        submissions = totals[f'new_submissions_{days}']
+        trends.append({
+            "days": days,
+            "new_users": totals[f'new_users_{days}'],
+            "new_quizzes": totals[f'new_quizzes_{days}'],
+            "new_submissions": submissions,
+            "new_questions": totals[f'new_questions_{days}'],
+            "average_score": round(totals[f'total_score_{days}'] / submissions, 2) if submissions else None,
+        })
+    return trends
+
+
+def _first_activity_day():
+    # Local day of the oldest user, quiz or submission, or None on an empty database
+    candidates = [
+        User.objects.aggregate(first=Min('date_joined'))['first'],
+        Quiz.objects.aggregate(first=Min('created_at'))['first'],
+        QuizSubmission.objects.aggregate(first=Min('submitted_at'))['first'],
+    ]
+    candidates = [timezone.localdate(moment) if settings.USE_TZ else moment.date() for moment in candidates if moment]
+    return min(candidates) if candidates else None
+
+
+def _per_day(queryset, field, group_by=(), **aggregates):
+    # Rows of ``queryset`` grouped by the local day of ``field`` (and ``group_by``)
+    return (queryset.annotate(day=TruncDate(field))
+            .values('day', *group_by)
+            .annotate(**aggregates)
+            .order_by())
+
+
+def rollup_daily_stats(until=None):
+    """
+    Writes the DailyStats rows of every completed day not rolled up yet.
+
+    Days are processed from the day after the last rolled up one (or the
+    first day with any activity) up to ``until``, yesterday by default. Each
+    table is aggregated once for the whole range, grouped by day and
+    category.
+
+    Returns:
+        int: Number of days rolled up.
+    """
+    until = until or timezone.localdate() - datetime.timedelta(days=1)
+    last_day = DailyStats.objects.filter(category__isnull=True).aggregate(last=Max('day'))['last']
+    first_day = last_day + datetime.timedelta(days=1) if last_day else _first_activity_day()
+    if first_day is None or first_day > until:
+        return 0
+    start, end = day_range(first_day)[0], day_range(until)[1]
+
+    rows = {}
+
+    def row(day, category_id):
+        if (day, category_id) not in rows:
+            rows[(day, category_id)] = DailyStats(day=day, category_id=category_id)
+        return rows[(day, category_id)]
+
+    # One all-categories row per day, even without activity, marks the day as done
+    days = (until - first_day).days + 1
+    for offset in range(days):
+        row(first_day + datetime.timedelta(days=offset), None)
+
+    users = User.objects.filter(date_joined__gte=start, date_joined__lt=end)
+    for entry in _per_day(users, 'date_joined', count=Count('pk')):
+        row(entry['day'], None).new_users = entry['count']
+
+    quizzes = Quiz.objects.filter(created_at__gte=start, created_at__lt=end)
+    for entry in _per_day(quizzes, 'created_at', ('category',), count=Count('pk', distinct=True), questions=Count('question')):
+        for category_id in (entry['category'], None):
+            stats = row(entry['day'], category_id)
+            stats.new_quizzes += entry['count']
+            stats.new_questions += entry['questions']
+
+    submissions = QuizSubmission.objects.filter(submitted_at__gte=start, submitted_at__lt=end)
+    for entry in _per_day(submissions, 'submitted_at', ('quiz__category',), count=Count('pk'), score=Sum('score')):
+        for category_id in (entry['quiz__category'], None):
+            stats = row(entry['day'], category_id)
+            stats.new_submissions += entry['count']
+            stats.total_score += entry['score'] or 0
+
+    for stats in rows.values():
+        if stats.new_submissions:
+            stats.average_score = stats.total_score / stats.new_submissions
+
+    with transaction.atomic():
+        DailyStats.objects.bulk_create(rows.values(), batch_size=1000)
+    return days
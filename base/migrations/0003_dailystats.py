@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0002_profile_content'),
+        ('quiz', '0004_submissionanswer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('new_users', models.PositiveIntegerField(default=0)),
+                ('new_quizzes', models.PositiveIntegerField(default=0)),
+                ('new_submissions', models.PositiveIntegerField(default=0)),
+                ('new_questions', models.PositiveIntegerField(default=0)),
+                ('total_score', models.PositiveIntegerField(default=0)),
+                ('average_score', models.FloatField(blank=True, null=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='quiz.category')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily stats',
+                'constraints': [models.UniqueConstraint(fields=('day', 'category'), name='unique_daily_stats_category'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('day',), name='unique_daily_stats_all')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Indexes serving base.user_search on PostgreSQL. Django's icontains and
+# istartswith lookups compare UPPER(column) with LIKE, so the indexes are built
+# on that expression: trigram GIN indexes for substring matches, and a
+# text_pattern_ops B-tree for username prefixes shorter than a trigram.
+TRIGRAM_COLUMNS = ('username', 'first_name', 'last_name')
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS auth_user_{column}_trgm "
+            f"ON auth_user USING gin (UPPER({column}::text) gin_trgm_ops)")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS auth_user_username_upper_prefix "
+        "ON auth_user (UPPER(username::text) text_pattern_ops)")
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS auth_user_{column}_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS auth_user_username_upper_prefix")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('base', '0003_dailystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
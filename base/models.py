@@ -4,6 +4,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django_ckeditor_5.fields import CKEditor5Field
 from ckeditor.fields import RichTextField
+from quiz.models import Category
 
    
 
@@ -56,6 +57,11 @@ class Message(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'is_read'], name='message_created_read_idx'),
+        ]
+
     def __str__(self):
         """
         Returns a string representation of the message instance.
@@ -90,6 +96,11 @@ class Blog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='blog_status_created_idx'),
+        ]
+
     def __str__(self):
         """
         Returns a string representation of the blog instance.
@@ -98,3 +109,48 @@ class Blog(models.Model):
             str: Title of the blog post.
         """
         return self.title
+
+
+# DailyStats model holding pre-aggregated activity per day
+class DailyStats(models.Model):
+    """
+    Model representing the activity of one day, for all categories or for a single one.
+
+    Rows are written by the rollup_daily_stats management command, once per
+    completed day, so trend charts read a few hundred rows instead of
+    scanning the raw users, quizzes and submissions tables.
+
+    Attributes:
+        day (DateField): The (local) day the row describes.
+        category (ForeignKey): Category of the row, or None for the all-categories row.
+        new_users (PositiveIntegerField): Users who joined that day (all-categories row only).
+        new_quizzes (PositiveIntegerField): Quizzes created that day.
+        new_submissions (PositiveIntegerField): Quiz submissions made that day.
+        new_questions (PositiveIntegerField): Questions of the quizzes created that day.
+        total_score (PositiveIntegerField): Sum of the scores of that day's submissions.
+        average_score (FloatField): Average score of that day's submissions, if any.
+    """
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    new_users = models.PositiveIntegerField(default=0)
+    new_quizzes = models.PositiveIntegerField(default=0)
+    new_submissions = models.PositiveIntegerField(default=0)
+    new_questions = models.PositiveIntegerField(default=0)
+    total_score = models.PositiveIntegerField(default=0)
+    average_score = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Daily stats'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='unique_daily_stats_category'),
+            models.UniqueConstraint(fields=['day'], condition=models.Q(category__isnull=True), name='unique_daily_stats_all'),
+        ]
+
+    def __str__(self):
+        """
+        Returns a string representation of the daily stats instance.
+
+        Returns:
+            str: Day and category of the row.
+        """
+        return f"{self.day}, {self.category or 'All categories'}"
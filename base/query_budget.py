@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+# Query budgets: the most SQL queries one request to a view may run.
+#
+# Views declare their budget with the query_budget decorator. The
+# query_budget tagged tests (python manage.py test --tag query_budget)
+# request every URL name of BUDGETED_URLCONFS at two data scales, and fail if
+# a view has no budget, exceeds it, or runs more queries on the larger data.
+
+from importlib import import_module
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+
+# URL configurations whose views must all declare a budget
+BUDGETED_URLCONFS = ('base.urls', 'quiz.urls', 'account.urls')
+
+
+def query_budget(limit, post=None):
+    """
+    Declares the most queries a GET request to the decorated view may run,
+    and ``post`` for a POST request, if it is budgeted.
+    """
+    def decorator(view):
+        view.query_budget = {'GET': limit, 'POST': post}
+        return view
+    return decorator
+
+
+def view_budget(view, method='GET'):
+    """Returns the query budget of ``view`` for ``method``, or None if it declares none."""
+    return getattr(view, 'query_budget', {}).get(method)
+
+
+def budgeted_views(urlconfs=BUDGETED_URLCONFS):
+    """
+    Returns:
+        dict: The view of every named URL pattern of ``urlconfs``, by URL name.
+    """
+    views = {}
+    for urlconf in urlconfs:
+        for pattern in import_module(urlconf).urlpatterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                views.setdefault(pattern.name, pattern.callback)
+    return views
+
+
+def missing_budgets(urlconfs=BUDGETED_URLCONFS):
+    """Returns the sorted URL names of ``urlconfs`` whose view declares no budget."""
+    return sorted(name for name, view in budgeted_views(urlconfs).items() if view_budget(view) is None)
+
+
+def count_queries(client, method, path, data=None):
+    """
+    Performs a request with the test ``client``.
+
+    Returns:
+        tuple: The response and the number of queries it ran.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, method.lower())(path, data)
+    return response, len(queries)
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+
+# Helpers of the async views.
+#
+# Querysets are evaluated with the async ORM. Templates are still rendered
+# synchronously: the auth, messages and categories context processors load
+# lazily and may query the database, which Django forbids in async code.
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+
+
+async def alist(queryset):
+    """Evaluate ``queryset`` with the async ORM, returning its rows as a list."""
+    return [row async for row in queryset]
+
+
+async def arender(request, template_name, context=None, status=None):
+    """Async version of django.shortcuts.render(), rendering in the sync thread."""
+    # request.user and request.auser() cache the user separately: share the async one
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, template_name, context, status=status)
@@ -1,9 +1,27 @@
 #!/usr/bin/env python3
 
-from django.test import TestCase
+from django.test import AsyncClient, Client, TestCase, override_settings, tag
 from django.contrib.auth.models import User
-from .models import Message
+from account.models import Profile
+from .benchmark import seed_dataset
+from .checks import cache_messages, database_connection_messages, pool_sizes
+from .models import Blog, Message, DailyStats
+from .instrumentation import RequestTracker, metrics_snapshot, reset_metrics
+from .loadtest import compare_reports
+from .query_budget import budgeted_views, count_queries, missing_budgets, view_budget
+from .metrics import compute_dashboard_metrics, dashboard_metrics, rollup_daily_stats, trend_metrics
+from quiz.leaderboard import rebuild_leaderboard
+from quiz.models import Category, Quiz, Question, QuizSubmission
+from quiz.search import clear_search_index
+from django.core.cache import cache
 from django.urls import reverse
+from django.utils import timezone
+import datetime
+import io
+import json
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import connection
 
 class MessageModelTest(TestCase):
     # set up
@@ -67,4 +85,456 @@ class MessageUrlTest(TestCase):
         url = reverse('message', args=[self.message.id])
         response = self.client.get(url)
 
-        self.assertEqual(response.status_code, 302)
\ No newline at end of file
+        self.assertEqual(response.status_code, 302)
+
+class DashboardViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.superuser = User.objects.create_superuser(username='superuser', password='testpass')
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        User.objects.filter(pk=self.user.pk).update(date_joined=timezone.now() - datetime.timedelta(days=3))
+
+        category = Category.objects.create(name='Science')
+        self.quiz = Quiz.objects.create(title='Quiz title', description='Desc', category=category)
+        for i in range(3):
+            Question.objects.create(quiz=self.quiz, text=f'Question {i}')
+        QuizSubmission.objects.create(user=self.user, quiz=self.quiz, score=2)
+
+        self.client.login(username='superuser', password='testpass')
+
+    def test_dashboard_metrics(self):
+        response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_users'], 2)
+        self.assertEqual(response.context['today_users'], 1)
+        self.assertEqual(response.context['gain_users'], 50)
+        self.assertEqual(response.context['today_quizzes'], 1)
+        self.assertEqual(response.context['total_questions'], 3)
+        self.assertEqual(response.context['today_questions'], 3)
+        self.assertEqual(response.context['today_quiz_submit'], 1)
+
+    def test_dashboard_metrics_queries(self):
+        # One aggregation per table, plus one for the trends
+        with self.assertNumQueries(5):
+            compute_dashboard_metrics()
+
+        # The snapshot is cached
+        dashboard_metrics()
+        with self.assertNumQueries(0):
+            dashboard_metrics()
+
+
+class DailyStatsRollupTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.science = Category.objects.create(name='Science')
+        self.english = Category.objects.create(name='English')
+        self.quiz = Quiz.objects.create(title='Science quiz', description='Desc', category=self.science)
+        Question.objects.create(quiz=self.quiz, text='Question')
+        other_quiz = Quiz.objects.create(title='English quiz', description='Desc', category=self.english)
+        QuizSubmission.objects.create(user=self.user, quiz=self.quiz, score=2)
+        QuizSubmission.objects.create(user=self.user, quiz=other_quiz, score=5)
+
+        # Move everything two days back
+        self.day = timezone.localdate() - datetime.timedelta(days=2)
+        moment = timezone.now() - datetime.timedelta(days=2)
+        User.objects.update(date_joined=moment)
+        Quiz.objects.update(created_at=moment)
+        QuizSubmission.objects.update(submitted_at=moment)
+
+    def test_rollup(self):
+        out = io.StringIO()
+        call_command('rollup_daily_stats', stdout=out)
+        self.assertIn('Rolled up 2 day(s).', out.getvalue())
+
+        total = DailyStats.objects.get(day=self.day, category__isnull=True)
+        self.assertEqual((total.new_users, total.new_quizzes, total.new_submissions, total.new_questions), (1, 2, 2, 1))
+        self.assertEqual(total.average_score, 3.5)
+        science = DailyStats.objects.get(day=self.day, category=self.science)
+        self.assertEqual((science.new_quizzes, science.new_submissions, science.average_score), (1, 1, 2.0))
+        self.assertTrue(DailyStats.objects.filter(day=self.day + datetime.timedelta(days=1), category__isnull=True).exists())
+
+        # Days already rolled up are not processed again
+        self.assertEqual(rollup_daily_stats(), 0)
+
+        trends = trend_metrics()
+        self.assertEqual([trend['days'] for trend in trends], [30, 90, 365])
+        self.assertEqual(trends[0]['new_submissions'], 2)
+        self.assertEqual(trends[0]['average_score'], 3.5)
+
+
+class LeaderboardViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Science')
+        self.quiz = Quiz.objects.create(title='Quiz', description='Desc', category=category)
+        self.users = [User.objects.create_user(username=f'player{i}', password='pass') for i in range(3)]
+        for score, user in zip((1, 3, 2), self.users):
+            QuizSubmission.objects.create(user=user, quiz=self.quiz, score=score)
+
+    def test_home_top_four_is_cached(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual([entry['username'] for entry in response.context['leaderboard_users']],
+                         ['player1', 'player2', 'player0'])
+
+        # A warm cache serves the home page without touching the database
+        with self.assertNumQueries(0):
+            self.client.get(reverse('home'))
+
+    def test_submission_invalidates_cache(self):
+        self.client.get(reverse('home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            QuizSubmission.objects.create(user=self.users[0], quiz=self.quiz, score=5)
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['leaderboard_users'][0]['username'], 'player0')
+
+    def test_leaderboard_pagination(self):
+        self.client.login(username='player0', password='pass')
+        with patch('quiz.leaderboard.LEADERBOARD_PAGE_SIZE', 2):
+            response = self.client.get(reverse('leaderboard'))
+            page = response.context['leaderboard_users']
+            self.assertEqual([entry['rank'] for entry in page], [1, 2])
+            self.assertTrue(page.has_next)
+
+            response = self.client.get(reverse('leaderboard'), {'cursor': page.next_cursor})
+            page = response.context['leaderboard_users']
+            self.assertEqual([entry['username'] for entry in page], ['player0'])
+            self.assertFalse(page.has_next)
+
+
+class UserSearchTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='alice', password='pass', first_name='Alice', last_name='Smith')
+        User.objects.create_user(username='bob', password='pass', first_name='Robert', last_name='Alison')
+        User.objects.create_user(username='malika', password='pass')
+
+    def usernames(self, response):
+        return [user['username'] for user in response.context['users']]
+
+    def test_short_query_matches_prefixes_and_is_cached(self):
+        response = self.client.get(reverse('search_users'), {'q': 'al'})
+        self.assertEqual(self.usernames(response), ['alice', 'bob'])
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('search_users'), {'q': 'AL '})
+
+    def test_long_query_matches_substrings(self):
+        response = self.client.get(reverse('search_users'), {'q': 'ali'})
+        self.assertEqual(self.usernames(response), ['alice', 'bob', 'malika'])
+
+        response = self.client.get(reverse('search_users'))
+        self.assertEqual(self.usernames(response), [])
+
+    def test_pagination(self):
+        with patch('base.user_search.USERS_PER_PAGE', 2):
+            response = self.client.get(reverse('search_users'), {'q': 'ali'})
+            users = response.context['users']
+            self.assertTrue(users.has_next)
+
+            response = self.client.get(reverse('search_users'), {'q': 'ali', 'cursor': users.next_cursor})
+            self.assertEqual(self.usernames(response), ['malika'])
+
+    def test_typeahead(self):
+        response = self.client.get(reverse('search_users_typeahead'), {'q': 'ali'})
+        results = response.json()['results']
+        # Usernames starting with the query come first
+        self.assertEqual([user['username'] for user in results], ['alice', 'bob', 'malika'])
+        self.assertEqual(results[0]['full_name'], 'Alice Smith')
+
+
+class BenchmarkQueriesCommandTest(TestCase):
+
+    def test_report_and_rollback(self):
+        out = io.StringIO()
+        call_command('benchmark_queries', users=5, quizzes=2, questions=2, submissions=10, repeat=1, json=True,
+                     stdout=out, stderr=io.StringIO())
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['before'].keys(), report['after'].keys())
+        self.assertIn('profile history', report['after'])
+        self.assertIn('submission_user_time_idx', report['after']['profile history']['plan'])
+        self.assertNotIn('submission_user_time_idx', report['before']['profile history']['plan'])
+
+        # The seeded data is rolled back
+        self.assertFalse(User.objects.filter(username__startswith='bench_user_').exists())
+
+
+class LoadTestCommandTest(TestCase):
+
+    def test_single_worker_report(self):
+        existing = Category.objects.create(name='Bench 1')  # Not seeded, so never deleted
+        out = io.StringIO()
+        call_command('load_test', users=3, quizzes=2, questions=2, submissions=5, workers=1, sessions=2,
+                     stdout=out, stderr=io.StringIO())
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(report['total']['errors'], 0)
+        self.assertEqual(report['routes']['quiz POST']['requests'], 2)
+        self.assertEqual(set(report['routes']), {'all_quiz', 'search', 'quiz GET', 'quiz POST', 'quiz_result',
+                                                 'leaderboard', 'dashboard', 'profile'})
+        self.assertGreater(report['routes']['quiz POST']['queries_per_request'], 0)
+        self.assertIn('p99_ms', report['total'])
+
+        # The seeded data and the superuser created for the run are deleted afterwards
+        self.assertFalse(User.objects.filter(username__startswith='bench_').exists())
+        self.assertEqual(list(Category.objects.all()), [existing])
+
+    def test_handler_comparison(self):
+        out = io.StringIO()
+        call_command('benchmark_async', users=3, quizzes=2, questions=2, submissions=10, workers=1, sessions=1,
+                     json=True, stdout=out, stderr=io.StringIO())
+        report = json.loads(out.getvalue())
+
+        for handler in ('wsgi', 'asgi'):
+            self.assertEqual(report[handler]['total']['requests'], 6)
+            self.assertEqual(report[handler]['total']['errors'], 0)
+            self.assertEqual(set(report[handler]['routes']),
+                             {'home', 'leaderboard', 'all_quiz', 'search', 'blogs', 'quiz_result'})
+        self.assertIsNotNone(report['asgi_speedup'])
+
+    def test_baseline_comparison(self):
+        stats = {'p95_ms': 10.0, 'queries_per_request': 4}
+        baseline = {'total': stats, 'routes': {'profile': stats}}
+        report = {'total': {'p95_ms': 12.0, 'queries_per_request': 4}, 'routes': {'profile': stats}}
+        self.assertEqual(compare_reports(report, baseline), {
+            'profile': {'p95_ms': 0.0, 'queries_per_request': 0.0},
+            'total': {'p95_ms': 0.2, 'queries_per_request': 0.0},
+        })
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_SLOW_MS=60 * 1000)
+class RequestMetricsTest(TestCase):
+
+    def setUp(self):
+        reset_metrics()
+        self.superuser = User.objects.create_superuser(username='superuser', password='testpass')
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        category = Category.objects.create(name='Science')
+        Quiz.objects.create(title='Quiz title', description='Desc', category=category)
+        # The middleware is set up on the first request of a client
+        self.client = Client()
+        self.client.login(username='superuser', password='testpass')
+
+    def test_requests_are_recorded_per_url_name(self):
+        self.client.get(reverse('all_quiz'))
+        self.client.get(reverse('all_quiz'))
+
+        metrics = self.client.get(reverse('metrics')).json()
+        self.assertTrue(metrics['enabled'])
+        listing = metrics['views']['all_quiz']
+        self.assertEqual(listing['requests'], 2)
+        self.assertEqual(listing['errors'], 0)
+        self.assertGreater(listing['queries']['sum'], 0)
+        self.assertEqual(listing['template_ms']['count'], 2)
+        self.assertGreater(listing['template_ms']['sum'], 0)
+
+        text = self.client.get(reverse('metrics_prometheus')).content.decode()
+        self.assertIn('quizapp_request_duration_seconds_bucket{view="all_quiz",le="+Inf"} 2', text)
+        self.assertIn('quizapp_request_queries_count{view="all_quiz"} 2', text)
+
+    def test_metrics_are_superuser_only(self):
+        self.client.login(username='testuser', password='testpass')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+        self.assertEqual(self.client.get(reverse('metrics_prometheus')).status_code, 302)
+
+    def test_duplicate_queries(self):
+        tracker = RequestTracker()
+        with connection.execute_wrapper(tracker):
+            for pk in (1, 2, 3):
+                list(User.objects.filter(pk=pk))
+            list(Quiz.objects.all())
+        self.assertEqual(tracker.queries, 4)
+        self.assertEqual(tracker.duplicates(), 2)
+        self.assertEqual(tracker.most_repeated()[0], 3)
+
+    def test_slow_request_log(self):
+        with self.settings(REQUEST_SLOW_MS=0), self.assertLogs('base.instrumentation', 'WARNING') as logs:
+            self.client.get(reverse('all_quiz'))
+        self.assertIn('Slow request to all_quiz', logs.output[0])
+
+    async def test_async_requests_are_recorded(self):
+        client = AsyncClient()
+        await client.aforce_login(self.superuser)
+        response = await client.get(reverse('blogs'))
+        self.assertEqual(response.status_code, 200)
+
+        blogs = metrics_snapshot()['views']['blogs']
+        self.assertEqual(blogs['requests'], 1)
+        self.assertGreaterEqual(blogs['queries']['sum'], 2)  # The yearly counts and the blog list
+        self.assertEqual(blogs['template_ms']['count'], 1)
+
+
+@tag('query_budget')
+class QueryBudgetTest(TestCase):
+    """
+    Requests every URL name of the base, quiz and account apps on a small
+    dataset, then on a larger one, checking the query budgets of their views.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.superuser = User.objects.create_superuser(username='budget_admin', password='testpass')
+        self.member = User.objects.create_user(username='budget_member', password='testpass')
+        Profile.objects.bulk_create([Profile(user=self.superuser), Profile(user=self.member)])
+
+    def grow(self, users, quizzes, submissions, member_submissions):
+        # Seeds more of everything, including submissions and messages of the member
+        seed_dataset(users=users, quizzes=quizzes, questions=3, submissions=submissions)
+        QuizSubmission.objects.bulk_create([QuizSubmission(user=self.member, quiz=quiz, score=1)
+                                            for quiz in Quiz.objects.all()[:member_submissions]])
+        Message.objects.bulk_create([Message(user=self.member, subject='Budget', message='Hello')
+                                     for _ in range(member_submissions)])
+        rebuild_leaderboard()
+
+    def requests(self):
+        # (URL name, user, method, path, data) of one request to every URL name
+        quiz = Quiz.objects.filter(question__isnull=False).latest('pk')
+        answers = {f'question_{question.pk}': question.choice_set.first().pk for question in quiz.question_set.all()}
+        submission = QuizSubmission.objects.filter(user=self.member).latest('pk')
+        message = Message.objects.filter(is_read=False).latest('pk')
+        blog = Blog.objects.filter(status='public').latest('pk')
+        member, admin = self.member, self.superuser
+        return [
+            ('home', member, 'GET', reverse('home'), None),
+            ('leaderboard', member, 'GET', reverse('leaderboard'), None),
+            ('dashboard', admin, 'GET', reverse('dashboard'), None),
+            ('metrics', admin, 'GET', reverse('metrics'), None),
+            ('metrics_prometheus', admin, 'GET', reverse('metrics_prometheus'), None),
+            ('message', admin, 'GET', reverse('message', args=[message.pk]), None),
+            ('about', None, 'GET', reverse('about'), None),
+            ('blogs', None, 'GET', reverse('blogs'), None),
+            ('blog', member, 'GET', reverse('blog', args=[blog.pk]), None),
+            ('contact', member, 'GET', reverse('contact'), None),
+            ('terms_conditions', None, 'GET', reverse('terms_conditions'), None),
+            ('downloads', member, 'GET', reverse('downloads'), None),
+            ('search_users', member, 'GET', reverse('search_users'), {'q': 'bench'}),
+            ('search_users_typeahead', member, 'GET', reverse('search_users_typeahead'), {'q': 'bench'}),
+            ('all_quiz', member, 'GET', reverse('all_quiz'), None),
+            ('search_all', member, 'GET', reverse('search_all'), {'q': 'benchmark'}),
+            ('search', member, 'GET', reverse('search', args=[quiz.category.slug]), None),
+            ('quiz', member, 'GET', reverse('quiz', args=[quiz.pk]), None),
+            ('quiz', member, 'POST', reverse('quiz', args=[quiz.pk]), answers),
+            ('quiz_result', member, 'GET', reverse('quiz_result', args=[submission.pk]), None),
+            ('register', None, 'GET', reverse('register'), None),
+            ('profile', member, 'GET', reverse('profile', args=[member.username]), None),
+            ('edit_profile', member, 'GET', reverse('edit_profile'), None),
+            ('delete_profile', member, 'GET', reverse('delete_profile'), None),
+            ('login', None, 'GET', reverse('login'), None),
+            ('logout', member, 'GET', reverse('logout'), None),
+        ]
+
+    def measure(self):
+        # {(URL name, method): query count} of every request, with empty caches
+        counts = {}
+        for name, user, method, path, data in self.requests():
+            self.client.logout()
+            if user is not None:
+                self.client.force_login(user)
+            cache.clear()
+            clear_search_index()
+            response, counts[name, method] = count_queries(self.client, method, path, data)
+            self.assertLess(response.status_code, 400, f"{method} {name}")
+        return counts
+
+    def test_every_url_name_has_a_budget(self):
+        self.assertEqual(missing_budgets(), [])
+        self.grow(users=3, quizzes=2, submissions=4, member_submissions=1)
+        requested = {name for name, *_ in self.requests()}
+        self.assertEqual(requested, set(budgeted_views()))
+
+    def test_query_counts_are_within_budget_and_do_not_grow(self):
+        views = budgeted_views()
+        self.grow(users=3, quizzes=2, submissions=4, member_submissions=1)
+        small = self.measure()
+        self.grow(users=20, quizzes=30, submissions=200, member_submissions=25)
+        large = self.measure()
+
+        failures = []
+        for (name, method), count in large.items():
+            budget = view_budget(views[name], method)
+            if max(count, small[name, method]) > budget:
+                failures.append(f"{method} {name}: {small[name, method]} then {count} queries, budget {budget}")
+            elif count > small[name, method]:
+                failures.append(f"{method} {name}: {small[name, method]} queries grew to {count} with the data")
+        self.assertEqual(failures, [])
+
+    def test_first_submission_is_within_budget(self):
+        # A user's first submission creates their UserRank, QuizScore and board entries: the costliest POST
+        budget = view_budget(budgeted_views()['quiz'], 'POST')
+        counts = []
+        for scale, (users, quizzes, submissions) in enumerate([(3, 2, 4), (20, 30, 200)]):
+            self.grow(users=users, quizzes=quizzes, submissions=submissions, member_submissions=1)
+            newcomer = User.objects.create_user(username=f'budget_newcomer_{scale}', password='testpass')
+            Profile.objects.create(user=newcomer)
+            _, _, method, path, data = next(request for request in self.requests() if request[2] == 'POST')
+            self.client.force_login(newcomer)
+            cache.clear()
+            response, count = count_queries(self.client, method, path, data)
+            self.assertEqual(response.status_code, 302)
+            counts.append(count)
+        self.assertLessEqual(max(counts), budget, f"POST quiz: {counts} queries, budget {budget}")
+        self.assertLessEqual(counts[1], counts[0])
+
+
+class DatabaseConnectionChecksTest(TestCase):
+
+    def ids(self, databases):
+        return [message.id for message in database_connection_messages(databases)]
+
+    def pooled(self, **pool):
+        return {'default': {'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': 0, 'OPTIONS': {'pool': pool or True}}}
+
+    def test_pool_sizes(self):
+        self.assertIsNone(pool_sizes({'ENGINE': 'django.db.backends.sqlite3'}))
+        self.assertEqual(pool_sizes(self.pooled()['default']), (4, 4))
+        self.assertEqual(pool_sizes(self.pooled(min_size=2, max_size=8)['default']), (2, 8))
+
+    @override_settings(SERVER_WORKERS=4, SERVER_THREADS=8, DB_MAX_CONNECTIONS=30, DB_POOL=True)
+    @patch('importlib.util.find_spec', return_value=object())
+    def test_pool_size_against_workers(self, find_spec):
+        # 8 threads share 4 connections, and 4 workers can open 16
+        self.assertEqual(self.ids(self.pooled(min_size=2, max_size=4)), ['base.W004'])
+        # 4 workers can open 40 connections
+        self.assertEqual(self.ids(self.pooled(min_size=2, max_size=10)), ['base.W005'])
+        self.assertEqual(self.ids(self.pooled(min_size=10, max_size=6)), ['base.W003', 'base.W004'])
+        self.assertEqual(self.ids(self.pooled(min_size=2, max_size=7)), ['base.W004'])
+        self.assertEqual(self.ids(self.pooled(min_size=2, max_size=8)), ['base.W005'])
+
+    @override_settings(SERVER_WORKERS=4, SERVER_THREADS=8, DB_MAX_CONNECTIONS=30, DB_POOL=True)
+    def test_pool_requires_psycopg_pool(self):
+        with patch('importlib.util.find_spec', return_value=None):
+            self.assertIn('base.E001', self.ids(self.pooled(min_size=2, max_size=7)))
+        # Pools are PostgreSQL only
+        sqlite = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 0}}
+        self.assertEqual(self.ids(sqlite), ['base.W001'])
+
+    @override_settings(SERVER_WORKERS=4, SERVER_THREADS=8, DB_MAX_CONNECTIONS=30, DB_POOL=False)
+    def test_persistent_connections_against_workers(self):
+        persistent = {'default': {'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': 60}}
+        self.assertEqual(self.ids(persistent), ['base.W002'])
+        persistent['default']['CONN_MAX_AGE'] = 0
+        self.assertEqual(self.ids(persistent), [])
+
+    @override_settings(SERVER_ASGI=True, DB_POOL=False)
+    @patch('importlib.util.find_spec', return_value=object())
+    def test_persistent_connections_under_asgi(self, find_spec):
+        persistent = {'default': {'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': 60}}
+        self.assertEqual(self.ids(persistent), ['base.W007'])
+        self.assertEqual(self.ids(self.pooled(min_size=1, max_size=4)), [])
+
+    def test_local_memory_cache_with_several_workers(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+        with override_settings(SERVER_WORKERS=4):
+            self.assertEqual([message.id for message in cache_messages(locmem)], ['base.W006'])
+            self.assertEqual(cache_messages(redis), [])
+        with override_settings(SERVER_WORKERS=1):
+            self.assertEqual(cache_messages(locmem), [])
@@ -10,6 +10,8 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('leaderboard', views.leaderboard_view, name='leaderboard'),
     path('dashboard', views.dashboard_view, name='dashboard'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('metrics/prometheus', views.metrics_prometheus_view, name='metrics_prometheus'),
     path('message/<int:id>', views.message_view, name='message'),
     path('about', views.about_view, name='about'),
     path('blogs', views.blogs_view, name='blogs'),
@@ -18,5 +20,6 @@ urlpatterns = [
     path('terms_and_conditions', views.terms_conditions_view, name='terms_conditions'),
     path('downloads', views.downloads_view, name='downloads'),
     path('search/users', views.search_users_view, name='search_users'),
+    path('search/users.json', views.search_users_typeahead_view, name='search_users_typeahead'),
   
 ]
\ No newline at end of file
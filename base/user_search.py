@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from quiz.pagination import KeysetPage, keyset_paginate
+
+logger = logging.getLogger(__name__)
+
+# Users shown per page of the search results
+USERS_PER_PAGE = 24
+
+# Matches returned by the typeahead endpoint
+TYPEAHEAD_RESULTS = 10
+
+# Queries shorter than this match name prefixes only: substring matching
+# needs at least one trigram to use the index
+MIN_SUBSTRING_LENGTH = 3
+
+# Longest query kept; longer input is cut
+MAX_QUERY_LENGTH = 150
+
+
+def normalize_query(query):
+    """Returns the search string trimmed, shortened and lowercased, or '' for no query."""
+    return (query or '').strip()[:MAX_QUERY_LENGTH].lower()
+
+
+def _is_short(query):
+    return len(query) < MIN_SUBSTRING_LENGTH
+
+
+def user_matches(query):
+    """
+    Returns the User queryset matching ``query`` on username, first or last name.
+
+    Short queries match the start of a name, longer ones any part of it. On
+    PostgreSQL both are served by the trigram and prefix indexes created in
+    base.migrations.0004_user_search_indexes.
+    """
+    lookup = 'istartswith' if _is_short(query) else 'icontains'
+    return User.objects.filter(
+        Q(**{f'username__{lookup}': query}) | Q(**{f'first_name__{lookup}': query}) | Q(**{f'last_name__{lookup}': query})
+    )
+
+
+def user_entry(user):
+    """Plain, cacheable view of a matching user for templates and JSON."""
+    profile = getattr(user, 'profile', None)
+    return {
+        'username': user.username,
+        'full_name': user.get_full_name(),
+        'profile_img_url': profile.profile_img.url if profile and profile.profile_img else None,
+        'bio': profile.bio if profile else None,
+    }
+
+
+def _cache_key(kind, query):
+    # Hashed, since cache backends such as memcached reject spaces in keys
+    return f'user-search:{kind}:{hashlib.md5(query.encode()).hexdigest()}'
+
+
+def _cached(kind, query, compute):
+    # Short queries are few and popular: their first page is shared through the cache
+    if not _is_short(query):
+        return compute()
+    return cache.get_or_set(_cache_key(kind, query), compute, getattr(settings, 'USER_SEARCH_CACHE_TIMEOUT', 60))
+
+
+def search_users(query, cursor=None):
+    """
+    Returns a KeysetPage of matching users (dicts), ordered by username and
+    starting after ``cursor``. An empty query gives an empty page.
+    """
+    query = normalize_query(query)
+    if not query:
+        return KeysetPage([], None)
+
+    def compute(cursor=None):
+        users = user_matches(query).select_related('profile')
+        page = keyset_paginate(users, 'username', cursor, USERS_PER_PAGE, descending=False)
+        return KeysetPage([user_entry(user) for user in page], page.next_cursor)
+
+    if cursor:
+        return compute(cursor)
+    return _cached('page', query, compute)
+
+
+def typeahead(query):
+    """
+    Returns the first TYPEAHEAD_RESULTS matching users (dicts), usernames
+    starting with the query first. Lookups slower than
+    USER_TYPEAHEAD_BUDGET_MS are logged.
+    """
+    query = normalize_query(query)
+    if not query:
+        return []
+
+    def compute():
+        username_first = Case(When(username__istartswith=query, then=Value(0)), default=Value(1), output_field=IntegerField())
+        users = (user_matches(query).select_related('profile')
+                 .order_by(username_first, 'username')[:TYPEAHEAD_RESULTS])
+        return [user_entry(user) for user in users]
+
+    started = time.perf_counter()
+    results = _cached('typeahead', query, compute)
+    took = (time.perf_counter() - started) * 1000
+    budget = getattr(settings, 'USER_TYPEAHEAD_BUDGET_MS', 50)
+    if took > budget:
+        logger.warning("User typeahead for %r took %.1f ms (budget %s ms)", query, took, budget)
+    return results
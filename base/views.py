@@ -1,102 +1,150 @@
 #!/usr/bin/env python3
 
+import asyncio
 from django.shortcuts import render, HttpResponse, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib.auth.models import User
 from django.contrib import messages
 from account.models import Profile
-from quiz.models import UserRank, Quiz, QuizSubmission, Question
+from quiz.leaderboard import aboard_page, aboard_position, afind_board, aleaderboard_page
+from quiz.models import Category, Leaderboard, UserRank
+from quiz.pagination import KeysetPage
+from quiz.page_cache import cache_stats
 from django.contrib.auth.decorators import login_required, user_passes_test
-import datetime
 from .models import Message, Blog
-from django.db.models import Count, Q
-import math
+from .instrumentation import metrics_snapshot, prometheus_metrics
+from .metrics import dashboard_metrics, day_range
+from .query_budget import query_budget
+from .shortcuts import alist, arender
+from .user_search import search_users, typeahead
+from django.db import connection
+from django.db.models import Count
 from django.db.models.functions import ExtractYear
+from django.utils.dateparse import parse_date
+from urllib.parse import urlencode
+
+# Category id of the query string, None (the global board) unless it is a possible primary key
+def _category_id(value):
+    try:
+        category_id = int(value)
+    except (TypeError, ValueError):  # Missing, or not a number ('²' passes str.isdigit())
+        return None
+    _, largest = connection.ops.integer_field_range(Category._meta.pk.get_internal_type())
+    return category_id if 0 < category_id <= largest else None
+
 
 # Create your views here.
-def home(request):
+@query_budget(4)
+async def home(request):
 
-    leaderboard_users = UserRank.objects.order_by('rank')[:4]
+    leaderboard_users = (await aleaderboard_page())[:4]
 
     context = {"leaderboard_users": leaderboard_users}
 
-    return render(request, 'welcome.html', context)
+    return await arender(request, 'welcome.html', context)
 
 
+@query_budget(6)
 @login_required(login_url="login")
-def leaderboard_view(request):
+async def leaderboard_view(request):
+
+    # Scope of the board: a category (or all of them), a period, and any day of it for archived periods
+    period = request.GET.get('period', Leaderboard.ALL_TIME)
+    if period not in dict(Leaderboard.PERIOD_CHOICES):
+        period = Leaderboard.ALL_TIME
+    category_id = _category_id(request.GET.get('category'))
+    try:
+        day = parse_date(request.GET.get('day', ''))
+    except ValueError:  # Well formed but invalid date
+        day = None
+    cursor = request.GET.get('cursor')
+    user = await request.auser()
+
+    # The page and the user's position are awaited together; the async ORM still runs their
+    # queries one after the other, in the thread serving the request's sync calls
+    if category_id is None and period == Leaderboard.ALL_TIME:
+        board = None
+        leaderboard_users, position = await asyncio.gather(
+            aleaderboard_page(cursor),
+            UserRank.objects.filter(user=user).values_list('rank', 'total_score').afirst(),
+        )
+    else:
+        board = await afind_board(category_id, period, day)
+        if board:
+            leaderboard_users, position = await asyncio.gather(aboard_page(board, cursor), aboard_position(board, user))
+        else:
+            leaderboard_users, position = KeysetPage([], None), None
 
-    leaderboard_users = UserRank.objects.order_by('rank')
+    filters = {key: value for key, value in (('category', category_id), ('period', period), ('day', day)) if value}
 
-    context = {"leaderboard_users": leaderboard_users}
-    return render(request, "leaderboard.html", context)
+    context = {
+        "leaderboard_users": leaderboard_users,
+        "board": board,
+        "position": position,
+        "periods": Leaderboard.PERIOD_CHOICES,
+        "period": period,
+        "category_id": category_id,
+        "filters": urlencode(filters),
+    }
+    return await arender(request, "leaderboard.html", context)
 
 
 def is_superuser(user):
     return user.is_superuser
 
+@query_budget(9)
 @user_passes_test(is_superuser)
 @login_required
 def dashboard_view(request):
 
-    # Total Number
-    total_users = User.objects.all().count()
-    total_quizzes = Quiz.objects.all().count()
-    total_quiz_submit = QuizSubmission.objects.all().count()
-    total_questions = Question.objects.all().count()
-
-    # today_numbers
-    today_users = User.objects.filter(date_joined__date=datetime.date.today()).count()
-    today_quizzes_objs = Quiz.objects.filter(created_at__date=datetime.date.today())
-    today_quizzes = Quiz.objects.filter(created_at__date=datetime.date.today()).count()
-    today_quiz_submit = QuizSubmission.objects.filter(submitted_at__date=datetime.date.today()).count()
-    today_questions = 0
-    for quiz in today_quizzes_objs:
-        today_questions += quiz.question_set.count()
-
-    # Gain %
-    gain_users = gain_percentage(total_users, today_users)
-    gain_quizzes = gain_percentage(total_quizzes, today_quizzes)
-    gain_quiz_submit = gain_percentage(total_quiz_submit, today_quiz_submit)
-    gain_questions = gain_percentage(total_questions, today_questions)
+    # Totals, today numbers and gain %, cached for a few seconds
+    context = dict(dashboard_metrics())
 
     # Inbox Messages
-    messages = Message.objects.filter(created_at__date=datetime.date.today()).order_by('-created_at')
+    start, end = day_range()
+    messages = Message.objects.filter(created_at__gte=start, created_at__lt=end).select_related('user').order_by('-created_at')
 
+    # Quiz page cache counters
+    quiz_page_cache = cache_stats()
 
-    context = {
-        "total_users": total_users,
-        "total_quizzes": total_quizzes,
-        "total_quiz_submit": total_quiz_submit,
-        "total_questions": total_questions,
-        "today_users":today_users,
-        "today_quizzes":today_quizzes,
-        "today_quiz_submit":today_quiz_submit,
-        "today_questions":today_questions,
-        "gain_users": gain_users,
-        "gain_quizzes": gain_quizzes,
-        "gain_quiz_submit": gain_quiz_submit,
-        "gain_questions": gain_questions,
+    context.update({
         "messages": messages,
-    }
+        "quiz_page_cache": quiz_page_cache,
+    })
     return render(request, "dashboard.html", context)
 
-def gain_percentage(total, today):
-    if total > 0 and today > 0:
-        gain = math.floor((today *100)/total)
-        return gain
+@query_budget(2)
+@user_passes_test(is_superuser)
+@login_required
+def metrics_view(request):
+
+    # Per URL name request metrics of this process
+    return JsonResponse(metrics_snapshot())
 
+@query_budget(2)
+@user_passes_test(is_superuser)
+@login_required
+def metrics_prometheus_view(request):
+
+    return HttpResponse(prometheus_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@query_budget(0)
 def about_view(request):
     return render(request, "about.html")
 
-def blogs_view(request):
-
-    year_blog_count = Blog.objects.annotate(year=ExtractYear('created_at')).values('year').annotate(count=Count('id')).order_by('-year').filter(status='public')
+@query_budget(2)
+async def blogs_view(request):
 
-    blogs = Blog.objects.filter(status='public').order_by('-created_at')
+    # The yearly counts and the blog list are independent queries, awaited together
+    year_blog_count, blogs = await asyncio.gather(
+        alist(Blog.objects.annotate(year=ExtractYear('created_at')).values('year').annotate(count=Count('id')).order_by('-year').filter(status='public')),
+        alist(Blog.objects.filter(status='public').order_by('-created_at')),
+    )
 
     context = {"year_blog_count": year_blog_count, "blogs": blogs}
-    return render(request, "blogs.html", context)
+    return await arender(request, "blogs.html", context)
 
+@query_budget(5)
 @login_required
 def blog_view(request, blog_id):
 
@@ -105,6 +153,7 @@ def blog_view(request, blog_id):
     context = {"blog": blog}
     return render(request, "blog.html", context)
 
+@query_budget(3)
 @login_required
 def contact_view(request):
 
@@ -121,8 +170,9 @@ def contact_view(request):
         else:
             return redirect('contact')
 
-    return render(request, "contact.html")
+    return render(request, "contact-us.html")
 
+@query_budget(6)
 @user_passes_test(is_superuser)
 @login_required
 def message_view(request, id):
@@ -136,28 +186,30 @@ def message_view(request, id):
     return render(request, "message.html", context)
 
 
+@query_budget(0)
 def terms_conditions_view(request):
     return render(request, "terms-conditions.html")
 
+@query_budget(3)
 @login_required
 def downloads_view(request):
     return render(request, "downloads.html")
 
+@query_budget(4)
 def search_users_view(request):
 
     query = request.GET.get('q')
-
-    if query:
-        users = User.objects.filter(
-            Q(username__icontains=query) | Q(first_name__icontains=query) | Q(last_name__icontains=query)
-        ).order_by('date_joined')
-
-    else:
-        users = []
+    users = search_users(query, request.GET.get('cursor'))
 
     context = {"query": query, "users": users}
     return render(request, "search-users.html", context)
 
+
+@query_budget(1)
+def search_users_typeahead_view(request):
+
+    return JsonResponse({"results": typeahead(request.GET.get('q'))})
+
 def profile(request, username):
     user = get_object_or_404(User, username=username)
     return render(request, 'user/profile.html', {'user': user})
@@ -1,19 +1,59 @@
 #!/usr/bin/env python3
 
-from django.contrib import admin
-from .models import Category, Quiz, Question, Choice, QuizSubmission, UserRank
+from django.contrib import admin, messages
+from .models import Category, Quiz, Question, Choice, QuizSubmission, UserRank, ImportJob, SubmissionAnswer, Leaderboard, LeaderboardEntry, QuizScore
 
 # Register your models here.
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name',)  # Customize fields as needed
+    list_display = ('name', 'slug')  # Customize fields as needed
+    prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name',)
 
+# Read-only view of the quiz file imports, newest first
+class ImportJobInline(admin.TabularInline):
+    model = ImportJob
+    extra = 0
+    can_delete = False
+    ordering = ('-created_at',)
+    fields = ('status', 'inserted', 'skipped', 'invalid', 'error', 'created_at', 'finished_at')
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Quiz)
 class QuizAdmin(admin.ModelAdmin):
     list_display = ('title', 'category', 'created_at')
     list_filter = ('category',)
     search_fields = ('title',)
+    inlines = (ImportJobInline,)
+
+    # Tell the admin user that the quiz file import runs in the background
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        job = getattr(obj, 'queued_import', None)
+        if job is not None:
+            self.message_user(request, f"Quiz file queued for import (job {job.id}). "
+                                       "Its progress is shown under Import jobs.", messages.INFO)
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('quiz', 'status', 'inserted', 'skipped', 'invalid', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('quiz__title',)
+    readonly_fields = ('quiz', 'status', 'inserted', 'skipped', 'invalid', 'error', 'created_at', 'started_at', 'finished_at')
+    actions = ('requeue',)
+
+    # Jobs are only created by saving a quiz with a file
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Queue the selected quizzes for import again")
+    def requeue(self, request, queryset):
+        for job in queryset.select_related('quiz'):
+            job.quiz.queue_import()
+        self.message_user(request, "Selected quizzes queued for import.", messages.INFO)
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
@@ -32,13 +72,37 @@ class ChoiceAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_editable = ('is_correct',)
 
+class SubmissionAnswerInline(admin.TabularInline):
+    model = SubmissionAnswer
+    extra = 0
+    fields = ('question', 'choice', 'is_correct')
+    readonly_fields = fields
+
 @admin.register(QuizSubmission)
 class QuizSubmissionAdmin(admin.ModelAdmin):
     list_display = ('user', 'quiz', 'score', 'submitted_at')
     list_filter = ('quiz',)
     search_fields = ('user__username',)
+    inlines = (SubmissionAnswerInline,)
+
+@admin.register(QuizScore)
+class QuizScoreAdmin(admin.ModelAdmin):
+    list_display = ('user', 'quiz', 'score', 'attempts', 'best_score', 'latest_score', 'updated_at')
+    list_select_related = ('user', 'quiz')
+    search_fields = ('user__username',)
 
 @admin.register(UserRank)
 class UserRankAdmin(admin.ModelAdmin):
     list_display = ('user', 'rank')
     search_fields = ('user__username',)
+
+@admin.register(Leaderboard)
+class LeaderboardAdmin(admin.ModelAdmin):
+    list_display = ('category', 'period', 'starts_on', 'frozen')
+    list_filter = ('period', 'frozen', 'category')
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ('board', 'user', 'rank', 'total_score')
+    list_select_related = ('board__category', 'user')
+    search_fields = ('user__username',)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+# Process-wide cache of the quiz categories.
+#
+# The category list is small and read on most pages (filter bars, leaderboard
+# scopes), so each process keeps it in memory. The Category signal receivers
+# in quiz.models bump a version number stored in the shared cache; a process
+# reloads its copy when that version differs from the one it loaded, so edits
+# reach every process of a shared cache backend, and the current process at
+# once. A warm lookup costs no database query. With a cache private to each
+# process (the local-memory default), other processes keep their copy, which
+# the base.W006 check warns about when several workers are configured.
+
+import random
+import threading
+
+from django.core.cache import cache
+
+from .models import Category
+
+VERSION_KEY = 'categories-version'
+
+_categories = {'version': None, 'list': (), 'by_slug': {}}
+_lock = threading.Lock()
+
+
+def _new_version():
+    # Random start, so a version lost with an evicted or cleared cache entry is not reused
+    return random.getrandbits(48)
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def _aversion():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, _new_version(), None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def _loaded(version):
+    # This process's copy if it was loaded at ``version``, else None
+    with _lock:
+        return _categories['list'] if _categories['version'] == version else None
+
+
+def _store(version, categories):
+    with _lock:
+        _categories.update(version=version, list=categories,
+                           by_slug={category.slug: category for category in categories})
+    return categories
+
+
+def _by_slug(slug):
+    with _lock:
+        return _categories['by_slug'].get(slug)
+
+
+def get_categories():
+    """Return every category, ordered by name, from this process's copy."""
+    version = _version()
+    categories = _loaded(version)
+    if categories is None:
+        categories = _store(version, tuple(Category.objects.order_by('name')))
+    return categories
+
+
+async def aget_categories():
+    """Async version of get_categories()."""
+    version = await _aversion()
+    categories = _loaded(version)
+    if categories is None:
+        categories = _store(version, tuple([category async for category in Category.objects.order_by('name')]))
+    return categories
+
+
+def category_by_slug(slug):
+    """Return the category with this ``slug``, or None."""
+    get_categories()
+    return _by_slug(slug)
+
+
+async def acategory_by_slug(slug):
+    """Async version of category_by_slug()."""
+    await aget_categories()
+    return _by_slug(slug)
+
+
+def invalidate_categories():
+    """Make every process reload the categories on its next lookup."""
+    with _lock:
+        _categories['version'] = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # No version stored yet
+        cache.set(VERSION_KEY, _new_version(), None)
@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+
+from django.utils.functional import SimpleLazyObject
+
+from .categories import get_categories
+
+
+# Context processor exposing the cached category list as ``categories``, loaded
+# only by templates that use it
+def categories(request):
+    return {"categories": SimpleLazyObject(lambda: list(get_categories()))}
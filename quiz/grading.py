@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# Server-side grading of quiz submissions.
+#
+# Each quiz's answer key (question id -> correct choice id, plus the question
+# of every choice) is built with one query and kept in a process-local cache.
+# Entries are keyed on the quiz's updated_at, which is bumped whenever one of
+# its questions or choices changes (see quiz.models.touch_quiz), so every
+# process drops a stale key without any cross-process messaging.
+
+import threading
+from collections import OrderedDict
+
+from .models import Choice
+
+# Answer keys kept per process; the least recently used ones are dropped first
+MAX_CACHED_KEYS = 512
+
+# Prefix of the form fields holding the selected choice of each question
+ANSWER_FIELD_PREFIX = 'question_'
+
+_answer_keys = OrderedDict()  # quiz id -> (quiz updated_at, answer key, choice questions)
+_lock = threading.Lock()
+
+
+def _load(quiz):
+    # Return the cached (answer key, choice questions) pair of a quiz, building it on a miss
+    with _lock:
+        cached = _answer_keys.get(quiz.pk)
+        if cached is not None and cached[0] == quiz.updated_at:
+            _answer_keys.move_to_end(quiz.pk)
+            return cached[1:]
+
+    answer_key, choice_questions = {}, {}
+    choices = (Choice.objects.filter(question__quiz=quiz)
+               .order_by('id')
+               .values_list('id', 'question_id', 'is_correct'))
+    for choice_id, question_id, is_correct in choices:
+        choice_questions[choice_id] = question_id
+        if is_correct:
+            answer_key.setdefault(question_id, choice_id)
+
+    with _lock:
+        _answer_keys[quiz.pk] = (quiz.updated_at, answer_key, choice_questions)
+        _answer_keys.move_to_end(quiz.pk)
+        while len(_answer_keys) > MAX_CACHED_KEYS:
+            _answer_keys.popitem(last=False)
+    return answer_key, choice_questions
+
+
+def get_answer_key(quiz):
+    """Return the ``{question id: correct choice id}`` mapping of ``quiz``."""
+    return _load(quiz)[0]
+
+
+def clear_answer_keys():
+    """Empty this process's answer key cache."""
+    with _lock:
+        _answer_keys.clear()
+
+
+def parse_answers(data):
+    """
+    Extract the selected choices from submitted form data.
+
+    Fields are named ``question_<question id>`` with the selected choice id as
+    value; anything malformed is ignored. Returns ``{question id: choice id}``.
+    """
+    answers = {}
+    for field, value in data.items():
+        if not field.startswith(ANSWER_FIELD_PREFIX):
+            continue
+        try:
+            answers[int(field[len(ANSWER_FIELD_PREFIX):])] = int(value)
+        except (TypeError, ValueError):
+            continue
+    return answers
+
+
+def grade_answers(quiz, answers):
+    """
+    Check ``{question id: choice id}`` answers against the answer key of ``quiz``.
+
+    Answers naming a choice that does not belong to that question of this
+    quiz are dropped. Returns ``(score, graded)`` where ``graded`` is a list of
+    ``(question id, choice id, is_correct)`` tuples.
+    """
+    answer_key, choice_questions = _load(quiz)
+    graded = [(question_id, choice_id, answer_key.get(question_id) == choice_id)
+              for question_id, choice_id in sorted(answers.items())
+              if choice_questions.get(choice_id) == question_id]
+    return sum(1 for _, _, is_correct in graded if is_correct), graded
+
+
+def grade(quiz, answers):
+    """Return the number of correct ``{question id: choice id}`` answers for ``quiz``."""
+    return grade_answers(quiz, answers)[0]
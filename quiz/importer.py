@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+# Bulk importer for quiz workbooks.
+#
+# Sheets (xlsx or csv) are streamed row by row and handled in fixed-size
+# chunks: each chunk is validated and its new questions and choices are
+# written with two bulk_create calls, so peak memory does not depend on the
+# size of the file. The header is checked before any row is read, the quiz's
+# existing questions are loaded once into a lookup, and the whole import runs
+# in a single transaction, so a failed import never leaves a half-imported
+# quiz behind.
+
+import codecs
+import csv
+from collections import namedtuple
+from itertools import islice
+
+from django.db import transaction
+from openpyxl import load_workbook
+
+from .models import Question, Choice, touch_quiz
+
+# Columns every quiz sheet must provide
+REQUIRED_COLUMNS = ('Question', 'A', 'B', 'C', 'D', 'Answer')
+
+# Option columns, in the order the choices are created
+OPTION_COLUMNS = ('A', 'B', 'C', 'D')
+
+# Rows written per INSERT statement
+BATCH_SIZE = 500
+
+# Sheet rows read, validated and inserted at a time
+CHUNK_SIZE = 500
+
+# Rejected rows kept in ImportResult.errors (all of them are counted)
+MAX_ERRORS = 100
+
+# Longest text accepted by Choice.text
+MAX_CHOICE_LENGTH = Choice._meta.get_field('text').max_length
+
+# Outcome of an import: rows written, rows already present, rows rejected
+ImportResult = namedtuple('ImportResult', ['inserted', 'skipped', 'invalid', 'errors'])
+
+
+class QuizImportError(ValueError):
+    """Raised when a quiz sheet cannot be imported at all (e.g. missing columns)."""
+
+
+def _clean(value):
+    # Empty cells come back as NaN/None; everything else is stored as stripped text
+    if value is None or value != value:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def validate_columns(columns):
+    """Raise QuizImportError unless every required column is present."""
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise QuizImportError(f"Missing column(s): {', '.join(missing)}")
+
+
+def validate_row(row):
+    """
+    Clean one sheet row (a mapping of column name to cell value).
+
+    Returns a ``(question_text, options, answer)`` tuple, or raises
+    QuizImportError describing why the row was rejected.
+    """
+    question_text = _clean(row.get('Question'))
+    options = [_clean(row.get(column)) for column in OPTION_COLUMNS]
+    answer = _clean(row.get('Answer')).upper()
+
+    if not question_text:
+        raise QuizImportError("empty question")
+    if not all(options):
+        raise QuizImportError("every option A-D must be filled in")
+    if any(len(option) > MAX_CHOICE_LENGTH for option in options):
+        raise QuizImportError(f"options are limited to {MAX_CHOICE_LENGTH} characters")
+    if answer not in OPTION_COLUMNS:
+        raise QuizImportError(f"answer must be one of A-D, got {answer!r}")
+    return question_text, options, answer
+
+
+def _is_blank(row):
+    return not any(_clean(value) for value in row.values())
+
+
+def validate_rows(rows, start=2):
+    """
+    Validate a list of rows, ignoring blank ones.
+
+    Returns the list of clean rows and the list of ``(row_number, error)``
+    pairs for the rejected ones. Row numbers match the spreadsheet, counting
+    the header as row 1; ``start`` is the number of the first row.
+    """
+    valid, errors = [], []
+    for row_number, row in enumerate(rows, start=start):
+        if _is_blank(row):
+            continue
+        try:
+            valid.append(validate_row(row))
+        except QuizImportError as error:
+            errors.append((row_number, str(error)))
+    return valid, errors
+
+
+def insert_questions(quiz, rows, existing):
+    """
+    Insert the clean ``rows`` whose question text is not in ``existing``.
+
+    ``existing`` is updated in place, so it can be shared between batches.
+    Returns ``(inserted, skipped)``.
+    """
+    new_rows = []
+    for question_text, options, answer in rows:
+        if question_text in existing:
+            continue
+        existing.add(question_text)
+        new_rows.append((question_text, options, answer))
+
+    if new_rows:
+        with transaction.atomic():
+            questions = Question.objects.bulk_create(
+                [Question(quiz=quiz, text=question_text) for question_text, _, _ in new_rows],
+                batch_size=BATCH_SIZE,
+            )
+            Choice.objects.bulk_create(
+                [Choice(question=question, text=option, is_correct=column == answer)
+                 for question, (_, options, answer) in zip(questions, new_rows)
+                 for column, option in zip(OPTION_COLUMNS, options)],
+                batch_size=BATCH_SIZE,
+            )
+    return len(new_rows), len(rows) - len(new_rows)
+
+
+def _xlsx_values(file):
+    # openpyxl's read-only mode parses the worksheet lazily, one row at a time
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _csv_values(file):
+    # Iterating the file yields one line at a time; utf-8-sig drops Excel's BOM
+    yield from csv.reader(codecs.iterdecode(file, 'utf-8-sig'))
+
+
+def read_sheet(file, name):
+    """
+    Open a quiz sheet for streaming.
+
+    ``name`` decides the format: ``.csv`` files are read as CSV, everything
+    else as an xlsx workbook. Returns the header row and a lazy iterator of
+    rows as dicts keyed by the header.
+    """
+    values = _csv_values(file) if name.lower().endswith('.csv') else _xlsx_values(file)
+    header = [_clean(value) for value in next(values, ())]
+    return header, (dict(zip(header, row)) for row in values)
+
+
+def import_rows(quiz, columns, rows, chunk_size=CHUNK_SIZE):
+    """
+    Import an iterable of rows (dicts keyed by ``columns``) into ``quiz``.
+
+    Rows are consumed ``chunk_size`` at a time, so only one chunk is held in
+    memory. Questions whose text already exists in the quiz are skipped and
+    invalid rows are reported; everything is written in one transaction.
+    """
+    validate_columns(columns)
+
+    # Load the quiz's existing questions once instead of one lookup per row
+    existing = set(Question.objects.filter(quiz=quiz).values_list('text', flat=True))
+
+    inserted = skipped = invalid = 0
+    errors = []
+    row_number = 2
+    rows = iter(rows)
+    with transaction.atomic():
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            valid, chunk_errors = validate_rows(chunk, start=row_number)
+            row_number += len(chunk)
+
+            chunk_inserted, chunk_skipped = insert_questions(quiz, valid, existing)
+            inserted += chunk_inserted
+            skipped += chunk_skipped
+            invalid += len(chunk_errors)
+            errors.extend(chunk_errors[:MAX_ERRORS - len(errors)])
+
+        # bulk_create sends no signals: bump the quiz version once for the whole import
+        if inserted:
+            touch_quiz(quiz.pk)
+    return ImportResult(inserted, skipped, invalid, errors)
+
+
+def import_file(quiz, file, name):
+    """Stream an uploaded xlsx or csv ``file`` into ``quiz``. See import_rows."""
+    columns, rows = read_sheet(file, name)
+    return import_rows(quiz, columns, rows)
+
+
+def import_dataframe(quiz, df):
+    """Import the questions of a pandas DataFrame into ``quiz``. See import_rows."""
+    return import_rows(quiz, list(df.columns), df.to_dict('records'))
@@ -0,0 +1,670 @@
+#!/usr/bin/env python3
+
+# Incremental leaderboard engine.
+#
+# A user's total is the sum of their QuizScore rows, one per quiz attempted,
+# each worth what the scoring policy (best, latest or average attempt, see
+# quiz.scoring) says. Ranks are ordered by total score (highest first), ties broken by the lower
+# user id, so every user has exactly one position and ranks are always the
+# contiguous sequence 1..n. A new submission only touches the submitter's row
+# and shifts, with a single bulk UPDATE, the rows between the old and the new
+# position. The full rebuild is kept for the management command.
+#
+# The read path pages through the table with keyset pagination on rank. The
+# first page, which is also the home page's top 4, is kept in the cache and
+# only dropped when a change reaches one of its positions.
+#
+# The same incremental ranking also maintains the scoped boards (Leaderboard
+# and LeaderboardEntry): weekly and monthly rankings over every category, and
+# all-time, weekly and monthly rankings per category. A board is created by
+# the first submission of its period and frozen by freeze_leaderboards() once
+# the period is over, keeping its final ranks as an archive. The
+# (board, rank) index and the (board, user) unique constraint make both rank
+# range and "what's my position" reads index lookups.
+#
+# Deleting submissions, directly or with their quiz, category or user, queues
+# the users concerned; once the transaction commits, repair_leaderboards()
+# recomputes their scores and positions on UserRank and the open boards and
+# closes the rank gaps left by the deleted rows.
+
+import datetime
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.utils import timezone
+
+from .models import Leaderboard, LeaderboardEntry, QuizScore, QuizSubmission, UserRank
+from .pagination import KeysetPage, akeyset_paginate, keyset_paginate
+from .scoring import NO_ATTEMPTS, add_attempt, period_scores, policy_score, rebuild_quiz_scores, record_attempt
+
+# Rows written per query when rebuilding the whole table
+REBUILD_BATCH_SIZE = 1000
+
+# Users shown per leaderboard page; the first page is cached
+LEADERBOARD_PAGE_SIZE = 24
+
+LEADERBOARD_CACHE_KEY = 'leaderboard-top'
+
+# Key of the PostgreSQL advisory lock serializing the re-ranking of UserRank
+LEADERBOARD_LOCK_KEY = 7_315_201
+
+# First day of the single period of all-time boards
+ALL_TIME_START = datetime.date.min
+
+# Periods of the boards ranking every category; the all-time one is UserRank
+GLOBAL_PERIODS = (Leaderboard.WEEKLY, Leaderboard.MONTHLY)
+
+# Periods of the boards of each category
+CATEGORY_PERIODS = (Leaderboard.ALL_TIME, Leaderboard.WEEKLY, Leaderboard.MONTHLY)
+
+
+def _ahead_of(user_id, total_score):
+    # Entries ranked before a user with this total (higher score, or same score and lower user id)
+    return Q(total_score__gt=total_score) | Q(total_score=total_score, user_id__lt=user_id)
+
+
+def _new_rank(neighbour, old_rank):
+    # Position of a row now at ``old_rank`` (None if new) below ``neighbour``, the lowest ranked row ahead of it
+    if neighbour is None:
+        return 1
+    if old_rank is not None and neighbour > old_rank:
+        return neighbour  # Moving down: that row moves up by one
+    return neighbour + 1
+
+
+def reposition(board, entry, total_score):
+    """
+    Move ``entry`` to its place in ``board`` for a new ``total_score``.
+
+    ``board`` is the queryset holding every ranked row of one leaderboard and
+    ``entry`` one of its rows (saved or not). Only the rows between the old
+    and the new position are shifted, so the cost is an index lookup plus one
+    UPDATE, instead of re-ranking every user.
+    """
+    others = board.exclude(pk=entry.pk) if entry.pk else board
+    old_rank = entry.rank
+    if old_rank is None:
+        # New entries start below the last ranked row
+        old_rank = (others.aggregate(last=Max('rank'))['last'] or 0) + 1
+
+    # The lowest ranked row still ahead of us decides the new position
+    neighbour = (others.filter(_ahead_of(entry.user_id, total_score))
+                 .order_by('total_score', '-user_id')
+                 .values_list('rank', flat=True)
+                 .first())
+    new_rank = _new_rank(neighbour, old_rank)
+
+    # Shift everybody between the old and the new position by one place
+    if new_rank < old_rank:
+        others.filter(rank__gte=new_rank, rank__lt=old_rank).update(rank=F('rank') + 1)
+    elif new_rank > old_rank:
+        others.filter(rank__gt=old_rank, rank__lte=new_rank).update(rank=F('rank') - 1)
+
+    entry.rank = new_rank
+    entry.total_score = total_score
+    entry.save()
+    return entry
+
+
+def lock_leaderboard():
+    """
+    Take the lock serializing every change of the UserRank ranks, held until
+    the end of the current transaction. Locking the submitter's row is not
+    enough: repositioning one user shifts the ranks of others, and two
+    concurrent shifts would leave duplicate or missing ranks. PostgreSQL
+    takes a transaction-level advisory lock; SQLite already runs one write
+    transaction at a time.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LEADERBOARD_LOCK_KEY])
+
+
+def record_submission(submission):
+    """
+    Upsert the QuizScore of a new ``submission``, apply the change of its
+    worth to the user's total and re-rank that user only. A retake that does
+    not change what the quiz is worth leaves the ranks untouched.
+    """
+    with transaction.atomic():
+        # Taken first, so every writer acquires the locks in the same order
+        lock_leaderboard()
+        entry, created = (UserRank.objects.select_for_update()
+                          .get_or_create(user_id=submission.user_id))
+        old_score, new_score = record_attempt(submission)
+        if created or new_score != old_score:
+            old_rank = entry.rank
+            total_score = (entry.total_score or 0) + new_score - old_score
+            reposition(UserRank.objects.all(), entry, total_score)
+
+            # Only changes reaching the cached first page make it stale
+            if min(old_rank or entry.rank, entry.rank) <= LEADERBOARD_PAGE_SIZE:
+                transaction.on_commit(invalidate_leaderboard_cache)
+
+        record_board_submission(submission, new_score - old_score)
+        return entry
+
+
+def close_rank_gaps(board):
+    """
+    Renumber the ranked rows of ``board`` (a queryset, as for reposition())
+    1..n in their current order, after rows were deleted. Every run of rows
+    between two gaps moves with one UPDATE. Returns the number of UPDATEs.
+    """
+    board = board.filter(rank__isnull=False)
+    stats = board.aggregate(count=Count('pk'), last=Max('rank'))
+    if not stats['count'] or stats['last'] == stats['count']:
+        return 0
+
+    # (first rank, last rank, offset) of the runs of rows to move up
+    runs = []
+    for position, rank in enumerate(board.order_by('rank').values_list('rank', flat=True), start=1):
+        offset = rank - position
+        if runs and runs[-1][2] == offset:
+            runs[-1][1] = rank
+        elif offset:
+            runs.append([rank, rank, offset])
+    for first, last, offset in runs:
+        board.filter(rank__gte=first, rank__lte=last).update(rank=F('rank') - offset)
+    return len(runs)
+
+
+def apply_totals(board, totals):
+    """
+    Reposition the rows of ``board`` (a queryset, as for reposition()) whose
+    total differs from ``totals``, {user id: total}. Every move shifts other
+    rows, so each row is read again just before it moves.
+    """
+    changed = [user_id for user_id, total_score in board.filter(user_id__in=list(totals)).values_list('user_id', 'total_score')
+               if total_score != totals[user_id]]
+    for user_id in changed:
+        reposition(board, board.get(user_id=user_id), totals[user_id])
+
+
+def _repair_boards(user_ids):
+    # The open scoped boards' part of repair_leaderboards(), for the remaining ``user_ids``
+    entries = list(LeaderboardEntry.objects.filter(board__frozen=False, user_id__in=user_ids).select_related('board'))
+    all_time = {(user_id, category_id): total for user_id, category_id, total in
+                QuizScore.objects.filter(user_id__in=user_ids).values('user', 'quiz__category')
+                .annotate(total=Sum('score')).values_list('user', 'quiz__category', 'total').order_by()}
+    period_totals = {board.pk: period_scores(board_submissions(board).filter(user_id__in=user_ids))
+                     for board in {entry.board for entry in entries} if board.period != Leaderboard.ALL_TIME}
+
+    totals = {}  # {board id: {user id: total}}
+    for entry in entries:
+        if entry.board.period == Leaderboard.ALL_TIME:
+            total_score = all_time.get((entry.user_id, entry.board.category_id))
+        else:
+            total_score = period_totals[entry.board_id].get(entry.user_id)
+        if total_score is not None:
+            totals.setdefault(entry.board_id, {})[entry.user_id] = total_score
+    LeaderboardEntry.objects.filter(pk__in=[entry.pk for entry in entries
+                                            if entry.user_id not in totals.get(entry.board_id, {})]).delete()
+
+    # Deleted users and entries left gaps, on boards found with one query
+    gapped = (LeaderboardEntry.objects.filter(board__frozen=False, rank__isnull=False).values('board')
+              .annotate(count=Count('pk'), last=Max('rank')).filter(last__gt=F('count'))
+              .values_list('board', flat=True).order_by())
+    for board_id in gapped:
+        close_rank_gaps(LeaderboardEntry.objects.filter(board_id=board_id))
+    for board_id, board_totals in totals.items():
+        apply_totals(LeaderboardEntry.objects.filter(board_id=board_id), board_totals)
+
+
+def repair_leaderboards(user_ids):
+    """
+    Bring the leaderboards back in step after submissions of ``user_ids``
+    were deleted: recompute their QuizScore rows and totals, re-rank them,
+    drop those left without any score, and close the gaps of deleted users,
+    on UserRank and on every open scoped board; frozen boards keep their
+    archived ranks. Safe to run more than once.
+    """
+    with transaction.atomic():
+        lock_leaderboard()
+        existing = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        rebuild_quiz_scores(existing)
+        totals = dict(QuizScore.objects.filter(user_id__in=existing).values('user')
+                      .annotate(total=Sum('score')).values_list('user', 'total').order_by())
+
+        UserRank.objects.filter(user_id__in=existing - totals.keys()).delete()
+        close_rank_gaps(UserRank.objects.all())
+        apply_totals(UserRank.objects.all(), totals)
+        _repair_boards(existing)
+        transaction.on_commit(invalidate_leaderboard_cache)
+
+
+# Users whose submissions were deleted, per thread, waiting for the commit
+_deleted = threading.local()
+
+
+def _repair_deleted():
+    user_ids, _deleted.user_ids = getattr(_deleted, 'user_ids', None), None
+    if user_ids:
+        repair_leaderboards(user_ids)
+
+
+def record_deleted_submission(submission):
+    """
+    Queue the repair of the leaderboard of the user of a deleted
+    ``submission``, run once when the current transaction commits however
+    many submissions it deleted.
+    """
+    if getattr(_deleted, 'user_ids', None) is None:
+        _deleted.user_ids = set()
+    _deleted.user_ids.add(submission.user_id)
+    # Callbacks after the first find the queue empty; a rolled back queue is repaired with the next one
+    transaction.on_commit(_repair_deleted)
+
+
+def expected_leaderboard():
+    """
+    Compute the leaderboard from scratch as a list of
+    ``(user_id, rank, total_score)`` tuples, best user first.
+    """
+    user_scores = (QuizScore.objects.values('user')
+                   .annotate(total_score=Sum('score'))
+                   .order_by('-total_score', 'user'))
+    return [(entry['user'], rank, entry['total_score'])
+            for rank, entry in enumerate(user_scores, start=1)]
+
+
+def rebuild_leaderboard():
+    """
+    Recompute every QuizScore from the submissions table, then every total
+    and rank from those, and replace the UserRank rows in a single
+    transaction. The scoped boards still open are rebuilt too, see
+    rebuild_boards(). Returns the number of ranked users.
+    """
+    rebuild_quiz_scores()
+    rows = [UserRank(user_id=user_id, rank=rank, total_score=total_score)
+            for user_id, rank, total_score in expected_leaderboard()]
+    with transaction.atomic():
+        lock_leaderboard()
+        UserRank.objects.all().delete()
+        UserRank.objects.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE)
+        transaction.on_commit(invalidate_leaderboard_cache)
+    rebuild_boards()
+    return len(rows)
+
+
+def _compare(expected, stored, scope=''):
+    # Problems between two lists of (user_id, rank, total_score), prefixed by ``scope``
+    expected = {user_id: (rank, total_score) for user_id, rank, total_score in expected}
+    stored = {user_id: (rank, total_score) for user_id, rank, total_score in stored}
+
+    problems = []
+    for user_id in sorted(expected.keys() | stored.keys()):
+        if user_id not in stored:
+            problems.append(f"{scope}user {user_id}: missing from the leaderboard")
+        elif user_id not in expected:
+            problems.append(f"{scope}user {user_id}: ranked without any submission")
+        elif stored[user_id] != expected[user_id]:
+            problems.append(f"{scope}user {user_id}: stored (rank, total) {stored[user_id]}, expected {expected[user_id]}")
+    return problems
+
+
+def verify_leaderboard():
+    """
+    Compare the stored UserRank rows, and the entries of every open scoped
+    board, with a fresh computation.
+
+    Returns a list of human readable problems; an empty list means the stored
+    leaderboards are correct.
+    """
+    problems = _compare(expected_leaderboard(), UserRank.objects.values_list('user_id', 'rank', 'total_score'))
+
+    all_time = set(Leaderboard.objects.filter(period=Leaderboard.ALL_TIME).values_list('category_id', flat=True))
+    for category_id in sorted(set(_scored_categories()) - all_time):
+        problems.append(f"category {category_id}: all-time board missing")
+    for board in Leaderboard.objects.filter(frozen=False).select_related('category').order_by('pk'):
+        problems += _compare(expected_board(board), board.entries.values_list('user_id', 'rank', 'total_score'),
+                             f"{board}: ")
+    return problems
+
+
+def _leaderboard_entry(user_rank):
+    # Plain, cacheable view of a ranked user for the templates
+    profile = getattr(user_rank.user, 'profile', None)
+    return {
+        'rank': user_rank.rank,
+        'total_score': user_rank.total_score,
+        'username': user_rank.user.username,
+        'profile_img_url': profile.profile_img.url if profile and profile.profile_img else None,
+        'bio': profile.bio if profile else None,
+    }
+
+
+def _leaderboard_page(cursor=None):
+    ranked = UserRank.objects.filter(rank__isnull=False).select_related('user__profile')
+    page = keyset_paginate(ranked, 'rank', cursor, LEADERBOARD_PAGE_SIZE, descending=False)
+    return KeysetPage([_leaderboard_entry(user_rank) for user_rank in page], page.next_cursor)
+
+
+def leaderboard_page(cursor=None):
+    """
+    Return a KeysetPage of leaderboard entries (dicts) starting after
+    ``cursor``. The first page comes from the cache; other pages cost one
+    query, with the user and profile joined in.
+    """
+    if cursor:
+        return _leaderboard_page(cursor)
+
+    cached = cache.get(LEADERBOARD_CACHE_KEY)
+    if cached is None:
+        page = _leaderboard_page()
+        cached = (page.object_list, page.next_cursor)
+        cache.set(LEADERBOARD_CACHE_KEY, cached, getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', 5 * 60))
+    return KeysetPage(*cached)
+
+
+async def _aleaderboard_page(cursor=None):
+    ranked = UserRank.objects.filter(rank__isnull=False).select_related('user__profile')
+    page = await akeyset_paginate(ranked, 'rank', cursor, LEADERBOARD_PAGE_SIZE, descending=False)
+    return KeysetPage([_leaderboard_entry(user_rank) for user_rank in page], page.next_cursor)
+
+
+async def aleaderboard_page(cursor=None):
+    """Async version of leaderboard_page()."""
+    if cursor:
+        return await _aleaderboard_page(cursor)
+
+    cached = await cache.aget(LEADERBOARD_CACHE_KEY)
+    if cached is None:
+        page = await _aleaderboard_page()
+        cached = (page.object_list, page.next_cursor)
+        await cache.aset(LEADERBOARD_CACHE_KEY, cached, getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', 5 * 60))
+    return KeysetPage(*cached)
+
+
+def invalidate_leaderboard_cache():
+    """Drop the cached first page of the leaderboard."""
+    cache.delete(LEADERBOARD_CACHE_KEY)
+
+
+def period_bounds(period, day):
+    """
+    Return the ``(first day, day after the last)`` of the ``period`` holding
+    ``day``. Weeks start on Monday; the all-time period has no end.
+    """
+    if period == Leaderboard.ALL_TIME:
+        return ALL_TIME_START, None
+    if period == Leaderboard.WEEKLY:
+        start = day - datetime.timedelta(days=day.weekday())
+        return start, start + datetime.timedelta(days=7)
+    start = day.replace(day=1)
+    return start, (start + datetime.timedelta(days=32)).replace(day=1)
+
+
+def submission_day(submission):
+    # Local day a submission counts for
+    submitted_at = submission.submitted_at or timezone.now()
+    return timezone.localdate(submitted_at) if settings.USE_TZ else submitted_at.date()
+
+
+def board_scopes(category_id):
+    """The ``(category id, period)`` pairs of the boards a submission in ``category_id`` counts for."""
+    scopes = [(None, period) for period in GLOBAL_PERIODS]
+    if category_id is not None:
+        scopes += [(category_id, period) for period in CATEGORY_PERIODS]
+    return scopes
+
+
+def _lock_boards(scopes, day):
+    # The boards of ``scopes`` for the period holding ``day``, locked, creating the missing ones
+    starts = {(category_id, period): period_bounds(period, day)[0] for category_id, period in scopes}
+    matching = Q()
+    for (category_id, period), starts_on in starts.items():
+        matching |= Q(category_id=category_id, period=period, starts_on=starts_on)
+    boards = {(board.category_id, board.period): board
+              for board in Leaderboard.objects.select_for_update().filter(matching)}
+    for (category_id, period), starts_on in starts.items():
+        if (category_id, period) not in boards:
+            boards[(category_id, period)], _ = (Leaderboard.objects.select_for_update()
+                                                .get_or_create(category_id=category_id, period=period, starts_on=starts_on))
+    return list(boards.values())
+
+
+def _period_changes(submission, boards):
+    # Change of the quiz's worth on each weekly or monthly board, from the user's earlier attempts in the period
+    starts = {board.pk: _day_start(board.starts_on) for board in boards if board.period != Leaderboard.ALL_TIME}
+    if not starts:
+        return {}
+    earlier = list(QuizSubmission.objects
+                   .filter(user_id=submission.user_id, quiz_id=submission.quiz_id, submitted_at__gte=min(starts.values()))
+                   .exclude(pk=submission.pk)
+                   .order_by('submitted_at', 'pk')
+                   .values_list('submitted_at', 'score'))
+
+    changes = {}
+    for board_id, start in starts.items():
+        attempts = NO_ATTEMPTS
+        for submitted_at, score in earlier:
+            if submitted_at >= start:
+                attempts = add_attempt(attempts, score)
+        changes[board_id] = policy_score(add_attempt(attempts, submission.score)) - policy_score(attempts)
+    return changes
+
+
+def _category_total(category_id, user_id):
+    # Sum of the QuizScore rows of a user in a category
+    return (QuizScore.objects.filter(user_id=user_id, quiz__category_id=category_id)
+            .aggregate(total=Sum('score'))['total'] or 0)
+
+
+def _board_neighbours(user_id, totals):
+    # Rank of the lowest ranked entry ahead of the user on each board of ``totals``, {board id: new total}, in one query
+    new_total = Case(*[When(pk=board_id, then=Value(total)) for board_id, total in totals.items()],
+                     output_field=IntegerField())
+    ahead = (LeaderboardEntry.objects.filter(board=OuterRef('pk'))
+             .exclude(user_id=user_id)
+             .filter(_ahead_of(user_id, OuterRef('new_total')))
+             .order_by('total_score', '-user_id')
+             .values('rank')[:1])
+    return dict(Leaderboard.objects.filter(pk__in=list(totals))
+                .annotate(new_total=new_total, neighbour=Subquery(ahead))
+                .values_list('pk', 'neighbour'))
+
+
+def _move_entry(entry, new_rank, total_score):
+    # Shift the rows between the old and the new rank of a saved ``entry`` and move it there, in one UPDATE
+    old_rank = entry.rank
+    low, high = sorted((old_rank, new_rank))
+    (LeaderboardEntry.objects.filter(board_id=entry.board_id)
+     .filter(Q(pk=entry.pk) | Q(rank__gte=low, rank__lte=high))
+     .update(rank=Case(When(pk=entry.pk, then=Value(new_rank)), default=F('rank') + (1 if new_rank < old_rank else -1)),
+             total_score=Case(When(pk=entry.pk, then=Value(total_score)), default=F('total_score'))))
+
+
+def record_board_submission(submission, all_time_change):
+    """
+    Apply a new ``submission`` to every scoped board it counts for,
+    re-ranking the submitting user only. All-time boards move by
+    ``all_time_change``, the change of the quiz's QuizScore, and a user new
+    to one starts from their QuizScore total in its category, earlier quizzes
+    included; weekly and monthly boards apply the scoring policy to the
+    attempts of their period.
+    The board rows and the user's entries are locked, so concurrent
+    submissions queue per board. The new positions on every board are found
+    with one query, then each board is updated with a single UPDATE and the
+    user's new entries are inserted together.
+    """
+    with transaction.atomic():
+        boards = [board for board in _lock_boards(board_scopes(submission.quiz.category_id), submission_day(submission))
+                  if not board.frozen]  # Archived periods keep their final ranks
+        entries = {entry.board_id: entry for entry in
+                   LeaderboardEntry.objects.select_for_update().filter(board__in=boards, user_id=submission.user_id)}
+        changes = _period_changes(submission, boards)
+
+        totals = {}  # {board id: new total of the user}, for the boards where it moves
+        for board in boards:
+            entry = entries.get(board.pk)
+            change = changes.get(board.pk, all_time_change)
+            if entry is None and board.period == Leaderboard.ALL_TIME:
+                totals[board.pk] = _category_total(board.category_id, submission.user_id)
+            elif entry is None or change:
+                totals[board.pk] = (entry.total_score if entry else 0) + change
+        if not totals:
+            return
+
+        neighbours = _board_neighbours(submission.user_id, totals)
+        created = []
+        for board_id, total_score in totals.items():
+            entry = entries.get(board_id)
+            if entry is not None:
+                _move_entry(entry, _new_rank(neighbours[board_id], entry.rank), total_score)
+                continue
+            rank = _new_rank(neighbours[board_id], None)
+            LeaderboardEntry.objects.filter(board_id=board_id, rank__gte=rank).update(rank=F('rank') + 1)
+            created.append(LeaderboardEntry(board_id=board_id, user_id=submission.user_id,
+                                            rank=rank, total_score=total_score))
+        LeaderboardEntry.objects.bulk_create(created)
+
+
+def _day_start(day):
+    # Aware start of a local day
+    start = datetime.datetime.combine(day, datetime.time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def board_submissions(board):
+    """The QuizSubmission queryset counted by ``board``."""
+    submissions = QuizSubmission.objects.all()
+    if board.category_id is not None:
+        submissions = submissions.filter(quiz__category_id=board.category_id)
+    if board.period != Leaderboard.ALL_TIME:
+        start, end = period_bounds(board.period, board.starts_on)
+        submissions = submissions.filter(submitted_at__gte=_day_start(start), submitted_at__lt=_day_start(end))
+    return submissions
+
+
+def _scored_categories():
+    # Ids of the categories having at least one QuizScore row
+    return QuizScore.objects.values_list('quiz__category_id', flat=True).order_by().distinct()
+
+
+def expected_board(board):
+    """
+    Compute the entries of ``board`` from scratch under the scoring policy,
+    as ``(user_id, rank, total_score)`` tuples, best user first: all-time
+    boards from the QuizScore rows of their category, weekly and monthly
+    ones from the submissions of their period.
+    """
+    if board.period == Leaderboard.ALL_TIME:
+        quiz_scores = QuizScore.objects.all()
+        if board.category_id is not None:
+            quiz_scores = quiz_scores.filter(quiz__category_id=board.category_id)
+        totals = dict(quiz_scores.values('user').annotate(total=Sum('score')).values_list('user', 'total').order_by())
+    else:
+        totals = period_scores(board_submissions(board))
+
+    ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+    return [(user_id, rank, total_score) for rank, (user_id, total_score) in enumerate(ranked, start=1)]
+
+
+def rebuild_board(board):
+    """
+    Recompute every entry of ``board``, see expected_board(), with the board
+    row locked against concurrent submissions. Returns the number of ranked
+    users.
+    """
+    with transaction.atomic():
+        Leaderboard.objects.select_for_update().get(pk=board.pk)
+        rows = [LeaderboardEntry(board=board, user_id=user_id, rank=rank, total_score=total_score)
+                for user_id, rank, total_score in expected_board(board)]
+        board.entries.all().delete()
+        LeaderboardEntry.objects.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE)
+    return len(rows)
+
+
+def rebuild_boards():
+    """
+    Create the missing all-time board of every category with scores and
+    recompute every board still open; frozen boards keep their archived
+    ranks. Returns the number of boards rebuilt.
+    """
+    for category_id in _scored_categories():
+        Leaderboard.objects.get_or_create(category_id=category_id, period=Leaderboard.ALL_TIME,
+                                          starts_on=ALL_TIME_START)
+    boards = list(Leaderboard.objects.filter(frozen=False).order_by('pk'))
+    for board in boards:
+        rebuild_board(board)
+    return len(boards)
+
+
+def freeze_leaderboards(today=None):
+    """
+    Archive every weekly and monthly board whose period ended before
+    ``today``: its ranks are recomputed one last time and it stops receiving
+    submissions. Returns the number of boards frozen.
+    """
+    today = today or timezone.localdate()
+    frozen = 0
+    open_boards = Leaderboard.objects.filter(frozen=False).exclude(period=Leaderboard.ALL_TIME)
+    for board in open_boards.order_by('starts_on'):
+        if period_bounds(board.period, board.starts_on)[1] > today:
+            continue
+        with transaction.atomic():
+            rebuild_board(board)
+            board.frozen = True
+            board.save(update_fields=['frozen'])
+        frozen += 1
+    return frozen
+
+
+def find_board(category_id=None, period=Leaderboard.ALL_TIME, day=None):
+    """
+    Return the board of ``category_id`` for the ``period`` holding ``day``
+    (today by default), or None when nobody has scored in it yet.
+    """
+    starts_on = period_bounds(period, day or timezone.localdate())[0]
+    return (Leaderboard.objects.select_related('category')
+            .filter(category_id=category_id, period=period, starts_on=starts_on)
+            .first())
+
+
+async def afind_board(category_id=None, period=Leaderboard.ALL_TIME, day=None):
+    """Async version of find_board()."""
+    starts_on = period_bounds(period, day or timezone.localdate())[0]
+    return await (Leaderboard.objects.select_related('category')
+                  .filter(category_id=category_id, period=period, starts_on=starts_on)
+                  .afirst())
+
+
+def board_page(board, cursor=None):
+    """Return a KeysetPage of the entries (dicts) of ``board`` starting after ``cursor``."""
+    ranked = board.entries.filter(rank__isnull=False).select_related('user__profile')
+    page = keyset_paginate(ranked, 'rank', cursor, LEADERBOARD_PAGE_SIZE, descending=False)
+    return KeysetPage([_leaderboard_entry(entry) for entry in page], page.next_cursor)
+
+
+async def aboard_page(board, cursor=None):
+    """Async version of board_page()."""
+    ranked = board.entries.filter(rank__isnull=False).select_related('user__profile')
+    page = await akeyset_paginate(ranked, 'rank', cursor, LEADERBOARD_PAGE_SIZE, descending=False)
+    return KeysetPage([_leaderboard_entry(entry) for entry in page], page.next_cursor)
+
+
+def board_range(board, first, last):
+    """Return the entries (dicts) ranked ``first`` to ``last`` on ``board``."""
+    entries = (board.entries.filter(rank__gte=first, rank__lte=last)
+               .select_related('user__profile')
+               .order_by('rank'))
+    return [_leaderboard_entry(entry) for entry in entries]
+
+
+def board_position(board, user):
+    """Return ``(rank, total score)`` of ``user`` on ``board``, or None if they are not ranked."""
+    return (board.entries.filter(user=user)
+            .values_list('rank', 'total_score')
+            .first())
+
+
+async def aboard_position(board, user):
+    """Async version of board_position()."""
+    return await (board.entries.filter(user=user)
+                  .values_list('rank', 'total_score')
+                  .afirst())
@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+
+from django.core.management.base import BaseCommand
+
+from quiz.leaderboard import freeze_leaderboards
+
+
+class Command(BaseCommand):
+    help = "Archive the weekly and monthly leaderboards whose period is over. Meant to run daily."
+
+    def handle(self, *args, **options):
+        frozen = freeze_leaderboards()
+        self.stdout.write(self.style.SUCCESS(f"Froze {frozen} leaderboard(s)."))
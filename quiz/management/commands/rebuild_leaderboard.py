@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.leaderboard import rebuild_leaderboard, verify_leaderboard
+
+
+class Command(BaseCommand):
+    help = "Rebuild every UserRank row and open scoped board from the quiz submissions and check the result."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check-only',
+            action='store_true',
+            help="Only compare the stored leaderboard with a fresh computation, without rebuilding it.",
+        )
+
+    def handle(self, *args, **options):
+        if not options['check_only']:
+            ranked = rebuild_leaderboard()
+            self.stdout.write(f"Rebuilt leaderboard for {ranked} users.")
+
+        # Check the stored ranks against a fresh computation
+        problems = verify_leaderboard()
+        for problem in problems[:20]:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f"Leaderboard check failed: {len(problems)} mismatching users.")
+
+        self.stdout.write(self.style.SUCCESS("Leaderboard check passed."))
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+
+from django.core.management.base import BaseCommand
+
+from quiz.search import refresh_search_vectors, uses_database_index
+
+
+class Command(BaseCommand):
+    help = "Recompute the full-text search vector of every quiz, e.g. after changing QUIZ_SEARCH_QUESTIONS."
+
+    def handle(self, *args, **options):
+        if not uses_database_index():
+            self.stdout.write("This database uses the in-process search index; nothing to rebuild.")
+            return
+        updated = refresh_search_vectors()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search vector of {updated} quizzes."))
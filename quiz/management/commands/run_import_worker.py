@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from quiz.worker import STALE_JOB_TIMEOUT, requeue_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued quiz file imports (ImportJob rows) in the background."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Process the jobs currently queued, then exit.",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help="Seconds to wait between polls when the queue is empty (default: 5).",
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=float,
+            default=STALE_JOB_TIMEOUT.total_seconds() / 60,
+            help="Minutes after which a running job is assumed abandoned and queued again on start "
+                 f"(default: {STALE_JOB_TIMEOUT.total_seconds() / 60:g}).",
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs(datetime.timedelta(minutes=options['stale_after']))
+        if requeued:
+            self.stdout.write(f"Queued again {requeued} abandoned import job(s).")
+        try:
+            while True:
+                for job in run_pending_jobs():
+                    self.stdout.write(f"Import job {job.id} for '{job.quiz.title}': {job.status} "
+                                      f"({job.inserted} inserted, {job.skipped} skipped, {job.invalid} invalid)")
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Import worker stopped.")
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='quiz_file_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='quiz_file_rows',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_quiz_scores(apps, schema_editor):
+    # One QuizScore per (user, quiz) already submitted, worth its best attempt
+    # (or latest/average, per LEADERBOARD_SCORE_POLICY). Run rebuild_leaderboard
+    # afterwards so the ranks use them.
+    QuizSubmission = apps.get_model('quiz', 'QuizSubmission')
+    QuizScore = apps.get_model('quiz', 'QuizScore')
+    policy = getattr(settings, 'LEADERBOARD_SCORE_POLICY', 'best')
+
+    pairs = {}
+    rows = QuizSubmission.objects.order_by('submitted_at', 'pk').values_list('user_id', 'quiz_id', 'score')
+    for user_id, quiz_id, score in rows.iterator():
+        pair = pairs.setdefault((user_id, quiz_id), QuizScore(user_id=user_id, quiz_id=quiz_id, best_score=score))
+        pair.attempts += 1
+        pair.best_score = max(pair.best_score, score)
+        pair.latest_score = score
+        pair.total_score += score
+
+    for pair in pairs.values():
+        if policy == 'latest':
+            pair.score = pair.latest_score
+        elif policy == 'average':
+            pair.score = round(pair.total_score / pair.attempts)
+        else:
+            pair.score = pair.best_score
+    QuizScore.objects.bulk_create(pairs.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_leaderboard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('best_score', models.IntegerField(default=0)),
+                ('latest_score', models.IntegerField(default=0)),
+                ('total_score', models.IntegerField(default=0)),
+                ('score', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quiz.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'quiz'), name='unique_quiz_score')],
+            },
+        ),
+        migrations.RunPython(backfill_quiz_scores, migrations.RunPython.noop),
+    ]
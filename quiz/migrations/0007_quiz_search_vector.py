@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:48
+
+import django.contrib.postgres.search
+import quiz.models
+from django.db import migrations
+
+
+def fill_search_vectors(apps, schema_editor):
+    # Initial vectors, on PostgreSQL only; other databases use the in-process
+    # index of quiz.search
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("""
+        UPDATE quiz_quiz SET search_vector =
+            setweight(to_tsvector('english', coalesce(title, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+            || setweight(to_tsvector('english', coalesce(
+                (SELECT string_agg(text, ' ') FROM quiz_question WHERE quiz_id = quiz_quiz.id), '')), 'C')
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_quizscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=quiz.models.SearchVectorIndex(fields=['search_vector'], name='quiz_quiz_search_vector_gin'),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:52
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def fill_slugs(apps, schema_editor):
+    # Derive a unique slug from the name of every existing category
+    Category = apps.get_model('quiz', 'Category')
+    taken = set()
+    for category in Category.objects.order_by('pk'):
+        base = slugify(category.name)[:16] or 'category'
+        slug, suffix = base, 1
+        while slug in taken:
+            suffix += 1
+            slug = f"{base}-{suffix}"
+        taken.add(slug)
+        category.slug = slug
+        category.save(update_fields=['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_quiz_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=20, null=True),
+        ),
+        migrations.RunPython(fill_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=20, unique=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:58
+
+import django.db.models.constraints
+from django.conf import settings
+from django.db import migrations, models
+
+
+def renumber_ranks(apps, schema_editor):
+    # Make ranks unique before the constraint is added: best total first, ties by user id
+    UserRank = apps.get_model('quiz', 'UserRank')
+    rows = list(UserRank.objects.filter(rank__isnull=False).order_by('-total_score', 'user_id'))
+    for rank, row in enumerate(rows, start=1):
+        row.rank = rank
+    UserRank.objects.bulk_update(rows, ['rank'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_category_slug'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['created_at', 'id'], name='quiz_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizsubmission',
+            index=models.Index(fields=['user', 'submitted_at'], name='submission_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizsubmission',
+            index=models.Index(fields=['quiz', 'score'], name='submission_quiz_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizsubmission',
+            index=models.Index(fields=['submitted_at'], name='submission_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userrank',
+            index=models.Index(fields=['total_score', 'user'], name='userrank_score_idx'),
+        ),
+        migrations.RunPython(renumber_ranks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userrank',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['DEFERRED'], fields=('rank',), name='unique_user_rank'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:12
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+def _worth(scores, policy):
+    # What the attempts of one quiz, oldest first, are worth under the scoring policy
+    if policy == 'latest':
+        return scores[-1]
+    if policy == 'average':
+        return round(sum(scores) / len(scores))
+    return max(scores)
+
+
+def _day_start(day):
+    start = datetime.datetime.combine(day, datetime.time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def backfill_leaderboards(apps, schema_editor):
+    # Boards are only fed by submissions made after 0005, so rank the earlier
+    # ones: the all-time board of every category from the QuizScore rows, and
+    # the boards of the current week and month from their submissions.
+    Leaderboard = apps.get_model('quiz', 'Leaderboard')
+    LeaderboardEntry = apps.get_model('quiz', 'LeaderboardEntry')
+    QuizScore = apps.get_model('quiz', 'QuizScore')
+    QuizSubmission = apps.get_model('quiz', 'QuizSubmission')
+    policy = getattr(settings, 'LEADERBOARD_SCORE_POLICY', 'best')
+
+    totals = {}  # {(category id, period, starts_on): {user id: total}}
+    for user_id, category_id, score in QuizScore.objects.values_list('user_id', 'quiz__category_id', 'score').iterator():
+        board = totals.setdefault((category_id, 'all', datetime.date.min), {})
+        board[user_id] = board.get(user_id, 0) + score
+
+    today = timezone.localdate() if settings.USE_TZ else datetime.date.today()
+    periods = {'week': today - datetime.timedelta(days=today.weekday()), 'month': today.replace(day=1)}
+    starts = {period: _day_start(day) for period, day in periods.items()}
+    attempts = {}  # {(category id, period, starts_on, user id, quiz id): [scores]}
+    rows = (QuizSubmission.objects.filter(submitted_at__gte=min(starts.values()))
+            .order_by('submitted_at', 'pk')
+            .values_list('user_id', 'quiz_id', 'quiz__category_id', 'submitted_at', 'score'))
+    for user_id, quiz_id, category_id, submitted_at, score in rows.iterator():
+        for period, start in starts.items():
+            if submitted_at >= start:
+                for scope in (None, category_id):
+                    attempts.setdefault((scope, period, periods[period], user_id, quiz_id), []).append(score)
+    for (category_id, period, starts_on, user_id, _), scores in attempts.items():
+        board = totals.setdefault((category_id, period, starts_on), {})
+        board[user_id] = board.get(user_id, 0) + _worth(scores, policy)
+
+    for (category_id, period, starts_on), users in totals.items():
+        board, _ = Leaderboard.objects.get_or_create(category_id=category_id, period=period, starts_on=starts_on)
+        if board.frozen:
+            continue
+        ranked = sorted(users.items(), key=lambda item: (-item[1], item[0]))
+        LeaderboardEntry.objects.filter(board=board).delete()
+        LeaderboardEntry.objects.bulk_create(
+            [LeaderboardEntry(board=board, user_id=user_id, rank=rank, total_score=total_score)
+             for rank, (user_id, total_score) in enumerate(ranked, start=1)],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_leaderboards, migrations.RunPython.noop),
+    ]
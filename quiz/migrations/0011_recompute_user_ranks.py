@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:30
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def recompute_user_ranks(apps, schema_editor):
+    # 0006 counted each quiz once (QuizScore) without touching UserRank, whose
+    # totals still summed every attempt: recompute them and the ranks, best
+    # total first, ties by user id, as expected_leaderboard() does
+    UserRank = apps.get_model('quiz', 'UserRank')
+    QuizScore = apps.get_model('quiz', 'QuizScore')
+
+    totals = dict(QuizScore.objects.values('user').annotate(total=Sum('score'))
+                  .values_list('user', 'total').order_by())
+    UserRank.objects.exclude(user_id__in=list(totals)).delete()
+    rows = {row.user_id: row for row in UserRank.objects.all()}
+    for user_id in totals.keys() - rows.keys():
+        rows[user_id] = UserRank.objects.create(user_id=user_id)
+
+    ranked = sorted(rows.values(), key=lambda row: (-totals[row.user_id], row.user_id))
+    for rank, row in enumerate(ranked, start=1):
+        row.rank = rank
+        row.total_score = totals[row.user_id]
+    UserRank.objects.bulk_update(ranked, ['rank', 'total_score'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_backfill_leaderboards'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_user_ranks, migrations.RunPython.noop),
+    ]
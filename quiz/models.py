@@ -2,17 +2,29 @@
 
 # Import necessary Django models and modules
 from django.db import models
-import pandas as pd
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
-from django.db.models import Sum
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from smart_open import open  # Handles opening files from various sources, including S3
-import io  # Allows in-memory byte handling
+from django.utils import timezone
+from django.utils.text import slugify
+import hashlib  # Content hashes of imported quiz files
+
+
+# Helper to compute the SHA-256 of a file field without loading it in memory at once
+def file_hash(field_file):
+    digest = hashlib.sha256()
+    for chunk in field_file.chunks():  # chunks() starts from the beginning of the file
+        digest.update(chunk)
+    field_file.seek(0)  # Leave the upload ready to be stored
+    return digest.hexdigest()
+
 
 # Category model: Represents a quiz category with a name
 class Category(models.Model):
     name = models.CharField(max_length=15)  # Category name with max length of 15 characters
+    slug = models.SlugField(max_length=20, unique=True, blank=True)  # URL identifier, derived from the name when left blank
 
     class Meta:
         verbose_name_plural = 'Categories'  # Plural name in the Django admin
@@ -20,55 +32,140 @@ class Category(models.Model):
     def __str__(self):
         return self.name  # Returns the category name as a string
 
+    # Override the save method to give new categories a unique slug
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = unique_category_slug(self.name, exclude_pk=self.pk)
+        super().save(*args, **kwargs)
+
+
+# Helper building a slug from a category name, suffixed with a number when already taken
+def unique_category_slug(name, exclude_pk=None):
+    base = slugify(name)[:16] or 'category'
+    slug, suffix = base, 1
+    while Category.objects.filter(slug=slug).exclude(pk=exclude_pk).exists():
+        suffix += 1
+        slug = f"{base}-{suffix}"
+    return slug
+
+
+# Signal receivers dropping the cached category list whenever a category changes
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, **kwargs):
+    from .categories import invalidate_categories  # Imported here to avoid a circular import
+    invalidate_categories()
+
+
+# GIN index of the full-text search vector. The vector is only filled on
+# PostgreSQL (see quiz.search); other databases, which do not know GIN, get a
+# plain index of the column instead
+class SearchVectorIndex(GinIndex):
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return models.Index.create_sql(self, model, schema_editor, using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
 
 # Quiz model: Stores quiz details and handles uploading quiz files
 class Quiz(models.Model):
     title = models.CharField(max_length=255)  # Quiz title
     description = models.TextField()  # Description of the quiz
     category = models.ForeignKey(Category, on_delete=models.CASCADE)  # Link to category, deleted with category
-    quiz_file = models.FileField(upload_to='quiz/')  # File field for uploading quiz file (Excel)
+    quiz_file = models.FileField(upload_to='quiz/')  # File field for uploading quiz file (Excel or CSV)
     created_at = models.DateTimeField(auto_now_add=True)  # Auto-set at quiz creation
     updated_at = models.DateTimeField(auto_now=True)  # Auto-updated when quiz is modified
+    quiz_file_hash = models.CharField(max_length=64, blank=True, editable=False)  # SHA-256 of the last imported file
+    quiz_file_rows = models.IntegerField(null=True, blank=True, editable=False)  # Rows parsed from the last imported file
+    search_vector = SearchVectorField(null=True, editable=False)  # Full-text index of the quiz (PostgreSQL only, see quiz.search)
 
     class Meta:
         verbose_name_plural = 'Quizzes'  # Plural name in Django admin
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='quiz_created_idx'),  # Newest-first listing pages
+            SearchVectorIndex(fields=['search_vector'], name='quiz_quiz_search_vector_gin'),  # Full-text search
+        ]
 
     def __str__(self):
         return self.title  # Returns quiz title as a string
 
-    # Override the save method to trigger Excel file import upon saving
+    # Override the save method to queue the Excel file import when the file changed
     def save(self, *args, **kwargs):
+        file_changed = bool(self.quiz_file) and self.quiz_file_changed()
         super().save(*args, **kwargs)  # Call the base class save method
-        if self.quiz_file:
-            self.import_quiz_from_excel()  # Import quiz data if file is provided
-
-    # Method to import quiz questions and choices from an Excel file
+        from .search import refresh_search_vectors  # Imported here to avoid a circular import
+        refresh_search_vectors(Quiz.objects.filter(pk=self.pk))  # Title or description may have changed
+        if file_changed:
+            self.queue_import()  # The import worker picks the file up in the background
+
+    # Check whether the quiz file differs from the one imported last
+    def quiz_file_changed(self):
+        if not self.quiz_file._committed:
+            # A fresh upload: compare its content with the last imported file
+            return file_hash(self.quiz_file) != self.quiz_file_hash
+        if self.pk is None:
+            return True
+        # An already stored file: it changed only if another file was assigned
+        stored_name = Quiz.objects.filter(pk=self.pk).values_list('quiz_file', flat=True).first()
+        return stored_name != self.quiz_file.name
+
+    # Queue a background import of the quiz file, unless one is already waiting
+    def queue_import(self):
+        job = self.importjob_set.filter(status=ImportJob.PENDING).first()
+        if job is None:
+            job = ImportJob.objects.create(quiz=self)
+        self.queued_import = job
+        return job
+
+    # Method to import quiz questions and choices from an Excel (or CSV) file
     def import_quiz_from_excel(self):
-        # Use self.quiz_file.url to access the S3 file URL
-        s3_url = self.quiz_file.url
-
-        # Open the Excel file from S3 using smart_open
-        with open(s3_url, 'rb') as file:
-            # Load Excel file content into a pandas DataFrame
-            df = pd.read_excel(io.BytesIO(file.read()))
+        from .importer import ImportResult, import_file  # Imported here to avoid a circular import
+
+        # Open the file through its storage backend (local media or S3)
+        with self.quiz_file.open('rb'):
+            # Identical bytes were already imported: nothing to parse or write
+            content_hash = file_hash(self.quiz_file)
+            if content_hash == self.quiz_file_hash and self.quiz_file_rows is not None:
+                self.last_import = ImportResult(0, self.quiz_file_rows, 0, [])
+                return self.last_import
+
+            # Stream the rows in chunks straight into bulk inserts
+            self.last_import = import_file(self, self.quiz_file, self.quiz_file.name)
+
+        # Remember what was imported, without going through save() again
+        self.quiz_file_hash = content_hash
+        self.quiz_file_rows = self.last_import.inserted + self.last_import.skipped + self.last_import.invalid
+        Quiz.objects.filter(pk=self.pk).update(quiz_file_hash=self.quiz_file_hash, quiz_file_rows=self.quiz_file_rows)
+        return self.last_import
+
+
+# ImportJob model: A queued import of a quiz file, processed by the import worker command
+class ImportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)  # Quiz whose file is imported
+    status = models.CharField(max_length=7, choices=STATUS, default=PENDING)  # Where the job is in its lifecycle
+    inserted = models.IntegerField(default=0)  # Questions created by the import
+    skipped = models.IntegerField(default=0)  # Rows whose question already existed
+    invalid = models.IntegerField(default=0)  # Rows rejected by validation
+    error = models.TextField(blank=True)  # Failure reason or rejected rows
+    created_at = models.DateTimeField(auto_now_add=True)  # When the job was queued
+    started_at = models.DateTimeField(null=True, blank=True)  # When a worker picked the job up
+    finished_at = models.DateTimeField(null=True, blank=True)  # When the job completed or failed
 
-        # Iterate over each row in the DataFrame to extract question and choices
-        for index, row in df.iterrows():
-            question_text = row['Question']  # Question text
-            choice1 = row['A']  # Option A
-            choice2 = row['B']  # Option B
-            choice3 = row['C']  # Option C
-            choice4 = row['D']  # Option D
-            correct_answer = row['Answer']  # Correct answer
-
-            # Create or retrieve Question object
-            question = Question.objects.get_or_create(quiz=self, text=question_text)
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]  # Workers poll pending jobs oldest first
 
-            # Create Choice objects for each option
-            Choice.objects.get_or_create(question=question[0], text=choice1, is_correct=correct_answer == 'A')
-            Choice.objects.get_or_create(question=question[0], text=choice2, is_correct=correct_answer == 'B')
-            Choice.objects.get_or_create(question=question[0], text=choice3, is_correct=correct_answer == 'C')
-            Choice.objects.get_or_create(question=question[0], text=choice4, is_correct=correct_answer == 'D')
+    def __str__(self):
+        return f"{self.quiz.title}, {self.status}"  # Returns quiz title and job status
 
 
 # Question model: Represents a single question in a quiz
@@ -90,6 +187,24 @@ class Choice(models.Model):
         return f"{self.question.text[:50]}, {self.text[:20]}"  # Returns a short description of the choice
 
 
+# Helper to mark a quiz as changed, so caches keyed on its updated_at are refreshed
+def touch_quiz(quiz_id):
+    Quiz.objects.filter(pk=quiz_id).update(updated_at=timezone.now())
+    from .search import refresh_search_vectors  # Imported here to avoid a circular import
+    refresh_search_vectors(Quiz.objects.filter(pk=quiz_id))  # Question text is part of the search vector
+
+
+# Signal receivers to bump the quiz version whenever one of its questions or choices changes
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    touch_quiz(instance.quiz_id)
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    Quiz.objects.filter(question__id=instance.question_id).update(updated_at=timezone.now())
+
+
 # QuizSubmission model: Tracks each user's submission and score for a quiz
 class QuizSubmission(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)  # User who submitted the quiz
@@ -97,16 +212,69 @@ class QuizSubmission(models.Model):
     score = models.IntegerField()  # Score achieved by the user
     submitted_at = models.DateTimeField(auto_now_add=True)  # Submission timestamp
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'submitted_at'], name='submission_user_time_idx'),  # Profile history pages
+            models.Index(fields=['quiz', 'score'], name='submission_quiz_score_idx'),  # Top scores of a quiz
+            models.Index(fields=['submitted_at'], name='submission_time_idx'),  # Dashboard day counts and rollups
+        ]
+
     def __str__(self):
         return f"{self.user}, {self.quiz.title}"  # Returns user and quiz info
 
 
+# SubmissionAnswer model: The choice picked for one question of a submission
+class SubmissionAnswer(models.Model):
+    submission = models.ForeignKey(QuizSubmission, on_delete=models.CASCADE)  # Submission the answer belongs to
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)  # Question answered
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)  # Choice selected by the user
+    is_correct = models.BooleanField(default=False)  # Whether the selected choice was the right one
+
+    class Meta:
+        constraints = [
+            # One answer per question; also the index used to load a submission's answers
+            models.UniqueConstraint(fields=['submission', 'question'], name='unique_submission_question'),
+        ]
+
+    def __str__(self):
+        return f"{self.submission}, {self.question.text[:50]}"  # Returns submission and question info
+
+
+# QuizScore model: Summary of every attempt of a user at one quiz, the source of the leaderboard totals
+class QuizScore(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)  # User who took the quiz
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)  # Quiz taken
+    attempts = models.PositiveIntegerField(default=0)  # Number of submissions
+    best_score = models.IntegerField(default=0)  # Highest score of any attempt
+    latest_score = models.IntegerField(default=0)  # Score of the last attempt
+    total_score = models.IntegerField(default=0)  # Sum of every attempt's score, for averages
+    score = models.IntegerField(default=0)  # Score counted on the leaderboard, per LEADERBOARD_SCORE_POLICY
+    updated_at = models.DateTimeField(auto_now=True)  # Time of the last attempt
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'quiz'], name='unique_quiz_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.user}, {self.quiz.title}: {self.score}"  # Returns user, quiz and counted score
+
+
 # UserRank model: Tracks the rank and total score of each user for leaderboard
 class UserRank(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)  # Unique link to a user
     rank = models.IntegerField(null=True, blank=True)  # User rank
     total_score = models.IntegerField(null=True, blank=True)  # Total score across all quizzes
 
+    class Meta:
+        constraints = [
+            # One user per rank; deferred to commit, as re-ranking shifts ranks by one in a single UPDATE
+            models.UniqueConstraint(fields=['rank'], name='unique_user_rank', deferrable=models.Deferrable.DEFERRED),
+        ]
+        indexes = [
+            models.Index(fields=['total_score', 'user'], name='userrank_score_idx'),  # Finding a user's new neighbour
+        ]
+
     def __str__(self):
         return f"{self.rank}, {self.user.username}"  # Returns rank and username
 
@@ -114,26 +282,63 @@ class UserRank(models.Model):
     @receiver(post_save, sender=QuizSubmission)
     def update_leaderboard(sender, instance, created, **kwargs):
         if created:
-            update_leaderboard()  # Calls the function to update leaderboard
+            from .leaderboard import record_submission  # Imported here to avoid a circular import
+            record_submission(instance)  # Re-ranks the submitting user only
+
+    # Signal receiver to repair the leaderboard when a QuizSubmission is deleted, alone or with its quiz or user
+    @receiver(post_delete, sender=QuizSubmission)
+    def repair_leaderboard(sender, instance, **kwargs):
+        from .leaderboard import record_deleted_submission  # Imported here to avoid a circular import
+        record_deleted_submission(instance)  # Repairs once the deleting transaction commits
+
+
+# Leaderboard model: One materialized ranking, for a category (or every category) over a period
+class Leaderboard(models.Model):
+    ALL_TIME = 'all'
+    WEEKLY = 'week'
+    MONTHLY = 'month'
+    PERIOD_CHOICES = [
+        (ALL_TIME, 'All time'),
+        (WEEKLY, 'Weekly'),
+        (MONTHLY, 'Monthly'),
+    ]
+
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)  # Category ranked, null for every category
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)  # Length of the ranked period
+    starts_on = models.DateField()  # First day of the period
+    frozen = models.BooleanField(default=False)  # Set once the period is over and its final ranks are archived
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'period', 'starts_on'], name='unique_leaderboard_category'),
+            models.UniqueConstraint(fields=['period', 'starts_on'], condition=models.Q(category__isnull=True), name='unique_leaderboard_all'),
+        ]
+
+    def __str__(self):
+        return f"{self.category or 'All categories'}, {self.get_period_display()} from {self.starts_on}"  # Returns scope and period
+
+
+# LeaderboardEntry model: Rank and total score of a user on one Leaderboard
+class LeaderboardEntry(models.Model):
+    board = models.ForeignKey(Leaderboard, on_delete=models.CASCADE, related_name='entries')  # Ranking the entry belongs to
+    user = models.ForeignKey(User, on_delete=models.CASCADE)  # Ranked user
+    rank = models.IntegerField(null=True, blank=True)  # User rank on this board
+    total_score = models.IntegerField(default=0)  # Total score over the board's scope and period
+
+    class Meta:
+        constraints = [
+            # One entry per user and board; also the index behind "what's my position"
+            models.UniqueConstraint(fields=['board', 'user'], name='unique_leaderboard_user'),
+        ]
+        indexes = [
+            models.Index(fields=['board', 'rank']),  # Rank range reads
+        ]
+
+    def __str__(self):
+        return f"{self.rank}, {self.user.username}"  # Returns rank and username
 
 
-# Function to update the leaderboard based on user scores
+# Function to rebuild the whole leaderboard based on user scores
 def update_leaderboard():
-    # Aggregate total scores for all users, ordered by score descending
-    user_scores = (QuizSubmission.objects.values('user')
-                   .annotate(total_score=Sum('score'))
-                   .order_by('-total_score'))
-
-    # Update each user's rank based on score
-    rank = 1  # Starting rank
-    for entry in user_scores:
-        user_id = entry['user']
-        total_score = entry['total_score']
-
-        # Update or create UserRank for each user
-        user_rank, created = UserRank.objects.get_or_create(user_id=user_id)
-        user_rank.rank = rank
-        user_rank.total_score = total_score
-        user_rank.save()
-
-        rank += 1  # Increment rank for next user
+    from .leaderboard import rebuild_leaderboard  # Imported here to avoid a circular import
+    return rebuild_leaderboard()  # Recomputes every total and rank from scratch
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# Versioned cache of the rendered quiz body.
+#
+# The question/choice HTML of a quiz is rendered once and stored under a key
+# made of the quiz id and its updated_at. Saving a Quiz bumps updated_at, and
+# the Question/Choice signal receivers in quiz.models do the same through
+# touch_quiz(), so an edit makes every process miss and re-render without
+# deleting anything: stale entries simply expire. The cache alias is taken
+# from the QUIZ_PAGE_CACHE setting, so the local-memory default can be
+# swapped for a shared backend (memcached, redis, ...) through CACHE_URL.
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+
+from .models import Choice
+
+# Template rendering the question cards of a quiz
+QUIZ_BODY_TEMPLATE = 'components/quiz-questions.html'
+
+# Counters names, stored in the cache so that a shared backend aggregates every process
+STATS = ('hits', 'misses')
+
+
+def _cache():
+    return caches[getattr(settings, 'QUIZ_PAGE_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'QUIZ_PAGE_CACHE_TIMEOUT', 60 * 60)
+
+
+def _count(name):
+    cache = _cache()
+    key = f'quiz-body-stats:{name}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:  # The counter was evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def questions_with_choices(quiz):
+    """Load the questions of ``quiz`` with their choices in two queries, in a stable order."""
+    choices = Prefetch('choice_set', queryset=Choice.objects.order_by('id'))
+    return list(quiz.question_set.order_by('id').prefetch_related(choices))
+
+
+async def aquestions_with_choices(quiz):
+    """Async version of questions_with_choices()."""
+    choices = Prefetch('choice_set', queryset=Choice.objects.order_by('id'))
+    return [question async for question in quiz.question_set.order_by('id').prefetch_related(choices)]
+
+
+def quiz_body_key(quiz):
+    """Cache key of the rendered body of ``quiz`` at its current version."""
+    return f'quiz-body:{quiz.pk}:{quiz.updated_at.isoformat()}'
+
+
+def render_quiz_body(quiz):
+    """
+    Return ``(html, question_count)`` for the question cards of ``quiz``,
+    from the cache when this version of the quiz was already rendered.
+    """
+    cache = _cache()
+    key = quiz_body_key(quiz)
+    body = cache.get(key)
+    if body is not None:
+        _count('hits')
+        return body
+
+    _count('misses')
+    questions = questions_with_choices(quiz)
+    body = (render_to_string(QUIZ_BODY_TEMPLATE, {'questions': questions}), len(questions))
+    cache.set(key, body, _timeout())
+    return body
+
+
+def cache_stats():
+    """Return the hit and miss counters, plus the hit rate in percent."""
+    stats = _cache().get_many([f'quiz-body-stats:{name}' for name in STATS])
+    hits = stats.get('quiz-body-stats:hits', 0)
+    misses = stats.get('quiz-body-stats:misses', 0)
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits * 100 / lookups, 1) if lookups else None}
+
+
+def reset_cache_stats():
+    """Reset the hit and miss counters."""
+    _cache().delete_many([f'quiz-body-stats:{name}' for name in STATS])
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Keyset (cursor) pagination.
+#
+# Instead of OFFSET, each page continues after the last row of the previous
+# one: the cursor holds that row's ordering value and primary key, and the
+# next page is a range query on an indexed column. Every page costs the same,
+# however deep the user scrolls.
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# Separates the ordering value from the primary key in a cursor
+CURSOR_SEPARATOR = '_'
+
+
+class KeysetPage:
+    """One page of results plus the cursor of the page after it (None on the last page)."""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def encode_cursor(obj, field):
+    """Build the cursor pointing just after ``obj`` for a page ordered on ``field``."""
+    value = getattr(obj, field)
+    value = value.isoformat() if hasattr(value, 'isoformat') else value
+    return f"{value}{CURSOR_SEPARATOR}{obj.pk}"
+
+
+def decode_cursor(model, field, cursor):
+    """Return the ``(value, pk)`` pair of a cursor, or raise ValueError if it is malformed."""
+    value, separator, pk = str(cursor).rpartition(CURSOR_SEPARATOR)
+    if not separator:
+        raise ValueError(f"Malformed cursor: {cursor!r}")
+    try:
+        return model._meta.get_field(field).to_python(value), model._meta.pk.to_python(pk)
+    except ValidationError as error:
+        raise ValueError(f"Malformed cursor: {cursor!r}") from error
+
+
+def _keyset_queryset(queryset, field, cursor, descending):
+    # ``queryset`` ordered on ``field`` then primary key, filtered to the rows after ``cursor``
+    direction = '-' if descending else ''
+    queryset = queryset.order_by(f'{direction}{field}', f'{direction}pk')
+
+    if cursor:
+        try:
+            value, pk = decode_cursor(queryset.model, field, cursor)
+        except ValueError:
+            pass
+        else:
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'pk__{lookup}': pk}))
+    return queryset
+
+
+def _keyset_page(rows, field, page_size):
+    # One extra row tells whether there is a next page
+    next_cursor = encode_cursor(rows[page_size - 1], field) if len(rows) > page_size else None
+    return KeysetPage(rows[:page_size], next_cursor)
+
+
+def keyset_paginate(queryset, field, cursor=None, page_size=24, descending=True):
+    """
+    Return the page of ``queryset`` ordered on ``field`` (then primary key)
+    that starts after ``cursor``. A missing or malformed cursor gives the
+    first page. Costs a single query.
+    """
+    queryset = _keyset_queryset(queryset, field, cursor, descending)
+    return _keyset_page(list(queryset[:page_size + 1]), field, page_size)
+
+
+async def akeyset_paginate(queryset, field, cursor=None, page_size=24, descending=True):
+    """Async version of keyset_paginate(), fetching the page with the async ORM."""
+    queryset = _keyset_queryset(queryset, field, cursor, descending)
+    return _keyset_page([row async for row in queryset[:page_size + 1]], field, page_size)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+# Scoring policy of the leaderboards.
+#
+# A quiz can be retaken any number of times, so the leaderboards do not sum
+# raw submissions. Each (user, quiz) pair has one QuizScore row, upserted on
+# every submission, holding the attempt count and the best, latest and summed
+# scores. Its ``score`` column is what the pair is worth under the configured
+# LEADERBOARD_SCORE_POLICY, and a user's total is the sum of those columns, so
+# ranking work grows with the distinct quizzes attempted, not with retakes.
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+
+from .models import QuizScore, QuizSubmission
+
+BEST = 'best'
+LATEST = 'latest'
+AVERAGE = 'average'
+SCORE_POLICIES = (BEST, LATEST, AVERAGE)
+
+# Rows written per query when rebuilding the whole table
+REBUILD_BATCH_SIZE = 1000
+
+# Attempts of one user at one quiz
+Attempts = namedtuple('Attempts', ['attempts', 'best_score', 'latest_score', 'total_score'])
+
+NO_ATTEMPTS = Attempts(0, 0, 0, 0)
+
+
+def score_policy():
+    """Return the configured scoring policy, checking its value."""
+    policy = getattr(settings, 'LEADERBOARD_SCORE_POLICY', BEST)
+    if policy not in SCORE_POLICIES:
+        raise ImproperlyConfigured(
+            f"LEADERBOARD_SCORE_POLICY must be one of {', '.join(SCORE_POLICIES)}, not {policy!r}.")
+    return policy
+
+
+def add_attempt(attempts, score):
+    """Return ``attempts`` updated with a new attempt scoring ``score``."""
+    if not attempts.attempts:
+        return Attempts(1, score, score, score)
+    return Attempts(attempts.attempts + 1, max(attempts.best_score, score), score, attempts.total_score + score)
+
+
+def policy_score(attempts, policy=None):
+    """
+    Return what ``attempts`` are worth on the leaderboard under ``policy``
+    (the configured one by default). Averages are rounded to whole points.
+    """
+    if not attempts.attempts:
+        return 0
+    policy = policy or score_policy()
+    if policy == BEST:
+        return attempts.best_score
+    if policy == LATEST:
+        return attempts.latest_score
+    return round(attempts.total_score / attempts.attempts)
+
+
+def record_attempt(submission):
+    """
+    Upsert the QuizScore row of the user and quiz of a new ``submission``.
+
+    The row is locked (created first if missing) before it is read, so
+    concurrent attempts of the same user and quiz apply one after the other.
+    Returns ``(old score, new score)``, the pair's worth before and after
+    this attempt.
+    """
+    first = add_attempt(NO_ATTEMPTS, submission.score)
+    row, created = (QuizScore.objects.select_for_update()
+                    .get_or_create(user_id=submission.user_id, quiz_id=submission.quiz_id,
+                                   defaults={**first._asdict(), 'score': policy_score(first)}))
+    if created:
+        return 0, row.score
+    old_score = row.score
+
+    attempts = add_attempt(Attempts(row.attempts, row.best_score, row.latest_score, row.total_score), submission.score)
+    row.attempts, row.best_score, row.latest_score, row.total_score = attempts
+    row.score = policy_score(attempts)
+    row.save()
+    return old_score, row.score
+
+
+def rebuild_quiz_scores(user_ids=None):
+    """
+    Recompute every QuizScore row from the submissions, with one grouped
+    query, under the current policy; only the rows of ``user_ids`` if given.
+    Returns the number of rows written.
+    """
+    policy = score_policy()
+    submissions = QuizSubmission.objects.all()
+    quiz_scores = QuizScore.objects.all()
+    if user_ids is not None:
+        submissions = submissions.filter(user_id__in=user_ids)
+        quiz_scores = quiz_scores.filter(user_id__in=user_ids)
+    latest = (QuizSubmission.objects.filter(user=OuterRef('user'), quiz=OuterRef('quiz'))
+              .order_by('-submitted_at', '-pk')
+              .values('score')[:1])
+    pairs = (submissions.values('user', 'quiz')
+             .annotate(attempts=Count('pk'), best_score=Max('score'), total_score=Sum('score'),
+                       latest_score=Subquery(latest))
+             .order_by())
+
+    rows = []
+    for pair in pairs:
+        attempts = Attempts(pair['attempts'], pair['best_score'], pair['latest_score'], pair['total_score'])
+        rows.append(QuizScore(user_id=pair['user'], quiz_id=pair['quiz'], attempts=attempts.attempts,
+                              best_score=attempts.best_score, latest_score=attempts.latest_score,
+                              total_score=attempts.total_score, score=policy_score(attempts, policy)))
+    with transaction.atomic():
+        quiz_scores.delete()
+        QuizScore.objects.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE)
+    return len(rows)
+
+
+def period_scores(submissions, policy=None):
+    """
+    Return ``{user id: total}`` over ``submissions`` (a QuizSubmission
+    queryset, e.g. one week), each quiz counted once under ``policy``.
+    """
+    attempts = {}
+    rows = submissions.order_by('submitted_at', 'pk').values_list('user_id', 'quiz_id', 'score')
+    for user_id, quiz_id, score in rows.iterator():
+        attempts[(user_id, quiz_id)] = add_attempt(attempts.get((user_id, quiz_id), NO_ATTEMPTS), score)
+
+    totals = {}
+    for (user_id, _), pair in attempts.items():
+        totals[user_id] = totals.get(user_id, 0) + policy_score(pair, policy)
+    return totals
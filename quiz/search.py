@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+# Full-text quiz search.
+#
+# On PostgreSQL every quiz carries a weighted search vector (title A,
+# description B, question text C) in Quiz.search_vector, covered by a GIN
+# index and refreshed whenever the quiz or one of its questions changes (see
+# Quiz.save and touch_quiz). A query matches quizzes holding every word of it,
+# the last one as a prefix, and results are ordered by ts_rank.
+#
+# Other databases (SQLite in tests and local runs) use an in-process inverted
+# index with the same weights and matching rules. It is rebuilt when the
+# number of quizzes or their latest updated_at changes, so edits made by any
+# process are picked up at the cost of one aggregate query per search.
+
+import bisect
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Count, F, Max, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+from .models import Question, Quiz
+
+# Text search configuration of the search vectors
+SEARCH_CONFIG = 'english'
+
+# Weight of a word found in each part of a quiz, for the in-process index
+FIELD_WEIGHTS = {'title': 1.0, 'description': 0.4, 'questions': 0.2}
+
+# Most results returned for one query
+MAX_RESULTS = 48
+
+WORD_RE = re.compile(r'\w+')
+
+_index = {'version': None, 'words': [], 'postings': {}}  # word -> {quiz id: weight}
+_lock = threading.Lock()
+
+
+def search_terms(text):
+    """Split a search string into lowercase words, dropping punctuation."""
+    return WORD_RE.findall(text.lower())
+
+
+def _include_questions():
+    return getattr(settings, 'QUIZ_SEARCH_QUESTIONS', True)
+
+
+def uses_database_index():
+    """Whether searches run on the database's full-text index (PostgreSQL only)."""
+    return connection.vendor == 'postgresql'
+
+
+def _question_text():
+    # Subquery concatenating the question text of the outer quiz
+    from django.contrib.postgres.aggregates import StringAgg
+    return Subquery(Question.objects.filter(quiz=OuterRef('pk'))
+                    .values('quiz')
+                    .annotate(text=StringAgg('text', ' '))
+                    .values('text'))
+
+
+def search_vector():
+    """The weighted search vector expression of a quiz."""
+    vector = (SearchVector('title', weight='A', config=SEARCH_CONFIG)
+              + SearchVector('description', weight='B', config=SEARCH_CONFIG))
+    if _include_questions():
+        question_text = Coalesce(_question_text(), Value(''), output_field=TextField())
+        vector += SearchVector(question_text, weight='C', config=SEARCH_CONFIG)
+    return vector
+
+
+def refresh_search_vectors(quizzes=None):
+    """
+    Recompute the search vector of ``quizzes`` (a Quiz queryset, every quiz
+    by default) with a single UPDATE. Does nothing without a database index.
+    Returns the number of quizzes updated.
+    """
+    if not uses_database_index():
+        return 0
+    quizzes = Quiz.objects.all() if quizzes is None else quizzes
+    return quizzes.update(search_vector=search_vector())
+
+
+def _search_database(queryset, terms):
+    query = SearchQuery(' & '.join(f"{term}:*" if i == len(terms) - 1 else term for i, term in enumerate(terms)),
+                        search_type='raw', config=SEARCH_CONFIG)
+    return list(queryset.filter(search_vector=query)
+                .annotate(rank=SearchRank(F('search_vector'), query))
+                .order_by('-rank', '-created_at', '-pk')[:MAX_RESULTS])
+
+
+def _index_version():
+    # Changes whenever a quiz is added, deleted or touched
+    state = Quiz.objects.aggregate(count=Count('pk'), last=Max('updated_at'))
+    return state['count'], state['last']
+
+
+def _build_index():
+    # word -> {quiz id: best weight of the word in that quiz}
+    postings = {}
+
+    def add(quiz_id, text, weight):
+        for word in search_terms(text or ''):
+            quizzes = postings.setdefault(word, {})
+            quizzes[quiz_id] = max(quizzes.get(quiz_id, 0), weight)
+
+    for quiz_id, title, description in Quiz.objects.values_list('id', 'title', 'description').iterator():
+        add(quiz_id, title, FIELD_WEIGHTS['title'])
+        add(quiz_id, description, FIELD_WEIGHTS['description'])
+    if _include_questions():
+        for quiz_id, text in Question.objects.values_list('quiz_id', 'text').iterator():
+            add(quiz_id, text, FIELD_WEIGHTS['questions'])
+    return sorted(postings), postings
+
+
+def _local_index():
+    version = _index_version()
+    with _lock:
+        if _index['version'] == version:
+            return _index['words'], _index['postings']
+    words, postings = _build_index()
+    with _lock:
+        _index.update(version=version, words=words, postings=postings)
+    return words, postings
+
+
+def _matches(words, postings, term, prefix):
+    # {quiz id: weight} of the quizzes holding ``term`` (or a word starting with it)
+    if not prefix:
+        return postings.get(term, {})
+    found = {}
+    position = bisect.bisect_left(words, term)
+    while position < len(words) and words[position].startswith(term):
+        for quiz_id, weight in postings[words[position]].items():
+            found[quiz_id] = max(found.get(quiz_id, 0), weight)
+        position += 1
+    return found
+
+
+def _search_local(queryset, terms):
+    words, postings = _local_index()
+    scores = None
+    for i, term in enumerate(terms):
+        found = _matches(words, postings, term, prefix=i == len(terms) - 1)
+        if scores is None:
+            scores = dict(found)
+        else:
+            scores = {quiz_id: score + found[quiz_id] for quiz_id, score in scores.items() if quiz_id in found}
+        if not scores:
+            return []
+
+    quizzes = list(queryset.filter(pk__in=scores))
+    quizzes.sort(key=lambda quiz: (scores[quiz.pk], quiz.created_at, quiz.pk), reverse=True)
+    for quiz in quizzes:
+        quiz.rank = scores[quiz.pk]
+    return quizzes[:MAX_RESULTS]
+
+
+def search_quizzes(text, queryset=None):
+    """
+    Return the quizzes of ``queryset`` (every quiz by default) matching the
+    search string ``text``, best match first, at most MAX_RESULTS of them.
+    Each quiz gets a ``rank`` attribute with its relevance.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return []
+    queryset = Quiz.objects.all() if queryset is None else queryset
+    if uses_database_index():
+        return _search_database(queryset, terms)
+    return _search_local(queryset, terms)
+
+
+def clear_search_index():
+    """Drop this process's in-process index."""
+    with _lock:
+        _index.update(version=None, words=[], postings={})
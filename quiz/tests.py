@@ -1,16 +1,41 @@
 #!/usr/bin/env python3
 
-from django.test import TestCase
-from .models import Quiz, Question, Choice, Category  # Importing models for testing
+from django.test import TestCase, override_settings
+from .models import Quiz, Question, Choice, Category, QuizSubmission, UserRank, ImportJob, SubmissionAnswer, Leaderboard, LeaderboardEntry, QuizScore  # Importing models for testing
+from .leaderboard import (board_position, board_range, find_board, freeze_leaderboards, leaderboard_page, period_bounds,
+                          rebuild_board, rebuild_leaderboard, verify_leaderboard)
+from .importer import ImportResult, QuizImportError, import_dataframe, import_file, import_rows
+from .worker import STALE_JOB_TIMEOUT, run_pending_jobs
+from .grading import clear_answer_keys, get_answer_key, grade, parse_answers
+from .page_cache import cache_stats
+from .scoring import score_policy
+from .search import clear_search_index, search_quizzes
+from .categories import get_categories
 import pandas as pd
+import datetime
 import io  # For in-memory byte stream handling
+import shutil
+import tempfile
+from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile  # Utility for testing file uploads
-from unittest.mock import patch  # To mock dependencies
 from django.contrib.auth.models import User
 from django.urls import reverse  # For reversing URLs in tests
+from django.core.management import call_command  # To run management commands in tests
+from django.db import connection
+from django.core.cache import cache
+from django.utils import timezone
+from django.core.exceptions import ImproperlyConfigured
+from django.test.utils import CaptureQueriesContext  # To count queries run by a block
 
 # Test case for the Quiz model and related functionality
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())  # Uploads go to a throwaway directory
 class QuizModelTest(TestCase):
+    # Remove the uploads of the tests
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
     # Setup method to prepare necessary objects for the tests
     def setUp(self):
         # Create a Category instance to associate with the Quiz
@@ -41,24 +66,11 @@ class QuizModelTest(TestCase):
             quiz_file=self.uploaded_file
         )
 
-    # Test the functionality of importing quiz data from an Excel file
-    @patch('quiz.models.pd.read_excel')  # Mock read_excel to avoid real file processing
-    def test_import_quiz_from_excel(self, mock_read_excel):
-        # Mocked data to simulate reading from an Excel file
-        mock_df = pd.DataFrame({
-            'Question': ['What is 2+2?', 'What is 3+5?'],
-            'A': ['1', '2'],
-            'B': ['3', '4'],
-            'C': ['5', '8'],
-            'D': ['4', '9'],
-            'Answer': ['D', 'C']
-        })
-
-        # Set the mock to return the DataFrame when called
-        mock_read_excel.return_value = mock_df
-
-        # Save the quiz to trigger the import function
+    # Test the functionality of importing quiz data from the uploaded Excel file
+    def test_import_quiz_from_excel(self):
+        # Save the quiz to queue the import, then run the queued job in-process
         self.quiz.save()
+        run_pending_jobs()
 
         # Check that two questions and eight choices (4 per question) are created
         self.assertEqual(Question.objects.count(), 2)
@@ -111,6 +123,59 @@ class AllQuizTemplateTest(TestCase):
         self.assertContains(response, 'Science')
         self.assertContains(response, 'English')
 
+    # Test that the listing is paginated with question counts and constant queries
+    def test_all_quiz_pagination(self):
+        for quiz in (self.quiz1, self.quiz2):
+            Question.objects.create(quiz=quiz, text='Question')
+        self.client.get(reverse('all_quiz'))  # Warm the category cache
+        with CaptureQueriesContext(connection) as small_listing:
+            self.client.get(reverse('all_quiz'))
+
+        for i in range(30):
+            quiz = Quiz.objects.create(title=f'Paged quiz {i}', description='Desc', category=self.category1)
+            Question.objects.create(quiz=quiz, text='Question')
+        with CaptureQueriesContext(connection) as large_listing:
+            response = self.client.get(reverse('all_quiz'))
+        self.assertEqual(len(small_listing), len(large_listing))
+        # The page is read in quiz_created_idx order: counting the questions with a GROUP BY would sort every quiz
+        listing = next(query['sql'] for query in large_listing if query['sql'].startswith('SELECT "quiz_quiz"'))
+        self.assertNotIn('GROUP BY "quiz_quiz"', listing)
+
+        first_page = response.context['quizzes']
+        self.assertEqual(len(first_page), 24)
+        self.assertTrue(first_page.has_next)
+        self.assertEqual(first_page[0].title, 'Paged quiz 29')
+        self.assertEqual(first_page[0].question_count, 1)
+        self.assertContains(response, 'Total Questions - 1')
+
+        response = self.client.get(reverse('all_quiz'), {'cursor': first_page.next_cursor})
+        second_page = response.context['quizzes']
+        self.assertEqual([quiz.title for quiz in second_page][-2:], ['Quiz 2', 'Quiz 1'])
+        self.assertEqual(len(second_page), 8)
+        self.assertFalse(second_page.has_next)
+
+    # Test that the category bar is served from the process cache, and follows category changes
+    def test_category_cache(self):
+        self.client.get(reverse('all_quiz'))
+        with self.assertNumQueries(0):
+            self.assertEqual([category.name for category in get_categories()], ['English', 'Science'])
+
+        Category.objects.create(name='History')
+        self.assertContains(self.client.get(reverse('all_quiz')), 'History')
+        self.category2.delete()
+        self.assertNotContains(self.client.get(reverse('all_quiz')), 'English')
+
+    # Test that categories are routed by their unique slug
+    def test_category_slug_route(self):
+        other = Category.objects.create(name='Science')
+        self.assertEqual((self.category1.slug, other.slug), ('science', 'science-2'))
+
+        response = self.client.get(reverse('search', args=['science']))
+        self.assertEqual([quiz.title for quiz in response.context['quizzes']], ['Quiz 1'])
+        self.assertContains(response, reverse('search', args=['english']))
+        response = self.client.get(reverse('search', args=['unknown']))
+        self.assertEqual(len(response.context['quizzes']), 0)
+
     # Test the case where no quizzes are available
     def test_no_quizzes(self):
         # Delete all quizzes to simulate an empty list
@@ -121,3 +186,655 @@ class AllQuizTemplateTest(TestCase):
 
         # Verify that a 'no quiz available' message is displayed
         self.assertContains(response, 'There is no quiz available for this category or search.')
+
+
+# Test case for the incremental leaderboard engine
+class LeaderboardTest(TestCase):
+    # Setup method to create users and a quiz to submit
+    def setUp(self):
+        self.category = Category.objects.create(name='Math')
+        self.quiz = Quiz.objects.create(title='Quiz', description='Desc', category=self.category)
+        self.users = [User.objects.create_user(username=f'user{i}', password='testpass') for i in range(4)]
+
+    # Helper returning usernames ordered by rank
+    def ranking(self):
+        return list(UserRank.objects.order_by('rank').values_list('user__username', 'rank', 'total_score'))
+
+    # Test that each submission moves only the submitter to the right place
+    def test_submissions_update_ranks_incrementally(self):
+        QuizSubmission.objects.create(user=self.users[0], quiz=self.quiz, score=3)
+        QuizSubmission.objects.create(user=self.users[1], quiz=self.quiz, score=5)
+        QuizSubmission.objects.create(user=self.users[2], quiz=self.quiz, score=1)
+        self.assertEqual(self.ranking(), [('user1', 1, 5), ('user0', 2, 3), ('user2', 3, 1)])
+
+        # user2 jumps from last to first place with a better retake
+        QuizSubmission.objects.create(user=self.users[2], quiz=self.quiz, score=6)
+        self.assertEqual(self.ranking(), [('user2', 1, 6), ('user1', 2, 5), ('user0', 3, 3)])
+
+        # Ties are broken by the lower user id
+        QuizSubmission.objects.create(user=self.users[3], quiz=self.quiz, score=5)
+        self.assertEqual(self.ranking(), [('user2', 1, 6), ('user1', 2, 5), ('user3', 3, 5), ('user0', 4, 3)])
+        self.assertEqual(verify_leaderboard(), [])
+
+    # Test that a submission does not re-rank every user
+    def test_submission_query_count_is_constant(self):
+        for user in self.users:
+            QuizSubmission.objects.create(user=user, quiz=self.quiz, score=1)
+        # 7 for the insert, the QuizScore upsert and UserRank, 4 savepoint queries, then for the boards
+        # 4 lookups (boards, entries, earlier attempts, new positions) and one UPDATE per weekly, monthly and category board
+        with self.assertNumQueries(20):
+            QuizSubmission.objects.create(user=self.users[3], quiz=self.quiz, score=2)
+
+    # Test that deleting a mid-table user and a quiz re-ranks the others
+    def test_deletes_repair_the_leaderboard(self):
+        other_quiz = Quiz.objects.create(title='Other quiz', description='Desc', category=self.category)
+        QuizSubmission.objects.create(user=self.users[0], quiz=self.quiz, score=1)
+        QuizSubmission.objects.create(user=self.users[0], quiz=other_quiz, score=10)
+        QuizSubmission.objects.create(user=self.users[1], quiz=self.quiz, score=2)
+        QuizSubmission.objects.create(user=self.users[2], quiz=self.quiz, score=3)
+        self.assertEqual([entry['username'] for entry in leaderboard_page()], ['user0', 'user2', 'user1'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[1].delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            other_quiz.delete()
+
+        self.assertEqual(self.ranking(), [('user2', 1, 3), ('user0', 2, 1)])
+        self.assertEqual(verify_leaderboard(), [])
+        self.assertEqual([entry['username'] for entry in leaderboard_page()], ['user2', 'user0'])
+
+    # Test that deleting a quiz moves every user who had scored on it
+    def test_deleted_quiz_moves_several_users(self):
+        other_quiz = Quiz.objects.create(title='Other quiz', description='Desc', category=self.category)
+        for user, score, other_score in zip(self.users, (1, 2, 3), (10, 8, None)):
+            QuizSubmission.objects.create(user=user, quiz=self.quiz, score=score)
+            if other_score is not None:
+                QuizSubmission.objects.create(user=user, quiz=other_quiz, score=other_score)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_quiz.delete()
+        self.assertEqual(self.ranking(), [('user2', 1, 3), ('user1', 2, 2), ('user0', 3, 1)])
+
+    # Test that the management command repairs a corrupted leaderboard
+    def test_rebuild_command(self):
+        for score, user in enumerate(self.users):
+            QuizSubmission.objects.create(user=user, quiz=self.quiz, score=score)
+        UserRank.objects.filter(user=self.users[0]).update(rank=1, total_score=50)
+        self.assertNotEqual(verify_leaderboard(), [])
+
+        out = io.StringIO()
+        call_command('rebuild_leaderboard', stdout=out)
+        self.assertIn('Leaderboard check passed.', out.getvalue())
+        self.assertEqual(rebuild_leaderboard(), 4)
+        self.assertEqual(verify_leaderboard(), [])
+
+
+# Test case for the per-category and weekly/monthly leaderboards
+class ScopedLeaderboardTest(TestCase):
+    def setUp(self):
+        self.math = Category.objects.create(name='Math')
+        self.art = Category.objects.create(name='Art')
+        self.math_quiz = Quiz.objects.create(title='Math quiz', description='Desc', category=self.math)
+        self.art_quiz = Quiz.objects.create(title='Art quiz', description='Desc', category=self.art)
+        self.users = [User.objects.create_user(username=f'user{i}', password='testpass') for i in range(3)]
+
+    # Helper returning (username, rank, total) of a board, best user first
+    def ranking(self, board):
+        return list(board.entries.order_by('rank').values_list('user__username', 'rank', 'total_score'))
+
+    # Test that submissions feed the global period boards and the boards of their category only
+    def test_submissions_update_scoped_boards(self):
+        QuizSubmission.objects.create(user=self.users[0], quiz=self.math_quiz, score=3)
+        QuizSubmission.objects.create(user=self.users[1], quiz=self.art_quiz, score=5)
+        QuizSubmission.objects.create(user=self.users[2], quiz=self.math_quiz, score=4)
+
+        math_board = find_board(self.math.pk, Leaderboard.ALL_TIME)
+        self.assertEqual(self.ranking(math_board), [('user2', 1, 4), ('user0', 2, 3)])
+        weekly = find_board(None, Leaderboard.WEEKLY)
+        self.assertEqual(self.ranking(weekly), [('user1', 1, 5), ('user2', 2, 4), ('user0', 3, 3)])
+        self.assertEqual(self.ranking(find_board(self.art.pk, Leaderboard.MONTHLY)), [('user1', 1, 5)])
+        self.assertIsNone(find_board(None, Leaderboard.ALL_TIME))  # The global all-time board is UserRank
+
+        # Position and rank range reads
+        self.assertEqual(board_position(weekly, self.users[0]), (3, 3))
+        self.assertEqual([entry['username'] for entry in board_range(weekly, 2, 3)], ['user2', 'user0'])
+
+        # The incremental ranks match a rebuild from the submissions
+        expected = self.ranking(weekly)
+        rebuild_board(weekly)
+        self.assertEqual(self.ranking(weekly), expected)
+
+    # Test that a worse retake moves the user down every board in one UPDATE per board
+    def test_retake_moves_user_down_scoped_boards(self):
+        for user, score in zip(self.users, (9, 5, 3)):
+            QuizSubmission.objects.create(user=user, quiz=self.math_quiz, score=score)
+
+        with self.settings(LEADERBOARD_SCORE_POLICY='latest'):
+            QuizSubmission.objects.create(user=self.users[0], quiz=self.math_quiz, score=4)
+            self.assertEqual(verify_leaderboard(), [])
+        for board in Leaderboard.objects.all():
+            self.assertEqual(self.ranking(board), [('user1', 1, 5), ('user0', 2, 4), ('user2', 3, 3)])
+
+    # Test that deletes keep QuizScore and the open boards in step, and leave frozen boards alone
+    def test_deletes_repair_scoped_boards(self):
+        other_quiz = Quiz.objects.create(title='Other math quiz', description='Desc', category=self.math)
+        QuizSubmission.objects.create(user=self.users[0], quiz=self.math_quiz, score=1)
+        QuizSubmission.objects.create(user=self.users[0], quiz=other_quiz, score=10)
+        QuizSubmission.objects.create(user=self.users[1], quiz=self.math_quiz, score=2)
+        QuizSubmission.objects.create(user=self.users[2], quiz=self.art_quiz, score=3)
+        archived = find_board(None, Leaderboard.WEEKLY)
+        archived.frozen = True
+        archived.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[1].delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            other_quiz.delete()
+
+        self.assertEqual(list(QuizScore.objects.values_list('user__username', 'score').order_by('user')),
+                         [('user0', 1), ('user2', 3)])
+        self.assertEqual(self.ranking(find_board(self.math.pk, Leaderboard.ALL_TIME)), [('user0', 1, 1)])
+        self.assertEqual(self.ranking(find_board(None, Leaderboard.MONTHLY)), [('user2', 1, 3), ('user0', 2, 1)])
+        self.assertEqual(self.ranking(archived), [('user0', 1, 11), ('user2', 2, 3)])  # Archived totals are kept
+        self.assertEqual(verify_leaderboard(), [])
+
+    # Test that a user new to an all-time board starts from their total in its category
+    def test_new_all_time_entry_counts_earlier_quizzes(self):
+        QuizSubmission.objects.create(user=self.users[0], quiz=self.math_quiz, score=8)
+        math_board = find_board(self.math.pk, Leaderboard.ALL_TIME)
+        math_board.entries.all().delete()  # As for scores recorded before the boards existed
+
+        QuizSubmission.objects.create(user=self.users[0], quiz=self.math_quiz, score=9)
+        self.assertEqual(self.ranking(math_board), [('user0', 1, 9)])
+
+    # Test that the leaderboard check and rebuild cover the open boards
+    def test_rebuild_covers_open_boards(self):
+        QuizSubmission.objects.create(user=self.users[0], quiz=self.math_quiz, score=3)
+        QuizSubmission.objects.create(user=self.users[1], quiz=self.art_quiz, score=5)
+        weekly = find_board(None, Leaderboard.WEEKLY)
+        weekly.entries.filter(user=self.users[0]).update(total_score=40)
+        find_board(self.art.pk, Leaderboard.ALL_TIME).delete()
+        self.assertEqual(len(verify_leaderboard()), 2)  # Weekly total and art board
+
+        rebuild_leaderboard()
+        self.assertEqual(verify_leaderboard(), [])
+        self.assertEqual(self.ranking(weekly), [('user1', 1, 5), ('user0', 2, 3)])
+        self.assertEqual(self.ranking(find_board(self.art.pk, Leaderboard.ALL_TIME)), [('user1', 1, 5)])
+
+    # Test the period boundaries
+    def test_period_bounds(self):
+        day = datetime.date(2024, 12, 31)  # A Tuesday
+        self.assertEqual(period_bounds(Leaderboard.WEEKLY, day), (datetime.date(2024, 12, 30), datetime.date(2025, 1, 6)))
+        self.assertEqual(period_bounds(Leaderboard.MONTHLY, day), (datetime.date(2024, 12, 1), datetime.date(2025, 1, 1)))
+
+    # Test that ended periods are archived and stop receiving submissions
+    def test_freeze_ended_periods(self):
+        QuizSubmission.objects.create(user=self.users[0], quiz=self.math_quiz, score=3)
+        weekly = find_board(None, Leaderboard.WEEKLY)
+        LeaderboardEntry.objects.filter(board=weekly).update(total_score=99)  # Drift fixed by the final rebuild
+
+        next_week = period_bounds(Leaderboard.WEEKLY, weekly.starts_on)[1]
+        out = io.StringIO()
+        self.assertEqual(freeze_leaderboards(today=weekly.starts_on), 0)
+        self.assertGreaterEqual(freeze_leaderboards(today=next_week + datetime.timedelta(days=31)), 2)
+        call_command('freeze_leaderboards', stdout=out)
+        self.assertIn('Froze', out.getvalue())
+
+        weekly.refresh_from_db()
+        self.assertTrue(weekly.frozen)
+        self.assertEqual(self.ranking(weekly), [('user0', 1, 3)])
+        self.assertFalse(find_board(self.math.pk, Leaderboard.ALL_TIME).frozen)
+
+        # Frozen boards keep their final ranks
+        QuizSubmission.objects.create(user=self.users[1], quiz=self.math_quiz, score=5)
+        self.assertEqual(self.ranking(weekly), [('user0', 1, 3)])
+
+    # Test the leaderboard page of a scoped board
+    def test_leaderboard_view_scope(self):
+        QuizSubmission.objects.create(user=self.users[0], quiz=self.math_quiz, score=3)
+        QuizSubmission.objects.create(user=self.users[1], quiz=self.art_quiz, score=5)
+        self.client.login(username='user0', password='testpass')
+
+        response = self.client.get(reverse('leaderboard'), {'category': self.math.pk, 'period': 'week'})
+        self.assertEqual([entry['username'] for entry in response.context['leaderboard_users']], ['user0'])
+        self.assertEqual(response.context['position'], (1, 3))
+
+        # A period without any submission shows an empty board
+        response = self.client.get(reverse('leaderboard'), {'period': 'week', 'day': '2001-01-01'})
+        self.assertEqual(len(response.context['leaderboard_users']), 0)
+
+        # A category that cannot be a primary key falls back to the global board
+        for category in ('\u00b2', '9' * 30, '-1', 'math'):
+            response = self.client.get(reverse('leaderboard'), {'category': category})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([entry['username'] for entry in response.context['leaderboard_users']], ['user1', 'user0'])
+
+
+# Test case for the best/latest/average attempt scoring policies
+class ScoringPolicyTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Math')
+        self.quizzes = [Quiz.objects.create(title=f'Quiz {i}', description='Desc', category=self.category) for i in range(2)]
+        self.user = User.objects.create_user(username='user0', password='testpass')
+
+    # Helper submitting the same scores under a policy and returning the user's total
+    def total_after(self, policy, scores):
+        with self.settings(LEADERBOARD_SCORE_POLICY=policy):
+            for score in scores:
+                QuizSubmission.objects.create(user=self.user, quiz=self.quizzes[0], score=score)
+            QuizSubmission.objects.create(user=self.user, quiz=self.quizzes[1], score=2)
+            self.assertEqual(verify_leaderboard(), [])
+            weekly = find_board(None, Leaderboard.WEEKLY)
+            incremental = board_position(weekly, self.user)
+            rebuild_board(weekly)
+            self.assertEqual(board_position(weekly, self.user), incremental)
+        return UserRank.objects.get(user=self.user).total_score
+
+    # Test that retakes count once, whatever their number
+    def test_best_attempt(self):
+        self.assertEqual(self.total_after('best', [3, 5, 4]), 7)
+        self.assertEqual(QuizScore.objects.count(), 2)
+        self.assertEqual(QuizScore.objects.get(quiz=self.quizzes[0]).attempts, 3)
+
+    # Test that a worse retake lowers the total under the latest policy
+    def test_latest_attempt(self):
+        self.assertEqual(self.total_after('latest', [5, 1]), 3)
+
+    def test_average_attempt(self):
+        self.assertEqual(self.total_after('average', [2, 4, 6]), 6)
+
+    def test_unknown_policy(self):
+        with self.settings(LEADERBOARD_SCORE_POLICY='sum'), self.assertRaises(ImproperlyConfigured):
+            score_policy()
+
+
+# Test case for the full-text quiz search (in-process index on SQLite)
+class QuizSearchTest(TestCase):
+    def setUp(self):
+        clear_search_index()
+        category = Category.objects.create(name='Science')
+        self.physics = Quiz.objects.create(title='Physics basics', description='Forces and motion', category=category)
+        self.chemistry = Quiz.objects.create(title='Chemistry', description='Atoms, molecules and physics of bonds', category=category)
+        self.biology = Quiz.objects.create(title='Biology', description='Cells', category=category)
+        Question.objects.create(quiz=self.biology, text='Which physical process moves water into roots?')
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+
+    def titles(self, text):
+        return [quiz.title for quiz in search_quizzes(text)]
+
+    # Test that title matches rank above description and question matches
+    def test_ranking_and_prefix(self):
+        self.assertEqual(self.titles('physic'), ['Physics basics', 'Chemistry', 'Biology'])
+        self.assertEqual(self.titles('PHYSICS!'), ['Physics basics', 'Chemistry'])
+        self.assertEqual(self.titles('atoms mol'), ['Chemistry'])  # Every word must match, the last one as a prefix
+        self.assertEqual(self.titles('atoms cells'), [])
+        self.assertEqual(self.titles('  '), [])
+
+    # Test that the index follows quiz and question changes
+    def test_index_is_refreshed(self):
+        self.assertEqual(self.titles('roots'), ['Biology'])
+        Question.objects.filter(quiz=self.biology).delete()
+        self.assertEqual(self.titles('roots'), [])
+
+        self.chemistry.title = 'Organic chemistry'
+        self.chemistry.save()
+        self.assertEqual(self.titles('organic'), ['Organic chemistry'])
+
+    def test_search_view(self):
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.get(reverse('search_all'), {'q': 'physics'})
+        self.assertEqual([quiz.title for quiz in response.context['quizzes']], ['Physics basics', 'Chemistry'])
+        self.assertEqual(response.context['quizzes'][0].question_count, 0)
+
+
+# Test case for the bulk quiz importer
+class QuizImporterTest(TestCase):
+    # Setup method to create an empty quiz to import into
+    def setUp(self):
+        self.category = Category.objects.create(name='Math')
+        self.quiz = Quiz.objects.create(title='Quiz', description='Desc', category=self.category)
+
+    # Helper building a sheet with the given number of questions
+    def make_sheet(self, count, start=0):
+        return pd.DataFrame({
+            'Question': [f'Question {i}' for i in range(start, start + count)],
+            'A': ['1'] * count,
+            'B': ['2'] * count,
+            'C': ['3'] * count,
+            'D': ['4'] * count,
+            'Answer': ['B'] * count,
+        })
+
+    # Test that the import costs the same number of queries whatever the sheet size
+    def test_bulk_import(self):
+        with CaptureQueriesContext(connection) as small_import:
+            import_dataframe(self.quiz, self.make_sheet(10))
+        with CaptureQueriesContext(connection) as large_import:
+            result = import_dataframe(self.quiz, self.make_sheet(70, start=10))
+
+        self.assertEqual(len(small_import), len(large_import))
+        self.assertEqual(result, ImportResult(inserted=70, skipped=0, invalid=0, errors=[]))
+        self.assertEqual(Question.objects.filter(quiz=self.quiz).count(), 80)
+        self.assertEqual(Choice.objects.filter(question__quiz=self.quiz).count(), 320)
+        self.assertEqual(Choice.objects.filter(question__quiz=self.quiz, is_correct=True, text='2').count(), 80)
+
+    # Test that questions already in the quiz are skipped
+    def test_existing_questions_are_skipped(self):
+        import_dataframe(self.quiz, self.make_sheet(2))
+        result = import_dataframe(self.quiz, self.make_sheet(3))
+
+        self.assertEqual((result.inserted, result.skipped, result.invalid), (1, 2, 0))
+        self.assertEqual(Question.objects.filter(quiz=self.quiz).count(), 3)
+
+    # Test that invalid rows are reported and the valid ones imported
+    def test_invalid_rows(self):
+        df = self.make_sheet(3)
+        df.loc[0, 'Answer'] = 'E'
+        df.loc[1, 'C'] = None
+        result = import_dataframe(self.quiz, df)
+
+        self.assertEqual((result.inserted, result.skipped, result.invalid), (1, 0, 2))
+        self.assertEqual([row for row, error in result.errors], [2, 3])
+        self.assertEqual(Question.objects.get(quiz=self.quiz).text, 'Question 2')
+
+    # Test that CSV and xlsx files are streamed through the same interface
+    def test_import_file_formats(self):
+        sheet = self.make_sheet(3)
+        csv_file = io.BytesIO(sheet.to_csv(index=False).encode('utf-8-sig'))
+        result = import_file(self.quiz, csv_file, 'quiz.csv')
+        self.assertEqual((result.inserted, result.skipped, result.invalid), (3, 0, 0))
+
+        xlsx_file = io.BytesIO()
+        self.make_sheet(5).to_excel(xlsx_file, index=False, engine="openpyxl")
+        xlsx_file.seek(0)
+        result = import_file(self.quiz, xlsx_file, 'quiz.xlsx')
+        self.assertEqual((result.inserted, result.skipped, result.invalid), (2, 3, 0))
+        self.assertEqual(Choice.objects.filter(question__quiz=self.quiz).count(), 20)
+
+    # Test that rows are processed in chunks with correct row numbers
+    def test_import_in_chunks(self):
+        df = self.make_sheet(7)
+        df.loc[5, 'Answer'] = ''
+        result = import_rows(self.quiz, list(df.columns), df.to_dict('records'), chunk_size=2)
+
+        self.assertEqual((result.inserted, result.skipped, result.invalid), (6, 0, 1))
+        self.assertEqual(result.errors[0][0], 7)
+
+    # Test that a sheet with missing columns is rejected before writing anything
+    def test_missing_columns(self):
+        df = self.make_sheet(2).drop(columns=['Answer'])
+        with self.assertRaises(QuizImportError):
+            import_dataframe(self.quiz, df)
+        self.assertEqual(Question.objects.count(), 0)
+
+
+# Test case for the background import queue
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())  # Uploads go to a throwaway directory
+class ImportJobTest(TestCase):
+    # Remove the uploads of the tests
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    # Setup method to create a quiz with an uploaded sheet
+    def setUp(self):
+        self.category = Category.objects.create(name='Math')
+        excel_file = io.BytesIO()
+        pd.DataFrame({
+            'Question': ['What is 2+2?', 'What is 3+5?', 'Broken row'],
+            'A': ['1', '2', '1'],
+            'B': ['3', '4', '2'],
+            'C': ['5', '8', '3'],
+            'D': ['4', '9', '4'],
+            'Answer': ['D', 'C', 'F'],
+        }).to_excel(excel_file, index=False, engine="openpyxl")
+        self.excel_bytes = excel_file.getvalue()
+        self.quiz = Quiz.objects.create(
+            title='Quiz', description='Desc', category=self.category,
+            quiz_file=SimpleUploadedFile('queued_quiz.xlsx', self.excel_bytes),
+        )
+
+    # Test that saving only queues the import, and the worker runs it
+    def test_save_queues_import(self):
+        self.assertEqual(Question.objects.count(), 0)
+        self.quiz.save()
+        self.assertEqual(ImportJob.objects.filter(status=ImportJob.PENDING).count(), 1)
+
+        jobs = run_pending_jobs()
+        self.assertEqual(len(jobs), 1)
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual((job.inserted, job.skipped, job.invalid), (2, 0, 1))
+        self.assertIn('Row 4', job.error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(Question.objects.filter(quiz=self.quiz).count(), 2)
+
+    # Test that saves which do not change the file content skip the import
+    def test_unchanged_file_is_not_imported_again(self):
+        run_pending_jobs()
+        self.quiz.refresh_from_db()
+        self.assertEqual(len(self.quiz.quiz_file_hash), 64)
+        self.assertEqual(self.quiz.quiz_file_rows, 3)
+
+        # Editing the title only
+        self.quiz.title = 'New title'
+        self.quiz.save()
+        self.assertFalse(ImportJob.objects.filter(status=ImportJob.PENDING).exists())
+
+        # Uploading the same bytes again
+        self.quiz.quiz_file = SimpleUploadedFile('same_quiz.xlsx', self.excel_bytes)
+        self.quiz.save()
+        self.assertFalse(ImportJob.objects.filter(status=ImportJob.PENDING).exists())
+
+        # Uploading a different file
+        excel_file = io.BytesIO()
+        pd.DataFrame({'Question': ['New?'], 'A': ['1'], 'B': ['2'], 'C': ['3'], 'D': ['4'], 'Answer': ['A']}
+                     ).to_excel(excel_file, index=False, engine="openpyxl")
+        self.quiz.quiz_file = SimpleUploadedFile('other_quiz.xlsx', excel_file.getvalue())
+        self.quiz.save()
+        self.assertTrue(ImportJob.objects.filter(status=ImportJob.PENDING).exists())
+
+    # Test that a failing import is recorded on the job
+    def test_failed_job(self):
+        self.quiz.quiz_file.storage.delete(self.quiz.quiz_file.name)
+        run_pending_jobs()
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.FAILED)
+        self.assertTrue(job.error)
+
+    # Test the worker management command in single pass mode
+    def test_worker_command(self):
+        out = io.StringIO()
+        call_command('run_import_worker', '--once', stdout=out)
+        self.assertIn('done', out.getvalue())
+        self.assertFalse(ImportJob.objects.filter(status=ImportJob.PENDING).exists())
+
+    # Test that jobs left running by a dead worker are queued again on start
+    def test_stale_running_jobs_are_requeued(self):
+        started = timezone.now() - STALE_JOB_TIMEOUT - datetime.timedelta(minutes=1)
+        ImportJob.objects.update(status=ImportJob.RUNNING, started_at=started)
+        recent = ImportJob.objects.create(quiz=self.quiz, status=ImportJob.RUNNING, started_at=timezone.now())
+
+        out = io.StringIO()
+        call_command('run_import_worker', '--once', stdout=out)
+        self.assertIn('Queued again 1', out.getvalue())
+        self.assertEqual(ImportJob.objects.exclude(pk=recent.pk).get().status, ImportJob.DONE)
+        recent.refresh_from_db()
+        self.assertEqual(recent.status, ImportJob.RUNNING)
+
+
+# Test case for server-side grading of quiz submissions
+class GradingTest(TestCase):
+    # Setup method to create a logged in user and a quiz with questions
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.login(username='testuser', password='testpass')
+        self.category = Category.objects.create(name='Math')
+        self.quiz = Quiz.objects.create(title='Quiz', description='Desc', category=self.category)
+        self.correct = {}
+        for i in range(3):
+            question = Question.objects.create(quiz=self.quiz, text=f'Question {i}')
+            Choice.objects.create(question=question, text='Wrong', is_correct=False)
+            self.correct[question.id] = Choice.objects.create(question=question, text='Right', is_correct=True).id
+        clear_answer_keys()
+
+    # Test that the score is computed on the server from the selected choices
+    def test_submission_is_graded_on_the_server(self):
+        question_ids = list(self.correct)
+        data = {
+            f'question_{question_ids[0]}': self.correct[question_ids[0]],
+            f'question_{question_ids[1]}': self.correct[question_ids[1]] - 1,  # The wrong choice
+            'score': 100,  # Client supplied scores are ignored
+        }
+        response = self.client.post(reverse('quiz', args=[self.quiz.id]), data)
+
+        submission = QuizSubmission.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('quiz_result', args=[submission.id]), fetch_redirect_response=False)
+        self.assertEqual(submission.score, 1)
+
+    # Test that every answer of a submission is stored
+    def test_answers_are_stored(self):
+        question_ids = list(self.correct)
+        data = {
+            f'question_{question_ids[0]}': self.correct[question_ids[0]],
+            f'question_{question_ids[1]}': self.correct[question_ids[1]] - 1,
+            f'question_{question_ids[2]}': self.correct[question_ids[0]],  # A choice of another question
+        }
+        self.client.post(reverse('quiz', args=[self.quiz.id]), data)
+
+        submission = QuizSubmission.objects.get(user=self.user)
+        answers = SubmissionAnswer.objects.filter(submission=submission).order_by('question_id')
+        self.assertEqual(
+            list(answers.values_list('question_id', 'choice_id', 'is_correct')),
+            [(question_ids[0], self.correct[question_ids[0]], True), (question_ids[1], self.correct[question_ids[1]] - 1, False)],
+        )
+
+    # Test that the result page costs the same number of queries whatever the quiz length
+    def test_result_page_query_count(self):
+        long_quiz = Quiz.objects.create(title='Long quiz', description='Desc', category=self.category)
+        for i in range(20):
+            question = Question.objects.create(quiz=long_quiz, text=f'Long question {i}')
+            Choice.objects.create(question=question, text='Right', is_correct=True)
+            Choice.objects.create(question=question, text='Wrong', is_correct=False)
+
+        query_counts = []
+        for quiz in (self.quiz, long_quiz):
+            quiz.refresh_from_db()
+            answers = {f'question_{question_id}': choice_id for question_id, choice_id in get_answer_key(quiz).items()}
+            self.client.post(reverse('quiz', args=[quiz.id]), answers)
+            submission = QuizSubmission.objects.filter(quiz=quiz).get()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('quiz_result', args=[submission.id]))
+            self.assertContains(response, 'fw-bold text-success', count=len(answers))
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    # Test that the answer key is not sent to the browser
+    def test_answer_key_not_rendered(self):
+        response = self.client.get(reverse('quiz', args=[self.quiz.id]))
+        self.assertNotContains(response, 'correct-answer')
+
+    # Test that the answer key is cached and refreshed when a choice changes
+    def test_answer_key_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_answer_key(self.quiz), self.correct)
+        with self.assertNumQueries(0):
+            self.assertEqual(grade(self.quiz, self.correct), 3)
+
+        # Make the wrong choice of the first question the right one
+        question_id = next(iter(self.correct))
+        Choice.objects.filter(question_id=question_id).update(is_correct=False)
+        choice = Choice.objects.get(question_id=question_id, text='Wrong')
+        choice.is_correct = True
+        choice.save()
+
+        self.quiz.refresh_from_db()
+        self.assertEqual(grade(self.quiz, self.correct), 2)
+        self.assertEqual(parse_answers({f'question_{question_id}': 'x', 'other': '1', 'question_2': '5'}), {2: 5})
+
+
+# Test case pinning the number of queries of the quiz pages
+class QuizPageQueryCountTest(TestCase):
+    # Setup method to create a logged in user and quizzes of different lengths
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.login(username='testuser', password='testpass')
+        self.category = Category.objects.create(name='Math')
+        self.short_quiz = self.make_quiz(2)
+        self.long_quiz = self.make_quiz(50)
+        cache.clear()
+
+    # Helper creating a quiz with the given number of four-choice questions
+    def make_quiz(self, question_count):
+        quiz = Quiz.objects.create(title=f'Quiz of {question_count}', description='Desc', category=self.category)
+        questions = Question.objects.bulk_create(
+            [Question(quiz=quiz, text=f'Question {i}') for i in range(question_count)]
+        )
+        Choice.objects.bulk_create([
+            Choice(question=question, text=f'Option {option}', is_correct=option == 0)
+            for question in questions for option in range(4)
+        ])
+        return quiz
+
+    # Test that showing a quiz costs the same queries whatever its length
+    def test_quiz_page(self):
+        for quiz in (self.short_quiz, self.long_quiz):
+            # session, user, profile (navbar), quiz, questions, choices
+            with self.assertNumQueries(6):
+                response = self.client.get(reverse('quiz', args=[quiz.id]))
+            self.assertContains(response, 'class="form-check-input"', count=quiz.question_set.count() * 4)
+
+        # Questions and choices come in a deterministic order
+        content = response.content.decode()
+        positions = [content.index(f'Option {option}') for option in range(4)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertLess(content.index('Question 0<'), content.index('Question 1<'))
+
+    # Test that showing a result costs the same queries whatever the quiz length
+    def test_result_page(self):
+        for quiz in (self.short_quiz, self.long_quiz):
+            submission = QuizSubmission.objects.create(user=self.user, quiz=quiz, score=1)
+            # session, user, submission with quiz and profile, questions, choices, answers, profile (navbar)
+            with self.assertNumQueries(7):
+                self.client.get(reverse('quiz_result', args=[submission.id]))
+
+
+# Test case for the versioned cache of the quiz question cards
+class QuizPageCacheTest(TestCase):
+    # Setup method to create a logged in user and a quiz with one question
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.login(username='testuser', password='testpass')
+        self.category = Category.objects.create(name='Math')
+        self.quiz = Quiz.objects.create(title='Quiz', description='Desc', category=self.category)
+        self.question = Question.objects.create(quiz=self.quiz, text='First question')
+        self.choice = Choice.objects.create(question=self.question, text='First choice', is_correct=True)
+        cache.clear()
+
+    # Test that the second view is served from the cache
+    def test_cache_hit(self):
+        self.client.get(reverse('quiz', args=[self.quiz.id]))
+        # session, user, profile (navbar), quiz
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('quiz', args=[self.quiz.id]))
+        self.assertContains(response, 'First choice')
+        self.assertContains(response, 'class="card mb-2 question"')
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 50.0})
+
+    # Test that editing a question or a choice refreshes the cached page
+    def test_invalidated_on_change(self):
+        self.client.get(reverse('quiz', args=[self.quiz.id]))
+
+        self.choice.text = 'Edited choice'
+        self.choice.save()
+        self.assertContains(self.client.get(reverse('quiz', args=[self.quiz.id])), 'Edited choice')
+
+        Question.objects.create(quiz=self.quiz, text='Second question')
+        self.assertContains(self.client.get(reverse('quiz', args=[self.quiz.id])), 'Second question')
+
+        self.quiz.title = 'Renamed'
+        self.quiz.save()
+        self.client.get(reverse('quiz', args=[self.quiz.id]))
+        self.assertEqual(cache_stats()['misses'], 4)
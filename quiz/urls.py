@@ -8,8 +8,11 @@ urlpatterns = [
     # URL pattern for viewing all quizzes; maps to all_quiz_view in views
     path('all_quiz', views.all_quiz_view, name='all_quiz'),
     
-    # URL pattern for searching quizzes by category; uses a string parameter "category"
-    path('search/<str:category>', views.search_view, name='search'),
+    # URL pattern for searching quizzes by search term, without a category
+    path('search', views.search_view, name='search_all'),
+
+    # URL pattern for listing the quizzes of a category; uses the category slug
+    path('search/<slug:category>', views.search_view, name='search'),
     
     # URL pattern for viewing a specific quiz; expects an integer "quiz_id" parameter
     path('<int:quiz_id>', views.quiz_view, name='quiz'),
@@ -1,54 +1,79 @@
 #!/usr/bin/env python3
 
-from django.shortcuts import render, redirect, get_object_or_404  # For rendering templates and managing redirects
+import asyncio  # To await the independent lookups of the async views together
+from asgiref.sync import sync_to_async  # To call the synchronous search from async views
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404  # For rendering templates and managing redirects
 from django.contrib.auth.decorators import login_required  # To enforce login for specific views
 from django.contrib.auth.models import User  # To handle user-related data
 from account.models import Profile  # Import user Profile model
-from .models import Quiz, Category  # Import Quiz and Category models for querying
-from django.db.models import Q  # For complex query conditions in search
-from quiz.models import QuizSubmission  # Import QuizSubmission model to handle quiz submission
+from account.history import quiz_question_count  # Question counts without grouping the quiz rows
+from .models import Quiz  # Import Quiz model for querying
+from .categories import acategory_by_slug, aget_categories  # Cached category lookups
+from django.db.models import Count  # For question counts
+from quiz.models import QuizSubmission, SubmissionAnswer  # Import submission models to store quiz submissions
+from django.db import transaction  # To store a submission and its answers together
 from django.contrib import messages  # For displaying messages to users
+from .pagination import KeysetPage, akeyset_paginate  # Cursor based pagination of the quiz listing
+from .search import search_quizzes  # Ranked full-text quiz search
+from .grading import grade_answers, parse_answers  # Server-side scoring of submitted answers
+from .page_cache import aquestions_with_choices, render_quiz_body  # Cached question cards of a quiz
+from base.query_budget import query_budget  # Declared query counts, checked by the query_budget tests
+from base.shortcuts import alist, arender  # Async ORM and rendering helpers
+
+# Quizzes shown per page of the listing
+QUIZZES_PER_PAGE = 24
+
+
+# Helper fetching one page of quiz cards, newest first, with their question counts. The counts are
+# subqueries: a GROUP BY would sort every quiz before the LIMIT instead of reading quiz_created_idx
+async def quiz_listing_page(request, quizzes):
+    quizzes = quizzes.select_related('category').defer('search_vector').annotate(question_count=quiz_question_count('pk'))
+    return await akeyset_paginate(quizzes, 'created_at', request.GET.get('cursor'), QUIZZES_PER_PAGE)
+
 
 # View for displaying all quizzes
+@query_budget(5)
 @login_required  # Ensures that only logged-in users can access this view
-def all_quiz_view(request):
-    # Fetch all quizzes, ordering them by creation date (newest first)
-    quizzes = Quiz.objects.order_by('-created_at')
-    # Fetch all categories to display in the view
-    categories = Category.objects.all()
-
-    # Pass quizzes and categories to the template
-    context = {"quizzes": quizzes, "categories": categories}
-    return render(request, 'all-quiz.html', context)  # Render 'all-quiz.html' with context data
+async def all_quiz_view(request):
+    # Fetch one page of quizzes, newest first, while the categories of the filter bar are loaded
+    quizzes, _ = await asyncio.gather(quiz_listing_page(request, Quiz.objects.all()), aget_categories())
+    # Pass quizzes to the template; the categories come from the context processor
+    context = {"quizzes": quizzes}
+    return await arender(request, 'all-quiz.html', context)  # Render 'all-quiz.html' with context data
 
 
 # View for searching quizzes by category or search term
+@query_budget(8)
 @login_required  # Restrict access to logged-in users only
-def search_view(request, category):
+async def search_view(request, category=''):
     # Search by search term from a search bar if it exists
     if request.GET.get('q') is not None:
         q = request.GET.get('q')  # Retrieve search term from GET request
-        # Search for quizzes with title or description matching the term
-        query = Q(title__icontains=q) | Q(description__icontains=q)
-        quizzes = Quiz.objects.filter(query).order_by('-created_at')
-    
+        # Best matches of the full-text index, on a single page; the search itself is synchronous
+        quizzes = Quiz.objects.select_related('category').defer('search_vector').annotate(question_count=Count('question'))
+        results, _ = await asyncio.gather(sync_to_async(search_quizzes)(q, quizzes), aget_categories())
+        quizzes = KeysetPage(results, None)
+
     # Search by category if a valid category is provided
-    elif category.strip():  # Check that category is not just whitespace
-        quizzes = Quiz.objects.filter(category__name=category).order_by('-created_at')
-    
+    elif category:
+        # Resolve the slug from the cached categories, then keep one page of the results, newest first
+        selected = await acategory_by_slug(category)
+        quizzes = Quiz.objects.filter(category=selected) if selected else Quiz.objects.none()
+        quizzes = await quiz_listing_page(request, quizzes)
+
     # If no search term or category, show all quizzes
     else:
-        quizzes = Quiz.objects.order_by('-created_at')
-
-    # Fetch all categories to include in the context for filter options
-    categories = Category.objects.all()
+        quizzes, _ = await asyncio.gather(quiz_listing_page(request, Quiz.objects.all()), aget_categories())
 
-    # Pass quizzes and categories to the template
-    context = {"quizzes": quizzes, "categories": categories}
-    return render(request, 'all-quiz.html', context)  # Render 'all-quiz.html' with context data
+    # Pass quizzes to the template; the categories come from the context processor
+    context = {"quizzes": quizzes}
+    return await arender(request, 'all-quiz.html', context)  # Render 'all-quiz.html' with context data
 
 
-# View for displaying a specific quiz and handling quiz submission
+# View for displaying a specific quiz and handling quiz submission. A user's first submission peaks at 51
+# queries when it also opens the period's boards (4 queries per board created) and 35 once they exist;
+# the POST budget keeps a margin of 3 over the peak
+@query_budget(6, post=54)
 @login_required  # Restrict access to logged-in users only
 def quiz_view(request, quiz_id):
     # Fetch the quiz object or return a 404 if it doesn't exist
@@ -56,26 +81,52 @@ def quiz_view(request, quiz_id):
 
     # Handle quiz submission when the form is submitted
     if request.method == "POST":
-        # Retrieve the score from the form submission, defaulting to 0 if not provided
-        score = int(request.POST.get('score', 0))
+        # Grade the selected choices against the quiz's answer key
+        score, graded = grade_answers(quiz, parse_answers(request.POST))
+
+        with transaction.atomic():
+            # Create and save a new QuizSubmission object for the user
+            submission = QuizSubmission(user=request.user, quiz=quiz, score=score)
+            submission.save()  # Save the submission to the database
 
-        # Create and save a new QuizSubmission object for the user
-        submission = QuizSubmission(user=request.user, quiz=quiz, score=score)
-        submission.save()  # Save the submission to the database
+            # Store every answer with a single INSERT
+            SubmissionAnswer.objects.bulk_create([
+                SubmissionAnswer(submission=submission, question_id=question_id, choice_id=choice_id, is_correct=is_correct)
+                for question_id, choice_id, is_correct in graded
+            ])
 
         # Redirect to the quiz result view, passing the submission ID
         return redirect('quiz_result', submission_id=submission.id)
 
-    # Render 'quiz.html' with the quiz object in the context if GET request
-    return render(request, 'quiz.html', {'quiz': quiz})
+    # Render 'quiz.html' with the quiz and its (cached) question cards in the context if GET request
+    questions_html, question_count = render_quiz_body(quiz)
+    context = {'quiz': quiz, 'questions_html': questions_html, 'question_count': question_count}
+    return render(request, 'quiz.html', context)
 
 
 # View for displaying the result of a quiz submission
+@query_budget(7)
 @login_required  # Restrict access to logged-in users only
-def quiz_result_view(request, submission_id):
+async def quiz_result_view(request, submission_id):
     # Fetch the specific submission by ID for the logged-in user, or return 404 if not found
-    submission = get_object_or_404(QuizSubmission, pk=submission_id, user=request.user)
-    
-    # Pass the submission to the template for displaying results
-    context = {'submission': submission}
-    return render(request, 'quiz-result.html', context)  # Render 'quiz-result.html' with submission data
+    submission = await aget_object_or_404(
+        QuizSubmission.objects.select_related('quiz', 'user__profile'), pk=submission_id, user=await request.auser()
+    )
+
+    # Load the questions with their choices, and the user's answers, in three queries
+    questions, selected = await asyncio.gather(
+        aquestions_with_choices(submission.quiz),
+        alist(submission.submissionanswer_set.values_list('question_id', 'choice_id')),
+    )
+    selected = dict(selected)
+    for question in questions:
+        question.selected_choice_id = selected.get(question.id)
+
+    # Pass the submission and its answers to the template for displaying results
+    context = {
+        'submission': submission,
+        'questions': questions,
+        'total_questions': len(questions),
+        'incorrect_answers': len(questions) - submission.score,
+    }
+    return await arender(request, 'quiz-result.html', context)  # Render 'quiz-result.html' with submission data
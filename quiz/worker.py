@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+# Background processing of queued quiz file imports.
+#
+# Jobs live in the database (ImportJob), so no external broker is needed:
+# the run_import_worker command polls for pending jobs, and tests can call
+# run_pending_jobs() directly to process them in-process. Jobs left running
+# by a worker that died are queued again by requeue_stale_jobs(), which the
+# command calls on start; importing a file twice is safe, as the questions
+# already imported are skipped.
+
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ImportJob
+
+# Rejected rows copied into ImportJob.error
+MAX_REPORTED_ERRORS = 50
+
+# Running jobs started longer ago than this are assumed to be abandoned
+STALE_JOB_TIMEOUT = datetime.timedelta(minutes=30)
+
+
+def requeue_stale_jobs(timeout=STALE_JOB_TIMEOUT):
+    """
+    Queue again the jobs marked running for longer than ``timeout``, left by
+    a worker that crashed or was killed. Returns the number of jobs queued.
+    """
+    return (ImportJob.objects
+            .filter(status=ImportJob.RUNNING, started_at__lt=timezone.now() - timeout)
+            .update(status=ImportJob.PENDING, started_at=None))
+
+
+def claim_next_job():
+    """
+    Mark the oldest pending job as running and return it, or None when the
+    queue is empty. Locked rows are skipped so several workers can run at once.
+    """
+    with transaction.atomic():
+        job = (ImportJob.objects.select_for_update(skip_locked=True)
+               .filter(status=ImportJob.PENDING)
+               .order_by('created_at', 'id')
+               .first())
+        if job is None:
+            return None
+        job.status = ImportJob.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def run_job(job):
+    """Import the quiz file of a claimed job and record the outcome on the job."""
+    try:
+        result = job.quiz.import_quiz_from_excel()
+    except Exception as error:  # Any failure is reported on the job instead of killing the worker
+        job.status = ImportJob.FAILED
+        job.error = f"{type(error).__name__}: {error}"
+    else:
+        job.status = ImportJob.DONE
+        job.inserted = result.inserted
+        job.skipped = result.skipped
+        job.invalid = result.invalid
+        job.error = "\n".join(f"Row {row_number}: {error}"
+                              for row_number, error in result.errors[:MAX_REPORTED_ERRORS])
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def run_pending_jobs(limit=None):
+    """Process pending jobs until the queue is empty or ``limit`` jobs ran. Returns the jobs processed."""
+    jobs = []
+    while limit is None or len(jobs) < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        jobs.append(run_job(job))
+    return jobs